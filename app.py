@@ -1,10 +1,95 @@
+import atexit
+import logging
+import os
+
 from flask import Flask
+from jinja2 import FileSystemBytecodeCache
+from commands import register_commands
+from config import load_config, mongo_settings
+from models.assets import assets
+from models.db import close_client, configure, get_client, register_listener
+from models.metrics import command_metrics
+from models.orders import ensure_dispatcher
+from models.profiler import install_signal_handler
+from models.search import catalogue_search
 from routes.auth_routes import auth_bp
+from routes.event_routes import events_bp
+from routes.media_routes import media_bp
+from routes.ops_routes import ops_bp
+
+log = logging.getLogger(__name__)
+
+
+def create_app(config=None):
+    """Builds the Flask app; `config` is an APP_ENV name, a config class or a dict of settings.
+
+    Nothing here touches MongoDB, so the app can be imported by a pre-fork
+    server's master and each worker opens its own connections after fork.
+    """
+    app = Flask(__name__)
+    app.config.update(load_config(config))
+
+    mongo = mongo_settings(app.config)
+    if mongo:
+        configure(**mongo)
+
+    if app.config.get('JINJA_BYTECODE_CACHE'):
+        cache_dir = app.config.get('JINJA_CACHE_DIR')
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(events_bp)
+    app.register_blueprint(media_bp)
+    app.register_blueprint(ops_bp)
+    register_commands(app)
+
+    # Tag every Mongo command with the route that issued it (see /metrics)
+    register_listener(command_metrics)
+
+    # `kill -USR2 <pid>` dumps this worker's sampled stacks to PROFILE_DIR
+    install_signal_handler()
+    return app
+
+
+def warm_up(app):
+    """Readies a freshly forked worker before it accepts traffic.
+
+    Opens this process's Mongo pool, compiles every template, compresses the
+    page bundles and fills the catalogue caches for the category pages and
+    the search index. Failures are logged, not raised:
+    a worker that starts cold is better than one that doesn't start.
+    """
+    if not app.config.get('WARM_UP'):
+        return
+    try:
+        get_client().admin.command('ping')
+    except Exception:
+        log.exception("Warm-up: MongoDB unreachable")
+        return
+
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    if app.config.get('FINGERPRINT_ASSETS'):
+        assets.load()
+
+    try:
+        view = app.view_functions['auth.api_category_products']
+        for category in app.config['WARM_UP_CATEGORIES']:
+            with app.test_request_context(f'/api/category/{category}'):
+                view(category)
+        catalogue_search.index()
+        ensure_dispatcher()
+    except Exception:
+        log.exception("Warm-up: priming caches failed")
+
 
-app = Flask(__name__)
-app.secret_key = 'your_secret_key_here'  # required for sessions
+app = create_app()
 
-app.register_blueprint(auth_bp)
+# Release pooled Mongo connections when the worker exits
+atexit.register(close_client)
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    warm_up(app)
+    app.run(debug=app.config['DEBUG'], threaded=True, port=int(os.environ.get('PORT', 5000)))
@@ -0,0 +1,82 @@
+"""ASGI entry point: the async endpoints run on Quart, every other URL on the Flask app.
+
+    hypercorn -w 4 -b 0.0.0.0:8000 asgi:app
+
+Requests matching a route in routes/async_routes.py are served by coroutines
+awaiting the async Mongo driver; the rest of the site (templates, uploads,
+SSE) is passed to the unchanged Flask app, which runs on hypercorn's thread
+pool.
+"""
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from quart import Quart, request
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import Rule
+
+from app import app as flask_app
+from models import metrics
+from models.async_db import close_async_client
+from routes.async_routes import async_auth_bp
+
+# Largest request body forwarded to the Flask app (image uploads go there)
+MAX_WSGI_BODY_BYTES = 16 * 1024 * 1024
+
+
+class RouteSplitter:
+    """Sends requests the async app can route to it and everything else to the WSGI app."""
+
+    def __init__(self, async_app, wsgi_app):
+        self.async_app = async_app
+        self.wsgi_app = AsyncioWSGIMiddleware(wsgi_app, max_body_size=MAX_WSGI_BODY_BYTES)
+        self._urls = async_app.url_map.bind('localhost')
+
+    def _is_async(self, scope):
+        try:
+            self._urls.match(scope['path'], scope['method'])
+            return True
+        except HTTPException:
+            return False
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan' or (scope['type'] == 'http' and self._is_async(scope)):
+            await self.async_app(scope, receive, send)
+        else:
+            await self.wsgi_app(scope, receive, send)
+
+
+def _record_request_metrics(async_app):
+    """Times the async endpoints for /metrics, as routes/ops_routes.py does for Flask."""
+
+    @async_app.before_request
+    async def start_request_metrics():
+        metrics.start_request(request.endpoint or 'unmatched')
+
+    @async_app.after_request
+    async def finish_request_metrics(response):
+        metrics.finish_request(request.method, response.status_code)
+        return response
+
+    @async_app.teardown_request
+    async def finish_failed_request_metrics(exc):
+        # after_request is skipped when a view raises; record those as 500s
+        metrics.finish_request(request.method, 500)
+
+
+def create_asgi_app(wsgi_app):
+    async_app = Quart(__name__, static_folder=None)
+    async_app.secret_key = wsgi_app.secret_key
+    # Same session cookie (name, flags, lifetime) whichever app answers
+    async_app.config.update({key: value for key, value in wsgi_app.config.items()
+                             if key.startswith('SESSION_COOKIE_') or key == 'PERMANENT_SESSION_LIFETIME'})
+    async_app.register_blueprint(async_auth_bp)
+    async_app.after_serving(close_async_client)
+    _record_request_metrics(async_app)
+
+    # Let url_for() in async views build URLs for endpoints that stay on Flask
+    async_endpoints = set(async_app.view_functions)
+    for rule in wsgi_app.url_map.iter_rules():
+        if rule.endpoint not in async_endpoints:
+            async_app.url_map.add(Rule(rule.rule, endpoint=rule.endpoint, methods=rule.methods, build_only=True))
+    return RouteSplitter(async_app, wsgi_app)
+
+
+app = create_asgi_app(flask_app)
@@ -0,0 +1,192 @@
+"""Latency of the store sales analytics over a large synthetic order history.
+
+    python -m benchmarks.analytics --mongo-uri mongodb://localhost:27017 --orders 3000000
+
+Seeds `store_orders` in a throwaway `pizza_bench_analytics` database (kept
+between runs unless --reseed or --orders changes), with order volume skewed
+towards a few busy stores. Then it times sales_analytics() for the busiest
+and a median store over typical dashboard ranges, and the streaming CSV
+export of the busiest store's last 90 days. Reports p50/p95 per scenario,
+the index the range $match used and export throughput / RSS growth. Also
+fetches GET /store/analytics through the app as the busiest store. Exits
+non-zero if any scenario's p95 is over --budget-ms or the endpoint fails.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+from pymongo import MongoClient
+
+from benchmarks.run import percentile, rss_bytes
+from models.analytics import export_sales_lines, parse_range, sales_analytics
+from models.indexes import INDEXES
+
+BENCH_DB = 'pizza_bench_analytics'
+INSERT_BATCH_SIZE = 10000
+
+# (label, days back from today, granularity)
+SCENARIOS = [
+    ('1 day by hour', 1, 'hour'),
+    ('7 days by hour', 7, 'hour'),
+    ('30 days by day', 30, 'day'),
+    ('90 days by week', 90, 'week'),
+    ('1 year by week', 365, 'week'),
+]
+
+
+def synthetic_store_orders(count, stores, customers, items, days, rng):
+    """Yields store orders spread over the last `days` days; store i gets ~1/(i+1) of the volume."""
+    now = datetime.now()
+    weights = [1 / (i + 1) for i in range(stores)]
+    phones = [f'9{i:09d}' for i in range(stores)]
+    # Orders hold item ids as ObjectIds, like those written at checkout
+    menus = [[ObjectId() for _ in range(items)] for _ in range(stores)]
+    for _ in range(count):
+        store = rng.choices(range(stores), weights)[0]
+        lines = [
+            {'product_id': rng.choice(menus[store]), 'name': f'Item {rng.randrange(items)}',
+             'quantity': rng.randint(1, 3), 'price': float(rng.randrange(49, 799)),
+             'store_phone': phones[store]}
+            for _ in range(rng.randint(1, 4))
+        ]
+        customer = rng.randrange(customers)
+        yield {
+            'order_id': ObjectId(),
+            'store_phone': phones[store],
+            'user_id': f'customer{customer}',
+            'customer_name': f'Customer {customer}',
+            'items': lines,
+            'placed_at': now - timedelta(seconds=rng.randrange(days * 86400)),
+            'status': 'delivered',
+        }
+
+
+def seed(db, args):
+    if not args.reseed and db.store_orders.estimated_document_count() == args.orders:
+        print(f"Reusing {args.orders} seeded store orders")
+        return
+    db.store_orders.drop()
+    db.store_orders.create_indexes(INDEXES['store_orders'])
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    batch = []
+    for order in synthetic_store_orders(args.orders, args.stores, args.customers, args.items, args.days, rng):
+        batch.append(order)
+        if len(batch) == INSERT_BATCH_SIZE:
+            db.store_orders.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        db.store_orders.insert_many(batch, ordered=False)
+    print(f"Seeded {args.orders} store orders in {time.perf_counter() - started:.0f}s")
+
+
+def _stores_by_volume(db):
+    counts = db.store_orders.aggregate([{'$group': {'_id': '$store_phone', 'orders': {'$sum': 1}}},
+                                        {'$sort': {'orders': -1}}])
+    return [row['_id'] for row in counts]
+
+
+def _index_used(db, store_phone, start, end):
+    match = {'$match': {'store_phone': store_phone, 'placed_at': {'$gte': start, '$lt': end}}}
+    plan = db.command('explain', {'aggregate': 'store_orders', 'pipeline': [match], 'cursor': {}},
+                      verbosity='queryPlanner')
+    stages, stack = [], [plan]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if node.get('stage') == 'IXSCAN':
+                stages.append(node.get('indexName'))
+            elif node.get('stage') == 'COLLSCAN':
+                stages.append('COLLSCAN')
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+    return ', '.join(sorted(set(stages))) or '?'
+
+
+def check_endpoint(args, store_phone):
+    """Fetches the last 30 days' analytics through the app, as the store's dashboard does.
+
+    Returns an error message, or None if the response was a JSON report with top items.
+    """
+    from models import db as db_module
+    db_module.configure(MONGO_URI=args.mongo_uri, MONGO_DB_NAME=BENCH_DB)
+    from app import app
+
+    store = db_module.get_db().stores.find_one_and_update(
+        {'phone': store_phone}, {'$setOnInsert': {'store_name': 'Bench store', 'owner_name': 'Bench'}},
+        upsert=True, return_document=True)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['store'] = str(store['_id'])
+    response = client.get('/store/analytics?granularity=day')
+    if response.status_code != 200:
+        return f"GET /store/analytics returned {response.status_code}"
+    if not response.get_json()['top_items']:
+        return "GET /store/analytics returned no top items"
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mongo-uri', default=os.environ.get('MONGO_URI', 'mongodb://localhost:27017'))
+    parser.add_argument('--orders', type=int, default=2000000)
+    parser.add_argument('--stores', type=int, default=200)
+    parser.add_argument('--customers', type=int, default=200000)
+    parser.add_argument('--items', type=int, default=40, help='menu items per store')
+    parser.add_argument('--days', type=int, default=365, help='history length')
+    parser.add_argument('--runs', type=int, default=20, help='timed runs per scenario')
+    parser.add_argument('--reseed', action='store_true')
+    parser.add_argument('--budget-ms', type=float, default=500.0, help='fail if any p95 exceeds this')
+    parser.add_argument('--seed', type=int, default=11)
+    args = parser.parse_args(argv)
+
+    client = MongoClient(args.mongo_uri)
+    db = client[BENCH_DB]
+    seed(db, args)
+    ranked = _stores_by_volume(db)
+    targets = {'busiest': ranked[0], 'median': ranked[len(ranked) // 2]}
+    for label, phone in targets.items():
+        print(f"{label} store {phone}: {db.store_orders.count_documents({'store_phone': phone})} orders")
+
+    over_budget = False
+    print(f"{'scenario':<18}{'store':<9}{'orders':>9}{'p50 ms':>9}{'p95 ms':>9}  index")
+    for label, days, granularity in SCENARIOS:
+        start, end, _ = parse_range((datetime.now() - timedelta(days=days)).isoformat(), None, granularity)
+        for target, phone in targets.items():
+            latencies = []
+            for _ in range(args.runs):
+                started = time.perf_counter()
+                report = sales_analytics(phone, start, end, granularity, db=db)
+                latencies.append((time.perf_counter() - started) * 1000)
+            latencies.sort()
+            p95 = percentile(latencies, 95)
+            over_budget |= p95 > args.budget_ms
+            print(f"{label:<18}{target:<9}{report['orders']:>9}{percentile(latencies, 50):>9.1f}{p95:>9.1f}  "
+                  f"{_index_used(db, phone, start, end)}")
+
+    start, end, _ = parse_range((datetime.now() - timedelta(days=90)).isoformat())
+    rss_before = rss_bytes()
+    started = time.perf_counter()
+    size = rows = 0
+    for chunk in export_sales_lines(targets['busiest'], start, end, db=db):
+        size += len(chunk)
+        rows += chunk.count('\n')
+    seconds = time.perf_counter() - started
+    print(f"CSV export, busiest store, 90 days: {rows - 1} rows, {size / 2 ** 20:.1f} MiB in {seconds:.1f}s "
+          f"({(rows - 1) / seconds:.0f} rows/s), RSS +{(rss_bytes() - rss_before) / 2 ** 20:.0f} MiB")
+
+    failure = check_endpoint(args, targets['busiest'])
+    print(failure or "GET /store/analytics: 200")
+
+    if over_budget:
+        print(f"p95 over the {args.budget_ms} ms budget")
+    return 1 if over_budget or failure else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
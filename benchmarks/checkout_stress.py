@@ -0,0 +1,154 @@
+"""Concurrency stress test of stock reservation at checkout.
+
+    python -m benchmarks.checkout_stress --mongo-uri mongodb://localhost:27017
+    python -m benchmarks.checkout_stress --in-memory --checkouts 500 --stock 150
+
+Seeds a throwaway `pizza_bench_stock` database with one popular pizza with
+--stock units (plus a side with a tenth of that, which about half the carts
+also hold), fills --checkouts carts through the real routes, then releases
+every POST /place-order at once from --checkouts threads, so they all race
+for the same few documents. Checks that:
+
+    - every checkout got a 200 or a 409 (sold out), nothing else
+    - no item was oversold: its stock never went below zero and what left
+      stock equals what the placed orders hold
+    - no reservation was left behind, and stock taken for a rejected
+      checkout (pizza taken, side sold out) was put back
+
+Reports p50/p95/p99 latency of accepted and rejected checkouts. Exits
+non-zero if any check fails.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bson.objectid import ObjectId
+
+from benchmarks.run import _start_inmemory_mongod, percentile
+
+BENCH_DB = 'pizza_bench_stock'
+STORE_PHONE = '9000000000'
+
+
+def seed(db, checkouts, stock):
+    """Inserts the store, the two stocked items and one customer per checkout; returns the item ids."""
+    store_id = ObjectId()
+    db.stores.insert_one({'_id': store_id, 'store_name': 'Stress Pizzeria', 'owner_name': 'Owner',
+                          'phone': STORE_PHONE, 'password': 'x'})
+    items = {}
+    for name, category, units in (('Margherita', 'Pizza', stock), ('Garlic Bread', 'Breads', max(stock // 10, 1))):
+        items[name] = db.items.insert_one({
+            'store_id': store_id, 'store_name': 'Stress Pizzeria', 'store_owner': 'Owner', 'store_phone': STORE_PHONE,
+            'name': name, 'price': 299.0, 'description': '', 'category': category, 'category_lc': category.lower(),
+            'image_id': None, 'stock': units,
+        }).inserted_id
+    address = {'flat_no': '1', 'street': 'Main', 'landmark': 'Park', 'city': 'Pune', 'state': 'MH', 'pincode': '411001'}
+    customers = [{'_id': ObjectId(), 'name': f'Customer {i}', 'phone': f'8{i:09d}', 'address': address}
+                 for i in range(checkouts)]
+    db.customers.insert_many(customers)
+    return items, [str(c['_id']) for c in customers]
+
+
+def fill_cart(app, customer_id, items, rng):
+    """A logged-in client whose cart holds 1-2 pizzas and, half the time, a side."""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['customer'] = customer_id
+    pizza = str(items['Margherita'])
+    client.post('/api/cart/add', json={'item_id': pizza})
+    client.post('/api/update-cart-quantity', json={'item_id': pizza, 'quantity': rng.randint(1, 2)})
+    if rng.random() < 0.5:
+        client.post('/api/cart/add', json={'item_id': str(items['Garlic Bread'])})
+    return client
+
+
+def check(db, items, stock, results):
+    """Returns a list of failed invariants (empty when the run was correct)."""
+    from models.stock import RESERVATION_COLLECTION
+
+    failures = []
+    statuses = {status for status, _ in results}
+    if not statuses <= {200, 409}:
+        failures.append(f"unexpected statuses {sorted(statuses - {200, 409})}")
+    accepted = sum(1 for status, _ in results if status == 200)
+    if db.orders.count_documents({}) != accepted:
+        failures.append(f"{accepted} checkouts accepted but {db.orders.count_documents({})} orders written")
+
+    initial = {'Margherita': stock, 'Garlic Bread': max(stock // 10, 1)}
+    for name, item_id in items.items():
+        left = db.items.find_one({'_id': item_id}, {'stock': 1})['stock']
+        ordered = sum(line['quantity'] for order in db.orders.find({'items.product_id': item_id}, {'items': 1})
+                      for line in order['items'] if line['product_id'] == item_id)
+        print(f"{name}: {initial[name]} in stock, {ordered} ordered, {left} left")
+        if left < 0:
+            failures.append(f"{name} oversold: stock is {left}")
+        if initial[name] - left != ordered:
+            failures.append(f"{name}: stock fell by {initial[name] - left} but orders hold {ordered}")
+    if db[RESERVATION_COLLECTION].count_documents({}):
+        failures.append(f"{db[RESERVATION_COLLECTION].count_documents({})} reservations left behind")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mongo-uri', default=os.environ.get('MONGO_URI', 'mongodb://localhost:27017'))
+    parser.add_argument('--in-memory', action='store_true', help='run against a throwaway mongod (pymongo_inmemory)')
+    parser.add_argument('--checkouts', type=int, default=400, help='concurrent checkouts (one thread each)')
+    parser.add_argument('--stock', type=int, default=150, help='units of the popular pizza')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args(argv)
+
+    mongod = _start_inmemory_mongod() if args.in_memory else None
+    uri = mongod.connection_string if mongod else args.mongo_uri
+
+    from models import db as db_module
+    db_module.configure(MONGO_URI=uri, MONGO_DB_NAME=BENCH_DB)
+
+    from app import app
+
+    try:
+        db_module.get_client().drop_database(BENCH_DB)
+        db = db_module.get_db()
+        items, customers = seed(db, args.checkouts, args.stock)
+        rng = random.Random(args.seed)
+        clients = [fill_cart(app, customer_id, items, rng) for customer_id in customers]
+
+        start = threading.Barrier(len(clients))
+
+        def checkout(client):
+            start.wait()
+            started = time.perf_counter()
+            response = client.post('/place-order', data={'method': 'cod'})
+            return response.status_code, (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(clients)) as pool:
+            results = list(pool.map(checkout, clients))
+        wall = time.perf_counter() - started
+
+        print(f"{len(results)} concurrent checkouts in {wall:.2f}s ({len(results) / wall:.0f}/s)")
+        print(f"{'outcome':<10}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for label, status in (('accepted', 200), ('sold out', 409)):
+            latencies = sorted(ms for code, ms in results if code == status)
+            print(f"{label:<10}{len(latencies):>6}{percentile(latencies, 50):>10.1f}"
+                  f"{percentile(latencies, 95):>10.1f}{percentile(latencies, 99):>10.1f}")
+
+        failures = check(db, items, args.stock, results)
+        for failure in failures:
+            print(f"FAIL {failure}", file=sys.stderr)
+        if not failures:
+            print("No oversell; every reservation was committed or released")
+        return 1 if failures else 0
+    finally:
+        db_module.get_client().drop_database(BENCH_DB)
+        db_module.close_client()
+        if mongod:
+            mongod.stop()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
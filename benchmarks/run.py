@@ -0,0 +1,280 @@
+"""End-to-end benchmark of the customer and store journeys through the real routes.
+
+    python -m benchmarks.run --mongo-uri mongodb://localhost:27017
+    python -m benchmarks.run --in-memory --write-baseline baseline.json
+    python -m benchmarks.run --in-memory --baseline baseline.json
+
+Seeds a throwaway `pizza_bench` database, then drives the app in-process with
+Flask test clients from --concurrency threads:
+
+    customer: register -> login -> /api/category -> add to cart x3
+              -> update quantity -> view cart -> place order
+    store:    login -> dashboard -> add item (with image)
+
+For every route it reports p50/p95/p99 latency, throughput, Mongo commands
+per request (via a pymongo CommandListener) and RSS growth. With --baseline
+it exits non-zero if any route's p95 regressed by more than --tolerance.
+Latencies depend on the machine, so no baseline is committed: record one
+with --write-baseline on the machine that will do the comparing.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from pymongo import monitoring
+
+BENCH_DB = 'pizza_bench'
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def rss_bytes():
+    """Current resident set size of this process."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts Mongo commands issued by each thread, so they can be charged to the route it is serving."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.background = 0
+
+    def reset(self):
+        self._local.count = 0
+
+    def count(self):
+        return getattr(self._local, 'count', 0)
+
+    def started(self, event):
+        if hasattr(self._local, 'count'):
+            self._local.count += 1
+        else:
+            with self._lock:
+                self.background += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+class Recorder:
+    def __init__(self, counter):
+        self.counter = counter
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.ops = defaultdict(int)
+        self.rss_growth = defaultdict(int)
+        self.errors = defaultdict(int)
+
+    def call(self, route, request):
+        """Runs one request, charging its latency, Mongo commands and RSS growth to `route`."""
+        self.counter.reset()
+        rss_before = rss_bytes()
+        started = time.perf_counter()
+        response = request()
+        elapsed = time.perf_counter() - started
+        rss_after = rss_bytes()
+        with self._lock:
+            self.latencies[route].append(elapsed)
+            self.ops[route] += self.counter.count()
+            self.rss_growth[route] = max(self.rss_growth[route], rss_after - rss_before)
+            if response.status_code >= 400:
+                self.errors[route] += 1
+        return response
+
+    def report(self, wall_seconds):
+        routes = {}
+        for route, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            routes[route] = {
+                'count': len(values),
+                'p50_ms': round(percentile(values, 50) * 1000, 3),
+                'p95_ms': round(percentile(values, 95) * 1000, 3),
+                'p99_ms': round(percentile(values, 99) * 1000, 3),
+                'throughput_rps': round(len(values) / wall_seconds, 2),
+                'mongo_ops_per_request': round(self.ops[route] / len(values), 2),
+                'max_rss_growth_kb': self.rss_growth[route] // 1024,
+                'errors': self.errors[route],
+            }
+        total = sum(r['count'] for r in routes.values())
+        return {
+            'wall_seconds': round(wall_seconds, 3),
+            'requests': total,
+            'throughput_rps': round(total / wall_seconds, 2),
+            'rss_mb': round(rss_bytes() / 2**20, 1),
+            'background_mongo_ops': self.counter.background,
+            'routes': routes,
+        }
+
+
+def customer_journey(app, recorder, n, rng):
+    from benchmarks.seed import CUSTOMER_PIN
+
+    client = app.test_client()
+    phone = f'7{n:09d}'
+    recorder.call('customer_register', lambda: client.post('/customer/register', data={
+        'name': f'Bench {n}', 'phone': phone, 'email': f'bench{n}@bench.test', 'pin': CUSTOMER_PIN,
+        'flat_no': '1', 'street': 'Main', 'landmark': 'Park', 'city': 'Pune', 'state': 'MH', 'pincode': '411001',
+    }))
+    recorder.call('customer_login', lambda: client.post('/customer/login', data={'phone': phone, 'pin': CUSTOMER_PIN}))
+
+    category = rng.choice(['all', 'pizza', 'breads', 'beverage'])
+    page = recorder.call('api_category_products', lambda: client.get(f'/api/category/{category}?limit=24'))
+    picked = rng.sample(page.get_json()['items'], 3)
+    for item in picked:
+        recorder.call('api_add_to_cart', lambda: client.post('/api/cart/add', json={'item_id': item['_id']}))
+    recorder.call('api_update_cart_quantity', lambda: client.post(
+        '/api/update-cart-quantity', json={'item_id': picked[0]['_id'], 'quantity': 2}))
+    recorder.call('view_cart', lambda: client.get('/cart'))
+    recorder.call('place_order', lambda: client.post('/place-order', data={'method': 'cod'}))
+
+
+def store_journey(app, recorder, n, rng, stores, image):
+    from benchmarks.seed import STORE_PASSWORD, store_phone
+
+    client = app.test_client()
+    phone = store_phone(n % stores)
+    recorder.call('store_login', lambda: client.post('/store/login', data={'phone': phone, 'password': STORE_PASSWORD}))
+    recorder.call('store_dashboard', lambda: client.get('/store/dashboard'))
+    recorder.call('add_item', lambda: client.post('/store/add-item', content_type='multipart/form-data', data={
+        'name': f'Bench item {n}', 'price': '199', 'description': 'Added by the benchmark',
+        'category': rng.choice(['Pizza', 'Breads', 'Beverage']),
+        'image': (io.BytesIO(image), 'item.jpg', 'image/jpeg'),
+    }))
+
+
+def compare(report, baseline, tolerance):
+    """Returns the routes whose p95 regressed by more than `tolerance` against the baseline."""
+    regressions = []
+    for route, stats in report['routes'].items():
+        base = baseline.get('routes', {}).get(route)
+        if base and base['p95_ms'] > 0 and stats['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append((route, base['p95_ms'], stats['p95_ms']))
+    return regressions
+
+
+def print_report(report):
+    print(f"\n{'route':<26}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}{'ops/req':>9}{'rss KB':>9}{'err':>5}")
+    for route, s in report['routes'].items():
+        print(f"{route:<26}{s['count']:>6}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}"
+              f"{s['throughput_rps']:>9.1f}{s['mongo_ops_per_request']:>9.1f}{s['max_rss_growth_kb']:>9}{s['errors']:>5}")
+    print(f"\n{report['requests']} requests in {report['wall_seconds']}s "
+          f"({report['throughput_rps']} req/s), RSS {report['rss_mb']} MB, "
+          f"{report['background_mongo_ops']} background Mongo commands")
+
+
+def _start_inmemory_mongod():
+    try:
+        from pymongo_inmemory.context import Context
+        from pymongo_inmemory.mongod import Mongod
+    except ImportError:
+        sys.exit("--in-memory needs the 'pymongo_inmemory' package (pip install pymongo_inmemory)")
+    mongod = Mongod(Context())
+    mongod.start()
+    return mongod
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mongo-uri', default=os.environ.get('MONGO_URI', 'mongodb://localhost:27017'))
+    parser.add_argument('--in-memory', action='store_true', help='run against a throwaway mongod (pymongo_inmemory)')
+    parser.add_argument('--stores', type=int, default=20)
+    parser.add_argument('--items', type=int, default=500)
+    parser.add_argument('--orders', type=int, default=5000)
+    parser.add_argument('--customer-journeys', type=int, default=200)
+    parser.add_argument('--store-journeys', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json-out', help='write the full report as JSON')
+    parser.add_argument('--baseline', help='baseline JSON to compare p95 latencies against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p95 slowdown vs baseline (0.25 = 25%%)')
+    parser.add_argument('--write-baseline', help='save this run as the new baseline')
+    args = parser.parse_args(argv)
+
+    mongod = _start_inmemory_mongod() if args.in_memory else None
+    uri = mongod.connection_string if mongod else args.mongo_uri
+
+    from models import db as db_module
+    counter = CommandCounter()
+    db_module.configure(MONGO_URI=uri, MONGO_DB_NAME=BENCH_DB)
+    db_module.register_listener(counter)
+
+    from app import app
+    from benchmarks.seed import _image_bytes, seed
+
+    try:
+        db_module.get_client().drop_database(BENCH_DB)
+        db = db_module.get_db()
+        started = time.perf_counter()
+        summary = seed(db, stores=args.stores, items=args.items, orders=args.orders, seed_value=args.seed)
+        print(f"Seeded {summary} in {time.perf_counter() - started:.1f}s")
+
+        rng = random.Random(args.seed)
+        image = _image_bytes(rng)
+        recorder = Recorder(counter)
+        jobs = [('customer', i) for i in range(args.customer_journeys)] + [('store', i) for i in range(args.store_journeys)]
+        rng.shuffle(jobs)
+
+        def run(job):
+            kind, n = job
+            job_rng = random.Random(args.seed * 100003 + n * 2 + (kind == 'store'))
+            if kind == 'customer':
+                customer_journey(app, recorder, n, job_rng)
+            else:
+                store_journey(app, recorder, n, job_rng, args.stores, image)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for _ in pool.map(run, jobs):
+                pass
+        report = recorder.report(time.perf_counter() - started)
+        report['params'] = vars(args)
+        print_report(report)
+
+        if args.json_out:
+            with open(args.json_out, 'w') as f:
+                json.dump(report, f, indent=2)
+        if args.write_baseline:
+            with open(args.write_baseline, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"Baseline written to {args.write_baseline}")
+        if args.baseline:
+            with open(args.baseline) as f:
+                regressions = compare(report, json.load(f), args.tolerance)
+            for route, before, after in regressions:
+                print(f"REGRESSION {route}: p95 {before:.2f} ms -> {after:.2f} ms", file=sys.stderr)
+            if regressions:
+                return 1
+            print(f"No route regressed by more than {args.tolerance:.0%} against {args.baseline}")
+        return 0
+    finally:
+        db_module.get_client().drop_database(BENCH_DB)
+        db_module.close_client()
+        if mongod:
+            mongod.stop()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
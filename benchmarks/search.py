@@ -0,0 +1,111 @@
+"""Latency of the in-process catalogue search index at scale.
+
+    python -m benchmarks.search --items 100000 --budget-ms 10
+
+Builds a SearchIndex over synthetic items (no MongoDB needed), then times
+exact, multi-word, prefix (search-as-you-type) and one-typo queries. Reports
+build time, memory and p50/p95/p99 per query kind. Exits non-zero if any
+kind's p95 is over --budget-ms.
+"""
+import argparse
+import random
+import sys
+import time
+
+from benchmarks.run import percentile, rss_bytes
+from models.search import SearchIndex
+
+TOPPINGS = ['margherita', 'pepperoni', 'farmhouse', 'paneer', 'tikka', 'mushroom', 'olive', 'jalapeno',
+            'capsicum', 'onion', 'corn', 'chicken', 'barbecue', 'hawaiian', 'pineapple', 'sausage',
+            'veggie', 'cheese', 'burst', 'mexican', 'peri', 'tandoori', 'keema', 'spinach', 'garlic']
+STYLES = ['classic', 'deluxe', 'supreme', 'fiery', 'loaded', 'thin', 'crust', 'double', 'stuffed', 'wood', 'fired']
+CATEGORIES = {
+    'Pizza': ['pizza'],
+    'Breads': ['garlic bread', 'breadsticks', 'focaccia', 'calzone'],
+    'Beverage': ['cola', 'lemonade', 'iced tea', 'cold coffee', 'mojito', 'milkshake'],
+}
+DESCRIPTION_WORDS = ['fresh', 'hand', 'tossed', 'dough', 'mozzarella', 'tomato', 'sauce', 'basil', 'oregano',
+                     'chilli', 'flakes', 'smoky', 'creamy', 'crispy', 'baked', 'golden', 'served', 'hot',
+                     'chilled', 'sweet', 'tangy', 'herbs', 'spicy', 'signature', 'house', 'blend']
+CITIES = ['pune', 'mumbai', 'nagpur', 'nashik', 'indore', 'goa', 'surat', 'bhopal']
+
+
+def synthetic_items(count, stores, rng):
+    for i in range(count):
+        category = rng.choice(list(CATEGORIES))
+        base = rng.choice(CATEGORIES[category])
+        name = ' '.join(rng.sample(STYLES, 1) + rng.sample(TOPPINGS, rng.randint(1, 2)) + [base]).title()
+        yield {
+            '_id': f'item{i}',
+            'name': f'{name} {i % 97}',
+            'description': ' '.join(rng.choices(DESCRIPTION_WORDS + TOPPINGS, k=12)),
+            'category': category,
+            'price': float(rng.randrange(49, 799)),
+            'store_name': f'{rng.choice(CITIES).title()} Pizzeria {i % stores}',
+        }
+
+
+def _typo(word, rng):
+    i = rng.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:] if rng.random() < 0.5 else word[:i] + word[i + 1:]
+
+
+def queries(kind, rng):
+    if kind == 'exact':
+        return rng.choice(TOPPINGS + STYLES + DESCRIPTION_WORDS)
+    if kind == 'multi':
+        return f'{rng.choice(STYLES)} {rng.choice(TOPPINGS)} {rng.choice(["pizza", "bread", "cola"])}'
+    if kind == 'prefix':
+        word = rng.choice(TOPPINGS)
+        return f'{rng.choice(STYLES)} {word[:rng.randint(1, 4)]}'
+    return _typo(rng.choice([w for w in TOPPINGS + DESCRIPTION_WORDS if len(w) >= 5]), rng)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=100000)
+    parser.add_argument('--stores', type=int, default=500)
+    parser.add_argument('--queries', type=int, default=2000, help='queries per kind')
+    parser.add_argument('--limit', type=int, default=24)
+    parser.add_argument('--budget-ms', type=float, default=10.0, help='fail if any p95 exceeds this')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args(argv)
+    rng = random.Random(args.seed)
+
+    rss_before = rss_bytes()
+    started = time.perf_counter()
+    index = SearchIndex()
+    for item in synthetic_items(args.items, args.stores, rng):
+        index.upsert(item)
+    build_seconds = time.perf_counter() - started
+    print(f'indexed {len(index)} items in {build_seconds:.1f}s, '
+          f'RSS +{(rss_bytes() - rss_before) / 2 ** 20:.0f} MiB')
+
+    started = time.perf_counter()
+    for i in range(1000):
+        index.upsert({'_id': f'item{i}', 'name': f'Edited Margherita {i}', 'category': 'Pizza'})
+    print(f're-indexed 1000 edited items in {(time.perf_counter() - started) * 1000:.0f} ms')
+
+    over_budget = False
+    print(f"{'kind':<8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'avg hits':>10}")
+    for kind in ('exact', 'multi', 'prefix', 'typo'):
+        latencies, hits = [], 0
+        for _ in range(args.queries):
+            query = queries(kind, rng)
+            started = time.perf_counter()
+            hits += len(index.search(query, args.limit))
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+        p95 = percentile(latencies, 95)
+        over_budget |= p95 > args.budget_ms
+        print(f'{kind:<8}{percentile(latencies, 50):>9.2f}{p95:>9.2f}{percentile(latencies, 99):>9.2f}'
+              f'{hits / args.queries:>10.1f}')
+
+    if over_budget:
+        print(f'p95 over the {args.budget_ms} ms budget')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
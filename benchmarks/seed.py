@@ -0,0 +1,121 @@
+"""Synthetic dataset for the benchmark suite: N stores, M items (with images) and K orders."""
+import io
+import random
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+
+from models.indexes import ensure_indexes, normalize_category
+from models.media import save_image
+from models.sales import rebuild_sales_rollups
+from models.stores import store_ref
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+CATEGORIES = ('Pizza', 'Breads', 'Beverage')
+STORE_PASSWORD = 'bench'
+CUSTOMER_PIN = '1234'
+
+
+def _image_bytes(rng, size=(640, 480)):
+    """Returns a small JPEG (or random bytes without Pillow) standing in for an upload."""
+    if Image is None:
+        return rng.randbytes(40_000)
+    img = Image.new('RGB', size, tuple(rng.randrange(256) for _ in range(3)))
+    out = io.BytesIO()
+    img.save(out, format='JPEG', quality=80)
+    return out.getvalue()
+
+
+def _address(rng, i):
+    return {
+        'flat_no': str(i), 'street': f'Street {rng.randrange(100)}', 'landmark': 'Near park',
+        'city': 'Pune', 'state': 'Maharashtra', 'pincode': f'4110{rng.randrange(10, 60)}',
+    }
+
+
+def store_phone(i):
+    return f'9{i:09d}'
+
+
+def customer_phone(i):
+    return f'8{i:09d}'
+
+
+def seed(db, stores=20, items=500, orders=5000, images=20, customers=200, seed_value=42):
+    """Fills db with a reproducible dataset and returns a summary of what was created."""
+    rng = random.Random(seed_value)
+    ensure_indexes(db)
+
+    store_docs = [
+        {
+            '_id': ObjectId(), 'store_name': f'Bench Pizzeria {i}', 'owner_name': f'Owner {i}', 'phone': store_phone(i),
+            'email': f'store{i}@bench.test', 'password': STORE_PASSWORD, 'address': _address(rng, i),
+        }
+        for i in range(stores)
+    ]
+    db.stores.insert_many(store_docs)
+
+    image_ids = [save_image(_image_bytes(rng), 'image/jpeg', db=db) for _ in range(images)]
+    item_docs = []
+    for i in range(items):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        item_docs.append({
+            '_id': ObjectId(),
+            **store_ref(store_docs[i % stores]), 'name': f'{category} special {i}',
+            'price': float(rng.randrange(99, 699)), 'description': 'Synthetic benchmark item ' * 4,
+            'category': category, 'category_lc': normalize_category(category),
+            'store_phone': store_phone(i % stores), 'image_id': rng.choice(image_ids),
+        })
+    db.items.insert_many(item_docs)
+
+    customer_docs = [
+        {'_id': ObjectId(), 'name': f'Customer {i}', 'phone': customer_phone(i), 'email': f'c{i}@bench.test',
+         'pin': CUSTOMER_PIN, 'address': _address(rng, i)}
+        for i in range(customers)
+    ]
+    db.customers.insert_many(customer_docs)
+
+    now = datetime.now()
+    batch = []
+    for _ in range(orders):
+        customer = rng.choice(customer_docs)
+        lines = [
+            {'product_id': item['_id'], 'name': item['name'], 'quantity': rng.randrange(1, 4),
+             'price': item['price'], 'store_phone': item['store_phone']}
+            for item in rng.sample(item_docs, rng.randrange(1, 4))
+        ]
+        subtotal = sum(line['price'] * line['quantity'] for line in lines)
+        batch.append({
+            'user_id': customer['_id'], 'name': customer['name'], 'address': customer['address'],
+            'phone': customer['phone'], 'items': lines, 'total_amount': subtotal * 1.05 + 40,
+            'payment_method': 'cod', 'placed_at': now - timedelta(minutes=rng.randrange(60 * 24 * 30)),
+            'status': 'delivered', 'queue': {'state': 'done', 'rolled_up': True},
+        })
+        if len(batch) == 1000:
+            db.orders.insert_many(batch)
+            batch = []
+    if batch:
+        db.orders.insert_many(batch)
+    rebuild_sales_rollups(db)
+
+    return {'stores': stores, 'items': items, 'orders': orders, 'customers': customers, 'images': images}
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from models.db import configure, get_db
+
+    parser = argparse.ArgumentParser(description='Seed the configured database with the benchmark dataset.')
+    parser.add_argument('--stores', type=int, default=20)
+    parser.add_argument('--items', type=int, default=500)
+    parser.add_argument('--orders', type=int, default=5000)
+    parser.add_argument('--db-name', help='database to fill (default: MONGO_DB_NAME)')
+    args = parser.parse_args()
+    if args.db_name:
+        configure(MONGO_DB_NAME=args.db_name)
+    print(seed(get_db(), stores=args.stores, items=args.items, orders=args.orders))
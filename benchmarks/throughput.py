@@ -0,0 +1,96 @@
+"""Closed-loop HTTP load against a running server, to compare WSGI and ASGI serving.
+
+    gunicorn -w 2 -b :8000 app:app          &   python -m benchmarks.throughput http://127.0.0.1:8000 --server-cores 2
+    hypercorn -w 2 -b :8001 asgi:app        &   python -m benchmarks.throughput http://127.0.0.1:8001 --server-cores 2
+
+Each of --connections keep-alive connections sends its next request as soon
+as the previous response arrives, for --seconds. Seed the served database
+first with `python -m benchmarks.seed --db-name <db>`. Reports requests/s
+overall and per server core.
+"""
+import argparse
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+from benchmarks.run import percentile
+
+DEFAULT_PATHS = ['/api/category/all?limit=24', '/api/category/pizza?limit=24&fields=name,price,store_owner']
+
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('server closed the connection')
+    status = int(status_line.split()[1])
+    length, chunked = 0, False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'transfer-encoding' and 'chunked' in value.lower():
+            chunked = True
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length:
+        await reader.readexactly(length)
+    return status
+
+
+async def _connection(host, port, paths, deadline, latencies, errors, offset):
+    reader, writer = await asyncio.open_connection(host, port)
+    i = offset
+    try:
+        while time.perf_counter() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n'.encode())
+            started = time.perf_counter()
+            status = await _read_response(reader)
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def run_load(base_url, paths, connections, seconds):
+    parts = urlsplit(base_url)
+    latencies, errors = [], []
+    started = time.perf_counter()
+    deadline = started + seconds
+    await asyncio.gather(*(
+        _connection(parts.hostname, parts.port or 80, paths, deadline, latencies, errors, n)
+        for n in range(connections)
+    ))
+    return latencies, errors, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base_url')
+    parser.add_argument('--path', action='append', dest='paths', help='path to request (repeatable)')
+    parser.add_argument('--connections', type=int, default=64)
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--server-cores', type=int, default=1, help='cores (workers) the server was given')
+    args = parser.parse_args(argv)
+
+    latencies, errors, elapsed = asyncio.run(run_load(args.base_url, args.paths or DEFAULT_PATHS, args.connections, args.seconds))
+    latencies.sort()
+    rps = len(latencies) / elapsed
+    print(f"{len(latencies)} requests in {elapsed:.1f}s over {args.connections} connections, {len(errors)} errors")
+    print(f"throughput {rps:.1f} req/s, {rps / args.server_cores:.1f} req/s per core")
+    print(f"latency p50 {percentile(latencies, 50) * 1000:.1f} ms, "
+          f"p95 {percentile(latencies, 95) * 1000:.1f} ms, p99 {percentile(latencies, 99) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
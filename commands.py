@@ -0,0 +1,139 @@
+import time
+
+import click
+from models.archive import ARCHIVE_AFTER_DAYS, archive_orders
+from models.assets import assets
+from models.db import get_db
+from models.geo import geocode_addresses, import_pincodes
+from models.indexes import backfill_category_lc, ensure_indexes, find_collscans
+from models.media import migrate_inline_images
+from models.menus import FORMATS, MenuFormatError, export_menu, import_menu, menu_format
+from models.orders import OrderDispatcher
+from models.sales import rebuild_sales_rollups
+from models.stock import RESERVATION_TIMEOUT_SECONDS, release_stale_reservations
+from models.stores import backfill_store_refs
+
+
+def register_commands(app):
+    """Attaches maintenance commands to `flask --app app <command>`."""
+
+    @app.cli.command('migrate-images')
+    def migrate_images_command():
+        """Moves inline base64 item images into the media store."""
+        migrated = migrate_inline_images()
+        click.echo(f"Migrated {migrated} item image(s).")
+
+    @app.cli.command('build-assets')
+    @click.option('--out', default='static/dist', show_default=True, type=click.Path(file_okay=False),
+                  help='Directory to write fingerprinted bundles to.')
+    def build_assets_command(out):
+        """Writes the fingerprinted CSS/JS bundles with .gz/.br variants, for a front proxy to serve."""
+        click.echo(f"Wrote {assets.build(out)} bundle(s) to {out}.")
+
+    @app.cli.command('import-menu')
+    @click.argument('menu_path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--images', type=click.Path(exists=True, dir_okay=False), help='Zip of the files named in the image column.')
+    @click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Defaults to the file extension.')
+    @click.option('--store-phone', help='Import every row into this store instead of each row\'s store_phone.')
+    def import_menu_command(menu_path, images, fmt, store_phone):
+        """Bulk-upserts menu items from a CSV or NDJSON file."""
+        store = None
+        if store_phone:
+            store = get_db().stores.find_one({'phone': store_phone})
+            if store is None:
+                raise click.BadParameter(f"No store with phone {store_phone}", param_hint='--store-phone')
+        try:
+            with open(menu_path, 'rb') as menu:
+                summary = import_menu(menu, fmt or menu_format(menu_path), store=store, images=images)
+        except MenuFormatError as exc:
+            raise click.ClickException(str(exc))
+        for error in summary['errors']:
+            click.echo(f"row {error['row']}: {'; '.join(error['errors'])}", err=True)
+        click.echo(f"{summary['rows']} row(s): {summary['inserted']} inserted, {summary['updated']} updated, "
+                   f"{summary['failed']} failed.")
+        if summary['failed']:
+            raise SystemExit(1)
+
+    @app.cli.command('export-menu')
+    @click.option('--store-phone', help='Export one store (default: every store).')
+    @click.option('--format', 'fmt', type=click.Choice(FORMATS), default='csv', show_default=True)
+    @click.option('--out', type=click.File('w'), default='-', help='Output file (default: stdout).')
+    def export_menu_command(store_phone, fmt, out):
+        """Streams menu items as CSV or NDJSON, in the format import-menu reads."""
+        for chunk in export_menu(store_phone, fmt):
+            out.write(chunk)
+
+    @app.cli.command('init-indexes')
+    @click.option('--check/--no-check', default=True, help='Explain route queries and report COLLSCANs.')
+    def init_indexes_command(check):
+        """Backfills derived fields and creates the indexes the routes rely on."""
+        click.echo(f"Backfilled category_lc on {backfill_category_lc()} item(s).")
+        for collection, names in ensure_indexes().items():
+            click.echo(f"{collection}: {', '.join(names)}")
+        if not check:
+            return
+        collscans = find_collscans()
+        for scan in collscans:
+            detail = f" ({scan['error']})" if 'error' in scan else ''
+            click.echo(f"COLLSCAN {scan['route']}: {scan['collection']} {scan['filter']}{detail}", err=True)
+        if collscans:
+            raise SystemExit(1)
+        click.echo("All route queries use an index.")
+
+    @app.cli.command('backfill-store-refs')
+    def backfill_store_refs_command():
+        """Copies store_id and the store name onto items that lack them or hold a stale copy."""
+        click.echo(f"Updated store references on {backfill_store_refs()} item(s).")
+
+    @app.cli.command('archive-orders')
+    @click.option('--older-than-days', default=ARCHIVE_AFTER_DAYS, show_default=True,
+                  help='Archive delivered orders placed more than this many days ago.')
+    @click.option('--every', default=0, help='Keep running, archiving every N seconds.')
+    def archive_orders_command(older_than_days, every):
+        """Moves old delivered orders into the compressed orders_archive collection."""
+        while True:
+            click.echo(f"Archived {archive_orders(older_than_days)} order(s).")
+            if not every:
+                return
+            try:
+                time.sleep(every)
+            except KeyboardInterrupt:
+                return
+
+    @app.cli.command('rebuild-sales')
+    def rebuild_sales_command():
+        """Rebuilds the per-store daily sales rollups from the orders collection."""
+        replayed = rebuild_sales_rollups()
+        click.echo(f"Rebuilt sales rollups from {replayed} order(s).")
+
+    @app.cli.command('release-stock')
+    @click.option('--older-than', default=RESERVATION_TIMEOUT_SECONDS, show_default=True,
+                  help='Release reservations whose order hasn\'t appeared after this many seconds.')
+    def release_stock_command(older_than):
+        """Returns stock held by checkouts that never completed (order workers also do this when idle)."""
+        click.echo(f"Released {release_stale_reservations(older_than)} abandoned reservation(s).")
+
+    @app.cli.command('import-pincodes')
+    @click.argument('csv_path', type=click.Path(exists=True, dir_okay=False))
+    def import_pincodes_command(csv_path):
+        """Loads a pincode/latitude/longitude CSV into the local geocoding table."""
+        click.echo(f"Imported {import_pincodes(csv_path)} pincode(s).")
+
+    @app.cli.command('geocode-addresses')
+    def geocode_addresses_command():
+        """Sets locations on stores and customers registered before geocoding (or before their pincode was known)."""
+        for collection, count in geocode_addresses().items():
+            click.echo(f"{collection}: geocoded {count}")
+
+    @app.cli.command('order-worker')
+    @click.option('--threads', default=4, show_default=True, help='Concurrent dispatch threads.')
+    def order_worker_command(threads):
+        """Runs a dedicated order dispatcher until interrupted (set ORDER_WORKERS=0 on web workers)."""
+        dispatcher = OrderDispatcher(threads).start()
+        click.echo(f"Dispatching orders with {threads} thread(s); Ctrl+C to stop.")
+        try:
+            while True:
+                time.sleep(60)
+                click.echo(dispatcher.stats())
+        except KeyboardInterrupt:
+            dispatcher.stop()
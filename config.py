@@ -0,0 +1,74 @@
+import os
+
+from models.db import DEFAULTS as MONGO_DEFAULTS
+
+
+def _flag(name, default):
+    return os.environ.get(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+
+
+# Only ever used with DEBUG or TESTING on, so dev sessions survive reloads
+DEV_SECRET_KEY = 'dev-only-insecure-secret-key'
+
+
+class Config:
+    """Settings shared by every environment, read from the environment at import."""
+    SECRET_KEY = os.environ.get('SECRET_KEY')
+    DEBUG = False
+    TESTING = False
+    SESSION_COOKIE_HTTPONLY = True
+    SESSION_COOKIE_SAMESITE = 'Lax'
+    SESSION_COOKIE_SECURE = _flag('SESSION_COOKIE_SECURE', False)
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))
+    # Prime Mongo connections, templates and catalogue caches before serving
+    WARM_UP = _flag('WARM_UP', True)
+    WARM_UP_CATEGORIES = ('all', 'pizza', 'breads', 'beverage')
+    # Link page CSS/JS by content hash under /assets (long-lived, precompressed)
+    FINGERPRINT_ASSETS = _flag('FINGERPRINT_ASSETS', True)
+    # Compiled templates are cached on disk, so new workers skip Jinja compilation
+    JINJA_BYTECODE_CACHE = _flag('JINJA_BYTECODE_CACHE', True)
+    JINJA_CACHE_DIR = os.environ.get('JINJA_CACHE_DIR')
+
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+    WARM_UP = _flag('WARM_UP', False)
+    # Plain /static URLs, so edited CSS/JS shows up on reload
+    FINGERPRINT_ASSETS = _flag('FINGERPRINT_ASSETS', False)
+
+
+class ProductionConfig(Config):
+    SESSION_COOKIE_SECURE = _flag('SESSION_COOKIE_SECURE', True)
+
+
+CONFIGS = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+}
+
+
+def load_config(config=None):
+    """Resolves `config` (a name, a class/object or a dict; default APP_ENV) to a dict of settings.
+
+    MONGO_* keys (from the config or the environment) are passed on to models.db.
+    """
+    if config is None:
+        config = os.environ.get('APP_ENV', 'development')
+    if isinstance(config, str):
+        if config not in CONFIGS:
+            raise ValueError(f"Unknown APP_ENV {config!r}; expected one of {', '.join(CONFIGS)}")
+        config = CONFIGS[config]
+    if not isinstance(config, dict):
+        config = {key: getattr(config, key) for key in dir(config) if key.isupper()}
+    settings = dict(config)
+
+    if not settings.get('SECRET_KEY'):
+        if not settings.get('DEBUG') and not settings.get('TESTING'):
+            raise RuntimeError("SECRET_KEY must be set outside development")
+        settings['SECRET_KEY'] = DEV_SECRET_KEY
+    return settings
+
+
+def mongo_settings(settings):
+    """Picks the models.db connection settings out of an app config."""
+    return {key: value for key, value in settings.items() if key in MONGO_DEFAULTS}
@@ -0,0 +1,59 @@
+"""Pre-fork serving: gunicorn -c gunicorn.conf.py app:app
+
+Every setting can be overridden from the environment (or on the command line).
+Workers fork from a master that has imported, but never connected, the app;
+each worker opens its own Mongo pool and warms up before taking requests.
+
+Live order streams (/events/stream) stay open for as long as a dashboard
+does, so route them to a second instance on gevent workers:
+
+    GUNICORN_WORKER_CLASS=gevent BIND=0.0.0.0:8001 gunicorn -c gunicorn.conf.py app:app
+"""
+import multiprocessing
+import os
+
+os.environ.setdefault('APP_ENV', 'production')
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+if worker_class == 'gevent':
+    # Patch before preload_app imports the app, so its locks and sockets are gevent's
+    from gevent import monkey
+    monkey.patch_all()
+
+bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', 8000)}")
+# One process per core (the GIL caps each at one core) with a few threads
+# each to overlap Mongo round trips
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# Concurrent connections (mostly idle event streams) per gevent worker
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+if worker_class == 'gthread':
+    # An event stream holds a thread for as long as it is open; keep half of
+    # them for ordinary requests (extra streams get a 204 and go without)
+    os.environ.setdefault('EVENTS_MAX_STREAMS', str(max(threads // 2, 1)))
+# Keep connections from the load balancer open between requests
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+# Recycle workers periodically to contain slow leaks; jitter avoids restarting all at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 500))
+# Import the app once in the master so workers share its memory pages
+preload_app = True
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+
+
+def post_fork(server, worker):
+    # Anything inherited from the master must not be reused in the worker
+    from models.db import close_client
+    close_client()
+
+
+def post_worker_init(worker):
+    # Runs after the worker has loaded the app and before it accepts connections
+    from app import warm_up
+    from models.profiler import install_signal_handler
+    # gunicorn resets SIGUSR2 to its default (exit) in workers; restore the profile dump
+    install_signal_handler()
+    warm_up(worker.wsgi)
+    worker.log.info("Worker %s warmed up", worker.pid)
@@ -0,0 +1,194 @@
+import csv
+import io
+import os
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING
+
+from models.db import get_db
+
+# Store analytics are computed from store_orders, each store's share of an
+# order, so every query starts with a range $match on the
+# (store_phone, placed_at) index; the $facet stages then share that one scan.
+GRANULARITIES = {'hour': timedelta(hours=1), 'day': timedelta(days=1), 'week': timedelta(weeks=1)}
+DEFAULT_RANGE_DAYS = 30
+# Longest series a single request may ask for (e.g. ~7 months by hour)
+MAX_BUCKETS = int(os.environ.get('ANALYTICS_MAX_BUCKETS', 5000))
+TOP_ITEMS = 10
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FIELDS = ('placed_at', 'order_id', 'status', 'customer', 'product_id', 'item', 'quantity', 'price', 'subtotal')
+
+_DAY_MS = 24 * 3600 * 1000
+
+
+def _parse_time(value, name):
+    try:
+        when = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a date (YYYY-MM-DD) or an ISO date-time") from None
+    # placed_at is stored as naive server-local time, so aware inputs are converted to it
+    if when.tzinfo is not None:
+        when = when.astimezone().replace(tzinfo=None)
+    return when
+
+
+def parse_range(start=None, end=None, granularity='day'):
+    """Parses request arguments into (start, end, granularity); raises ValueError with a message.
+
+    `end` is exclusive, except that a plain date includes that whole day.
+    Defaults to the last DEFAULT_RANGE_DAYS days, today included.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    if end:
+        end_at = _parse_time(end, 'end')
+        if len(end) == 10:
+            end_at += timedelta(days=1)
+    else:
+        end_at = datetime.combine(datetime.now().date(), datetime.min.time()) + timedelta(days=1)
+    start_at = _parse_time(start, 'start') if start else end_at - timedelta(days=DEFAULT_RANGE_DAYS)
+    if start_at >= end_at:
+        raise ValueError("start must be before end")
+    if (end_at - start_at) / GRANULARITIES[granularity] > MAX_BUCKETS:
+        raise ValueError(f"Range is too long for {granularity} granularity (at most {MAX_BUCKETS} points)")
+    return start_at, end_at, granularity
+
+
+def _floor(when, granularity):
+    """The start of the hour/day/week (weeks start on Monday) containing `when`."""
+    if granularity == 'hour':
+        return when.replace(minute=0, second=0, microsecond=0)
+    day = when.replace(hour=0, minute=0, second=0, microsecond=0)
+    return day - timedelta(days=day.weekday()) if granularity == 'week' else day
+
+
+def _bucket_start(granularity):
+    """Aggregation expression for _floor(placed_at); avoids $dateTrunc so it runs on pre-5.0 servers."""
+    parts = {'year': {'$year': '$placed_at'}, 'month': {'$month': '$placed_at'}, 'day': {'$dayOfMonth': '$placed_at'}}
+    if granularity == 'hour':
+        parts['hour'] = {'$hour': '$placed_at'}
+    start = {'$dateFromParts': parts}
+    if granularity == 'week':
+        # $dayOfWeek is 1 for Sunday, so (dayOfWeek + 5) % 7 is the number of days since Monday
+        since_monday = {'$mod': [{'$add': [{'$dayOfWeek': '$placed_at'}, 5]}, 7]}
+        start = {'$subtract': [start, {'$multiply': [since_monday, _DAY_MS]}]}
+    return start
+
+
+def _match(store_phone, start, end):
+    return {'$match': {'store_phone': store_phone, 'placed_at': {'$gte': start, '$lt': end}}}
+
+
+def sales_analytics(store_phone, start, end, granularity='day', top=TOP_ITEMS, db=None):
+    """Sales for one store between start (inclusive) and end (exclusive), in one aggregation.
+
+    Returns order count, sales, average order value, the repeat-customer rate
+    (share of the range's customers who ordered more than once in it), a
+    sales/orders series per hour, day or week with empty periods filled in,
+    and the `top` items by quantity sold. Sales are item subtotals; delivery
+    fees and taxes belong to the whole order, not to one store.
+    """
+    db = db if db is not None else get_db()
+    pipeline = [
+        _match(store_phone, start, end),
+        {'$project': {
+            'placed_at': 1,
+            'items': 1,
+            # Store orders from before user_id was copied over identify the customer by phone
+            'customer': {'$ifNull': ['$user_id', '$phone']},
+            'total': {'$sum': {'$map': {'input': '$items', 'as': 'line',
+                                        'in': {'$multiply': ['$$line.price', '$$line.quantity']}}}},
+        }},
+        {'$facet': {
+            'summary': [
+                {'$group': {'_id': None, 'orders': {'$sum': 1}, 'sales': {'$sum': '$total'}}},
+            ],
+            'customers': [
+                {'$group': {'_id': '$customer', 'orders': {'$sum': 1}}},
+                {'$group': {'_id': None, 'customers': {'$sum': 1},
+                            'repeat': {'$sum': {'$cond': [{'$gt': ['$orders', 1]}, 1, 0]}}}},
+            ],
+            'series': [
+                {'$group': {'_id': _bucket_start(granularity), 'orders': {'$sum': 1}, 'sales': {'$sum': '$total'}}},
+            ],
+            'top_items': [
+                {'$unwind': '$items'},
+                {'$group': {'_id': '$items.product_id', 'name': {'$last': '$items.name'},
+                            'quantity': {'$sum': '$items.quantity'},
+                            'sales': {'$sum': {'$multiply': ['$items.price', '$items.quantity']}}}},
+                {'$sort': {'quantity': -1, 'sales': -1, '_id': 1}},
+                {'$limit': top},
+            ],
+        }},
+    ]
+    facets = next(db.store_orders.aggregate(pipeline))
+    summary = (facets['summary'] or [{'orders': 0, 'sales': 0}])[0]
+    customers = (facets['customers'] or [{'customers': 0, 'repeat': 0}])[0]
+
+    buckets = {row['_id']: row for row in facets['series']}
+    step = GRANULARITIES[granularity]
+    series = []
+    period = _floor(start, granularity)
+    while period < end:
+        row = buckets.get(period, {'orders': 0, 'sales': 0})
+        series.append({
+            'start': period.isoformat(),
+            'orders': row['orders'],
+            'sales': round(row['sales'], 2),
+            'average_order_value': round(row['sales'] / row['orders'], 2) if row['orders'] else 0,
+        })
+        period += step
+
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'granularity': granularity,
+        'orders': summary['orders'],
+        'sales': round(summary['sales'], 2),
+        'average_order_value': round(summary['sales'] / summary['orders'], 2) if summary['orders'] else 0,
+        'customers': customers['customers'],
+        'repeat_customers': customers['repeat'],
+        'repeat_customer_rate': round(customers['repeat'] / customers['customers'], 4) if customers['customers'] else 0,
+        'series': series,
+        'top_items': [
+            {'product_id': str(row['_id']), 'name': row['name'], 'quantity': row['quantity'], 'sales': round(row['sales'], 2)}
+            for row in facets['top_items']
+        ],
+    }
+
+
+def export_sales_lines(store_phone, start, end, db=None):
+    """Yields CSV text chunks: one row per item line of the store's orders in the range, oldest first.
+
+    Rows come from an aggregation cursor in index order, so the export never
+    holds more than a batch in memory.
+    """
+    db = db if db is not None else get_db()
+    pipeline = [
+        _match(store_phone, start, end),
+        {'$sort': {'placed_at': ASCENDING}},
+        {'$unwind': '$items'},
+        {'$project': {
+            '_id': 0,
+            'placed_at': 1,
+            'order_id': 1,
+            'status': 1,
+            'customer': '$customer_name',
+            'product_id': '$items.product_id',
+            'item': '$items.name',
+            'quantity': '$items.quantity',
+            'price': '$items.price',
+        }},
+    ]
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+    for row in db.store_orders.aggregate(pipeline, batchSize=EXPORT_BATCH_SIZE):
+        row['placed_at'] = row['placed_at'].isoformat()
+        row['subtotal'] = round(row.get('price', 0) * row.get('quantity', 0), 2)
+        writer.writerow(row)
+        if buffer.tell() > 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
@@ -0,0 +1,148 @@
+import os
+import zlib
+from datetime import datetime, timedelta
+from itertools import groupby
+
+import bson
+from bson.binary import Binary
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import DuplicateKeyError
+
+from models.db import get_db
+
+# Delivered orders older than ORDER_ARCHIVE_AFTER_DAYS move out of the hot
+# `orders` collection into compressed buckets, one per customer and month of
+# each archive run: {_id: '<user_id>:<first order id>', user_id, month,
+# oldest, newest, count, order_ids, orders: zlib(BSON {'orders': [...]})}.
+# Indexes then grow with customers × months rather than with orders.
+ARCHIVE_COLLECTION = 'orders_archive'
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ORDER_ARCHIVE_AFTER_DAYS', 180))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ORDER_ARCHIVE_BATCH_SIZE', 1000))
+ORDER_PAGE_SIZE = 10
+
+
+def _archivable(cutoff):
+    """Orders that can no longer change: delivered (or pre-dating statuses) and fully dispatched."""
+    return {
+        'placed_at': {'$lt': cutoff},
+        '$and': [
+            {'$or': [{'status': 'delivered'}, {'status': {'$exists': False}}]},
+            {'$or': [{'queue': {'$exists': False}}, {'queue.state': 'done'}]},
+        ],
+    }
+
+
+def _bucket(user_id, month, orders):
+    orders.sort(key=lambda order: order['_id'])
+    payload = bson.encode({'orders': orders})
+    return {
+        '_id': f"{user_id}:{orders[0]['_id']}",
+        'user_id': user_id,
+        'month': month,
+        'oldest': min(order['placed_at'] for order in orders),
+        'newest': max(order['placed_at'] for order in orders),
+        'count': len(orders),
+        'order_ids': [order['_id'] for order in orders],
+        'orders': Binary(zlib.compress(payload)),
+    }
+
+
+def _unpack(bucket):
+    return bson.decode(zlib.decompress(bucket['orders']))['orders']
+
+
+def archive_orders(older_than_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE, db=None):
+    """Moves finished orders older than `older_than_days` into the archive. Returns the number moved.
+
+    Each bucket is written before its orders are deleted, and bucket ids are
+    derived from their first order, so a run interrupted between the two
+    steps is completed (not duplicated) by the next one.
+    """
+    db = db if db is not None else get_db()
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+    moved = 0
+    while True:
+        batch = list(db.orders.find(_archivable(cutoff)).sort('placed_at', ASCENDING).limit(batch_size))
+        if not batch:
+            return moved
+
+        def bucket_key(order):
+            return str(order.get('user_id')), order['placed_at'].strftime('%Y-%m')
+
+        for (_, month), orders in groupby(sorted(batch, key=bucket_key), key=bucket_key):
+            orders = list(orders)
+            bucket = _bucket(orders[0].get('user_id'), month, orders)
+            try:
+                db[ARCHIVE_COLLECTION].insert_one(bucket)
+                order_ids = bucket['order_ids']
+            except DuplicateKeyError:
+                # Written by an earlier, interrupted run; finish removing what it holds
+                order_ids = db[ARCHIVE_COLLECTION].find_one({'_id': bucket['_id']}, {'order_ids': 1})['order_ids']
+            moved += db.orders.delete_many({'_id': {'$in': order_ids}}).deleted_count
+
+
+def iter_archived_orders(db=None, query=None):
+    """Yields every archived order (optionally only from buckets matching `query`)."""
+    db = db if db is not None else get_db()
+    for bucket in db[ARCHIVE_COLLECTION].find(query or {}, {'orders': 1}):
+        yield from _unpack(bucket)
+
+
+# ------------------ ORDER HISTORY --------------------
+def _sort_key(order):
+    return order['placed_at'], order['_id']
+
+
+def encode_cursor(order):
+    return f"{order['placed_at'].isoformat()}_{order['_id']}"
+
+
+def decode_cursor(cursor):
+    """Parses a history cursor into (placed_at, order id); raises ValueError if malformed."""
+    placed_at, _, order_id = cursor.rpartition('_')
+    if not ObjectId.is_valid(order_id):
+        raise ValueError(f"Invalid cursor {cursor!r}")
+    return datetime.fromisoformat(placed_at), ObjectId(order_id)
+
+
+def _archived_page(db, user_id, before, limit, newer_than=None):
+    """The first `limit` archived orders of a customer older than `before`, newest first."""
+    query = {'user_id': user_id}
+    if before:
+        query['oldest'] = {'$lte': before[0]}
+    if newer_than:
+        query['newest'] = {'$gte': newer_than}
+    found = []
+    for bucket in db[ARCHIVE_COLLECTION].find(query).sort('newest', DESCENDING):
+        # Buckets come newest first; stop once none left can make the page
+        if len(found) >= limit and found[limit - 1]['placed_at'] > bucket['newest']:
+            break
+        found.extend(order for order in _unpack(bucket) if not before or _sort_key(order) < before)
+        found.sort(key=_sort_key, reverse=True)
+    return found[:limit]
+
+
+def order_history(user_id, before=None, limit=ORDER_PAGE_SIZE, db=None):
+    """Returns (orders, next_cursor): one page of a customer's orders, newest first, hot and archived.
+
+    `before` is the next_cursor of the previous page. Hot orders are read by
+    keyset on the (user_id, placed_at, _id) index; the archive is only
+    consulted for the part of the page the hot collection can't fill.
+    """
+    db = db if db is not None else get_db()
+    before = decode_cursor(before) if before else None
+    query = {'user_id': user_id}
+    if before:
+        placed_at, order_id = before
+        query['$or'] = [{'placed_at': {'$lt': placed_at}}, {'placed_at': placed_at, '_id': {'$lt': order_id}}]
+    hot = list(db.orders.find(query).sort([('placed_at', DESCENDING), ('_id', DESCENDING)]).limit(limit + 1))
+
+    # A full hot page only needs archived orders at least as new as its last entry
+    newer_than = hot[limit - 1]['placed_at'] if len(hot) > limit else None
+    cold = _archived_page(db, user_id, before, limit + 1, newer_than)
+
+    # An order can briefly be in both if an archive run was interrupted
+    orders = sorted({order['_id']: order for order in cold + hot}.values(), key=_sort_key, reverse=True)
+    next_cursor = encode_cursor(orders[limit - 1]) if len(orders) > limit else None
+    return orders[:limit], next_cursor
@@ -0,0 +1,108 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+from collections import namedtuple
+
+try:
+    import brotli
+except ImportError:  # gzip only without it
+    brotli = None
+
+# Page CSS and JS under static/css and static/js are served from
+# /assets/<name>.<content hash>.<ext> with a year-long immutable Cache-Control,
+# so a browser fetches each version once. Every file is compressed once per
+# process (or ahead of time by `flask --app app build-assets`).
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static')
+BUNDLE_DIRS = ('css', 'js')
+HASH_LENGTH = 12
+# Smaller files aren't worth a compressed variant
+MIN_COMPRESS_BYTES = 256
+
+# `encodings` maps a Content-Encoding ('gzip', 'br') to the compressed body
+Asset = namedtuple('Asset', 'name hashed_name mimetype body encodings etag')
+
+
+def _fingerprint(name, body):
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(body).hexdigest()[:HASH_LENGTH]}{ext}"
+
+
+def _compress(body):
+    encodings = {}
+    if len(body) < MIN_COMPRESS_BYTES:
+        return encodings
+    if brotli is not None:
+        encodings['br'] = brotli.compress(body, quality=11)
+    encodings['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+    # Only keep variants that actually save bytes
+    return {encoding: data for encoding, data in encodings.items() if len(data) < len(body)}
+
+
+class AssetManifest:
+    """The fingerprinted, precompressed bundles under a static directory, loaded once per process."""
+
+    def __init__(self, root=STATIC_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        self._by_name = None
+        self._by_hashed_name = None
+
+    def _scan(self):
+        for folder in BUNDLE_DIRS:
+            base = os.path.join(self.root, folder)
+            for dirpath, _, filenames in os.walk(base):
+                for filename in sorted(filenames):
+                    path = os.path.join(dirpath, filename)
+                    yield os.path.relpath(path, self.root).replace(os.sep, '/'), path
+
+    def load(self):
+        """Reads, hashes and compresses every bundle (once). Returns {name: Asset}."""
+        if self._by_name is not None:
+            return self._by_name
+        with self._lock:
+            if self._by_name is None:
+                assets = {}
+                for name, path in self._scan():
+                    with open(path, 'rb') as f:
+                        body = f.read()
+                    hashed_name = _fingerprint(name, body)
+                    mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+                    assets[name] = Asset(name, hashed_name, mimetype, body, _compress(body),
+                                         hashed_name.rsplit('.', 2)[-2])
+                self._by_hashed_name = {asset.hashed_name: asset for asset in assets.values()}
+                self._by_name = assets
+        return self._by_name
+
+    def hashed_name(self, name):
+        """The fingerprinted name for a bundle, or None if there's no such file."""
+        asset = self.load().get(name)
+        return asset.hashed_name if asset else None
+
+    def get(self, hashed_name):
+        self.load()
+        return self._by_hashed_name.get(hashed_name)
+
+    def build(self, out_dir):
+        """Writes every bundle under its fingerprinted name, with .gz/.br siblings and a manifest.json.
+
+        For serving /assets from a front proxy (e.g. nginx gzip_static).
+        Returns the number of bundles written.
+        """
+        assets = self.load()
+        for asset in assets.values():
+            path = os.path.join(out_dir, *asset.hashed_name.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            variants = {'': asset.body, '.gz': asset.encodings.get('gzip'), '.br': asset.encodings.get('br')}
+            for suffix, data in variants.items():
+                if data is not None:
+                    with open(path + suffix, 'wb') as f:
+                        f.write(data)
+        with open(os.path.join(out_dir, 'manifest.json'), 'w') as f:
+            json.dump({name: asset.hashed_name for name, asset in sorted(assets.items())}, f, indent=2)
+        return len(assets)
+
+
+assets = AssetManifest()
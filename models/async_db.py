@@ -0,0 +1,34 @@
+import asyncio
+import os
+
+from pymongo import AsyncMongoClient
+
+from models.db import _setting, client_options
+
+# One AsyncMongoClient per worker process and event loop: async clients are
+# bound to the loop they were first used on and must not cross a fork.
+_clients = {}
+
+
+def get_async_client():
+    """Returns the AsyncMongoClient for this process's running event loop."""
+    key = (os.getpid(), id(asyncio.get_running_loop()))
+    client = _clients.get(key)
+    if client is None:
+        # Drop clients inherited from a parent process without closing them
+        for stale in [k for k in _clients if k[0] != key[0]]:
+            del _clients[stale]
+        client = _clients[key] = AsyncMongoClient(_setting("MONGO_URI"), **client_options())
+    return client
+
+
+def get_async_db():
+    """Returns a handle to the pizza_app database for use with `await`."""
+    return get_async_client()[_setting("MONGO_DB_NAME")]
+
+
+async def close_async_client():
+    """Closes this process's async clients; call on ASGI shutdown."""
+    pid = os.getpid()
+    for key in [k for k in _clients if k[0] == pid]:
+        await _clients.pop(key).close()
@@ -0,0 +1,316 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ReturnDocument
+
+from models.async_db import get_async_db
+from models.db import get_db
+
+# Carts are keyed by an opaque id kept in the session cookie; the lines live here.
+# Each cart is {item_id: {'id', 'name', 'price', 'quantity'}}; the price is the
+# one shown when the item was added, and models.pricing reprices for checkout.
+CART_TTL_SECONDS = int(os.environ.get('CART_TTL_SECONDS', 7 * 24 * 3600))
+CART_BACKEND = os.environ.get('CART_BACKEND', 'mongo')
+
+
+class MemoryCartStore:
+    """Per-process store for development and single-worker deployments.
+
+    Carts expire after `ttl` seconds of inactivity; beyond `max_carts` the
+    least recently used cart is evicted.
+    """
+
+    def __init__(self, ttl=CART_TTL_SECONDS, max_carts=100000):
+        self.ttl = ttl
+        self.max_carts = max_carts
+        self._carts = OrderedDict()  # cart_id -> (expires_at, lines)
+        self._lock = threading.Lock()
+
+    def _lines(self, cart_id, create=False):
+        entry = self._carts.get(cart_id)
+        if entry is not None and entry[0] < time.monotonic():
+            del self._carts[cart_id]
+            entry = None
+        if entry is None:
+            if not create:
+                return None
+            entry = (0, {})
+            while len(self._carts) >= self.max_carts:
+                self._carts.popitem(last=False)
+        self._carts[cart_id] = (time.monotonic() + self.ttl, entry[1])
+        self._carts.move_to_end(cart_id)
+        return entry[1]
+
+    def get(self, cart_id):
+        with self._lock:
+            lines = self._lines(cart_id)
+            return {k: dict(v) for k, v in lines.items()} if lines else {}
+
+    def add(self, cart_id, line, quantity=1):
+        with self._lock:
+            lines = self._lines(cart_id, create=True)
+            if line['id'] in lines:
+                lines[line['id']]['quantity'] += quantity
+            else:
+                lines[line['id']] = dict(line, quantity=quantity)
+            return {k: dict(v) for k, v in lines.items()}
+
+    def set_quantities(self, cart_id, quantities):
+        with self._lock:
+            lines = self._lines(cart_id) or {}
+            for item_id, quantity in quantities.items():
+                if item_id in lines:
+                    lines[item_id]['quantity'] = quantity
+            return {k: dict(v) for k, v in lines.items()}
+
+    def remove(self, cart_id, item_id):
+        with self._lock:
+            lines = self._lines(cart_id) or {}
+            lines.pop(item_id, None)
+            return {k: dict(v) for k, v in lines.items()}
+
+    def clear(self, cart_id):
+        with self._lock:
+            self._carts.pop(cart_id, None)
+
+
+class MongoCartStore:
+    """Stores each cart as one document in `carts`; every change is a single atomic update.
+
+    A TTL index on `expires_at` (see models/indexes.py) drops abandoned carts.
+    """
+
+    def __init__(self, ttl=CART_TTL_SECONDS, collection='carts'):
+        self.ttl = ttl
+        self.collection = collection
+
+    def _coll(self):
+        return get_db()[self.collection]
+
+    def _expiry(self):
+        return datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+
+    def _add_update(self, line, quantity):
+        item_id = line['id']
+        return {
+            '$inc': {f'lines.{item_id}.quantity': quantity},
+            '$set': {
+                f'lines.{item_id}.id': item_id,
+                f'lines.{item_id}.name': line['name'],
+                f'lines.{item_id}.price': line['price'],
+                'expires_at': self._expiry(),
+            },
+        }
+
+    def _quantities_update(self, cart_id, lines, quantities):
+        """Returns (filter, update) for the lines still in the cart, or None if there are none."""
+        updates = {f'lines.{item_id}.quantity': qty for item_id, qty in quantities.items() if item_id in lines}
+        if not updates:
+            return None
+        updates['expires_at'] = self._expiry()
+        # Only touch lines that are still in the cart
+        conditions = {f'lines.{item_id}': {'$exists': True} for item_id in quantities if item_id in lines}
+        return dict({'_id': cart_id}, **conditions), {'$set': updates}
+
+    def _remove_update(self, item_id):
+        return {'$unset': {f'lines.{item_id}': ''}, '$set': {'expires_at': self._expiry()}}
+
+    def get(self, cart_id):
+        doc = self._coll().find_one({'_id': cart_id}, {'lines': 1})
+        return doc.get('lines', {}) if doc else {}
+
+    def add(self, cart_id, line, quantity=1):
+        doc = self._coll().find_one_and_update(
+            {'_id': cart_id}, self._add_update(line, quantity),
+            projection={'lines': 1}, upsert=True, return_document=ReturnDocument.AFTER)
+        return doc.get('lines', {})
+
+    def set_quantities(self, cart_id, quantities):
+        lines = self.get(cart_id)
+        change = self._quantities_update(cart_id, lines, quantities)
+        if change is None:
+            return lines
+        doc = self._coll().find_one_and_update(
+            *change, projection={'lines': 1}, return_document=ReturnDocument.AFTER)
+        return doc.get('lines', {}) if doc else self.get(cart_id)
+
+    def remove(self, cart_id, item_id):
+        doc = self._coll().find_one_and_update(
+            {'_id': cart_id}, self._remove_update(item_id),
+            projection={'lines': 1}, return_document=ReturnDocument.AFTER)
+        return doc.get('lines', {}) if doc else {}
+
+    def clear(self, cart_id):
+        self._coll().delete_one({'_id': cart_id})
+
+
+class AsyncMongoCartStore(MongoCartStore):
+    """MongoCartStore for the async routes: same documents, awaited through the async client."""
+
+    def _coll(self):
+        return get_async_db()[self.collection]
+
+    async def get(self, cart_id):
+        doc = await self._coll().find_one({'_id': cart_id}, {'lines': 1})
+        return doc.get('lines', {}) if doc else {}
+
+    async def add(self, cart_id, line, quantity=1):
+        doc = await self._coll().find_one_and_update(
+            {'_id': cart_id}, self._add_update(line, quantity),
+            projection={'lines': 1}, upsert=True, return_document=ReturnDocument.AFTER)
+        return doc.get('lines', {})
+
+    async def set_quantities(self, cart_id, quantities):
+        lines = await self.get(cart_id)
+        change = self._quantities_update(cart_id, lines, quantities)
+        if change is None:
+            return lines
+        doc = await self._coll().find_one_and_update(
+            *change, projection={'lines': 1}, return_document=ReturnDocument.AFTER)
+        return doc.get('lines', {}) if doc else await self.get(cart_id)
+
+    async def remove(self, cart_id, item_id):
+        doc = await self._coll().find_one_and_update(
+            {'_id': cart_id}, self._remove_update(item_id),
+            projection={'lines': 1}, return_document=ReturnDocument.AFTER)
+        return doc.get('lines', {}) if doc else {}
+
+    async def clear(self, cart_id):
+        await self._coll().delete_one({'_id': cart_id})
+
+
+class ThreadedCartStore:
+    """Awaitable wrapper running a blocking cart store's calls on the default executor."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getattr__(self, name):
+        method = getattr(self.store, name)
+
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(method, *args, **kwargs)
+        return call
+
+
+class RedisCartStore:
+    """Keeps each cart in two Redis hashes (line details and quantities) with a sliding TTL.
+
+    Works with any server speaking the Redis protocol; needs the `redis` package.
+    """
+
+    def __init__(self, url=None, ttl=CART_TTL_SECONDS, prefix='cart:'):
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError("CART_BACKEND=redis requires the 'redis' package") from exc
+        self.client = redis.Redis.from_url(url or os.environ.get('CART_REDIS_URL', 'redis://localhost:6379/0'))
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _keys(self, cart_id):
+        return f'{self.prefix}{cart_id}:lines', f'{self.prefix}{cart_id}:qty'
+
+    def _read(self, pipe, cart_id):
+        lines_key, qty_key = self._keys(cart_id)
+        pipe.hgetall(lines_key)
+        pipe.hgetall(qty_key)
+
+    @staticmethod
+    def _merge(raw_lines, raw_qty):
+        lines = {}
+        for item_id, payload in raw_lines.items():
+            item_id = item_id.decode()
+            line = json.loads(payload)
+            line['quantity'] = int(raw_qty.get(item_id.encode(), 0))
+            lines[item_id] = line
+        return lines
+
+    def _touch(self, pipe, cart_id):
+        for key in self._keys(cart_id):
+            pipe.expire(key, self.ttl)
+
+    def get(self, cart_id):
+        pipe = self.client.pipeline()
+        self._read(pipe, cart_id)
+        return self._merge(*pipe.execute())
+
+    def add(self, cart_id, line, quantity=1):
+        lines_key, qty_key = self._keys(cart_id)
+        details = json.dumps({'id': line['id'], 'name': line['name'], 'price': line['price']})
+        pipe = self.client.pipeline()
+        pipe.hsetnx(lines_key, line['id'], details)
+        pipe.hincrby(qty_key, line['id'], quantity)
+        self._touch(pipe, cart_id)
+        self._read(pipe, cart_id)
+        return self._merge(*pipe.execute()[-2:])
+
+    def set_quantities(self, cart_id, quantities):
+        lines_key, qty_key = self._keys(cart_id)
+        existing = {k.decode() for k in self.client.hkeys(lines_key)}
+        pipe = self.client.pipeline()
+        updates = {item_id: qty for item_id, qty in quantities.items() if item_id in existing}
+        if updates:
+            pipe.hset(qty_key, mapping=updates)
+        self._touch(pipe, cart_id)
+        self._read(pipe, cart_id)
+        return self._merge(*pipe.execute()[-2:])
+
+    def remove(self, cart_id, item_id):
+        lines_key, qty_key = self._keys(cart_id)
+        pipe = self.client.pipeline()
+        pipe.hdel(lines_key, item_id)
+        pipe.hdel(qty_key, item_id)
+        self._touch(pipe, cart_id)
+        self._read(pipe, cart_id)
+        return self._merge(*pipe.execute()[-2:])
+
+    def clear(self, cart_id):
+        self.client.delete(*self._keys(cart_id))
+
+
+_BACKENDS = {
+    'memory': MemoryCartStore,
+    'mongo': MongoCartStore,
+    'redis': RedisCartStore,
+}
+
+_store = None
+_async_store = None
+_store_lock = threading.Lock()
+
+
+def get_cart_store():
+    """Returns the configured cart backend (CART_BACKEND=memory|mongo|redis)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if CART_BACKEND not in _BACKENDS:
+                    raise ValueError(f"Unknown CART_BACKEND {CART_BACKEND!r}")
+                _store = _BACKENDS[CART_BACKEND]()
+    return _store
+
+
+def get_async_cart_store():
+    """Returns an awaitable cart store backed by the same carts as get_cart_store()."""
+    global _async_store
+    if _async_store is None:
+        store = get_cart_store()
+        if type(store) is MongoCartStore:
+            _async_store = AsyncMongoCartStore(store.ttl, store.collection)
+        else:
+            _async_store = ThreadedCartStore(store)
+    return _async_store
+
+
+def set_cart_store(store):
+    """Replaces the cart backend, e.g. with a MemoryCartStore for local runs."""
+    global _store, _async_store
+    _store = store
+    _async_store = None
@@ -0,0 +1,64 @@
+import os
+
+from bson.objectid import ObjectId
+
+from models.cache import LRUCache
+from models.db import get_db
+from models.geo import NEARBY_STORES_LIMIT, nearby_stores
+
+# Per-worker read-through cache of catalogue reads. Store-side writes in this
+# worker invalidate it immediately; the TTL bounds staleness from other workers.
+catalogue_cache = LRUCache(
+    maxsize=int(os.environ.get('CATALOGUE_CACHE_SIZE', 1024)),
+    ttl=int(os.environ.get('CATALOGUE_CACHE_TTL', 60)),
+)
+
+
+def get_store(store_id):
+    """Returns the store document for store_id (or None)."""
+    return catalogue_cache.get_or_load(
+        ('store', store_id), lambda: get_db().stores.find_one({'_id': ObjectId(store_id)}))
+
+
+def get_nearby_stores(location):
+    """Returns the stores delivering to a point, nearest first (see models.geo.nearby_stores)."""
+    lon, lat = location['coordinates']
+    return catalogue_cache.get_or_load(('stores', 'nearby', lon, lat), lambda: nearby_stores(location))
+
+
+def get_city_stores(city):
+    """Returns up to NEARBY_STORES_LIMIT stores in a city, for addresses that couldn't be geocoded."""
+    return catalogue_cache.get_or_load(
+        ('stores', 'city', city),
+        lambda: list(get_db().stores.find({'address.city': city}, {'password': 0}).limit(NEARBY_STORES_LIMIT)))
+
+
+def get_store_items(store_phone):
+    """Returns every item listed by the store with this phone."""
+    return catalogue_cache.get_or_load(
+        ('store_items', store_phone), lambda: list(get_db().items.find({'store_phone': store_phone})))
+
+
+def get_category_page(category, page_key, loader):
+    """Caches one page of a category listing; page_key identifies cursor, limit and fields."""
+    return catalogue_cache.get_or_load(('category', category) + tuple(page_key), loader)
+
+
+async def get_category_page_async(category, page_key, loader):
+    """get_category_page() for the async routes; `loader` is a coroutine function."""
+    key = ('category', category) + tuple(page_key)
+    page = catalogue_cache.get(key)
+    if page is None:
+        page = await loader()
+        catalogue_cache.set(key, page)
+    return page
+
+
+def invalidate_store(store_phone, store_id=None, categories=()):
+    """Drops cached reads affected by a change to a store or its items."""
+    catalogue_cache.invalidate('store_items', store_phone)
+    catalogue_cache.invalidate('stores')
+    if store_id is not None:
+        catalogue_cache.invalidate('store', str(store_id))
+    for category in set(categories) | {'all'}:
+        catalogue_cache.invalidate('category', category)
@@ -1,6 +1,196 @@
+import os
+import threading
+import time
+
 from pymongo import MongoClient
+from pymongo.monitoring import ConnectionPoolListener
+from pymongo.read_preferences import read_pref_mode_from_name, make_read_preference
+
+# Connection settings, overridable through the environment (or configure()).
+DEFAULTS = {
+    "MONGO_URI": "mongodb://localhost:27017",
+    "MONGO_DB_NAME": "pizza_app",
+    "MONGO_MAX_POOL_SIZE": 50,
+    "MONGO_MIN_POOL_SIZE": 0,
+    "MONGO_MAX_IDLE_TIME_MS": 60000,
+    "MONGO_CONNECT_TIMEOUT_MS": 5000,
+    "MONGO_SERVER_SELECTION_TIMEOUT_MS": 5000,
+    "MONGO_SOCKET_TIMEOUT_MS": 10000,
+    "MONGO_WAIT_QUEUE_TIMEOUT_MS": 2000,
+    "MONGO_READ_PREFERENCE": "primaryPreferred",
+}
+
+_settings = {}
+_client = None
+_client_pid = None
+_lock = threading.Lock()
+_extra_listeners = []
+
+
+class _PoolStats(ConnectionPoolListener):
+    """Counts pool events so pool usage can be reported without touching pymongo internals."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.created = 0
+            self.closed = 0
+            self.checked_out = 0
+            self.checkout_failed = 0
+            self.in_use = 0
+            self.peak_in_use = 0
+
+    def _bump(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_check_out_started(self, event): pass
+    def connection_ready(self, event): pass
+
+    def connection_created(self, event):
+        self._bump(created=1)
+
+    def connection_closed(self, event):
+        self._bump(closed=1)
+
+    def connection_checked_out(self, event):
+        self._bump(checked_out=1, in_use=1)
+
+    def connection_check_out_failed(self, event):
+        self._bump(checkout_failed=1)
+
+    def connection_checked_in(self, event):
+        self._bump(in_use=-1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "connections_created": self.created,
+                "connections_closed": self.closed,
+                "connections_open": self.created - self.closed,
+                "checkouts": self.checked_out,
+                "checkout_failures": self.checkout_failed,
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+            }
+
+
+_pool_stats = _PoolStats()
+
+
+def _setting(name):
+    if name in _settings:
+        return _settings[name]
+    value = os.environ.get(name, DEFAULTS[name])
+    if isinstance(DEFAULTS[name], int):
+        value = int(value)
+    return value
+
+
+def configure(**settings):
+    """Overrides connection settings; takes effect the next time the client is built."""
+    unknown = set(settings) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown Mongo settings: {', '.join(sorted(unknown))}")
+    _settings.update(settings)
+    close_client()
+
+
+def register_listener(listener):
+    """Registers a pymongo event listener on every client built from now on.
+
+    A no-op for a listener already registered, so each create_app() can
+    register its listeners without double-counting commands.
+    """
+    with _lock:
+        if any(registered is listener for registered in _extra_listeners):
+            return
+        _extra_listeners.append(listener)
+    close_client()
+
+
+def client_options():
+    """Keyword arguments for a MongoClient (or AsyncMongoClient) built from the current settings."""
+    mode = read_pref_mode_from_name(_setting("MONGO_READ_PREFERENCE"))
+    return dict(
+        maxPoolSize=_setting("MONGO_MAX_POOL_SIZE"),
+        minPoolSize=_setting("MONGO_MIN_POOL_SIZE"),
+        maxIdleTimeMS=_setting("MONGO_MAX_IDLE_TIME_MS"),
+        connectTimeoutMS=_setting("MONGO_CONNECT_TIMEOUT_MS"),
+        serverSelectionTimeoutMS=_setting("MONGO_SERVER_SELECTION_TIMEOUT_MS"),
+        socketTimeoutMS=_setting("MONGO_SOCKET_TIMEOUT_MS"),
+        waitQueueTimeoutMS=_setting("MONGO_WAIT_QUEUE_TIMEOUT_MS"),
+        read_preference=make_read_preference(mode, None),
+        event_listeners=list(_extra_listeners),
+    )
+
+
+def _build_client():
+    options = client_options()
+    options["event_listeners"].insert(0, _pool_stats)
+    return MongoClient(
+        _setting("MONGO_URI"),
+        connect=False,  # defer monitor threads until first use (i.e. after any fork)
+        **options,
+    )
+
+
+def get_client():
+    """Returns the process-wide MongoClient, rebuilding it after a fork."""
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+    with _lock:
+        if _client is None or _client_pid != pid:
+            # A client inherited from the parent process must not be used or
+            # closed in the child; just drop the reference and start afresh.
+            _client = _build_client()
+            _client_pid = pid
+            _pool_stats.reset()
+        return _client
+
 
 def get_db():
-    client = MongoClient("your mongodb connection string")
-    db = client["pizza_app"]
-    return db
+    """Returns a handle to the pizza_app database backed by the shared pool."""
+    return get_client()[_setting("MONGO_DB_NAME")]
+
+
+def close_client():
+    """Closes the shared client (if this process owns one)."""
+    global _client, _client_pid
+    with _lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+
+def health():
+    """Pings the server and reports round-trip latency plus pool usage."""
+    started = time.perf_counter()
+    try:
+        get_client().admin.command("ping")
+        status = {"ok": True}
+    except Exception as exc:  # report, never raise, from a health probe
+        status = {"ok": False, "error": str(exc)}
+    status["ping_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    status["pool"] = pool_stats()
+    return status
+
+
+def pool_stats():
+    """Returns connection pool counters for this worker process."""
+    stats = _pool_stats.snapshot()
+    stats["max_pool_size"] = _setting("MONGO_MAX_POOL_SIZE")
+    stats["pid"] = os.getpid()
+    return stats
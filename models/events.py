@@ -0,0 +1,191 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from models.db import get_db
+
+log = logging.getLogger(__name__)
+
+# 'auto' tails MongoDB change streams when the server supports them (replica
+# sets) so every worker sees every event, and otherwise falls back to
+# publishing in-process, which only reaches clients of the same worker.
+EVENTS_BACKEND = os.environ.get('EVENTS_BACKEND', 'auto')
+SUBSCRIBER_QUEUE_SIZE = 100
+# Open streams allowed per process (0: no limit). Each stream holds a thread
+# under threaded servers, so gunicorn.conf.py caps gthread workers at half
+# their threads; gevent servers hold streams as cheap greenlets.
+EVENTS_MAX_STREAMS = int(os.environ.get('EVENTS_MAX_STREAMS', 0))
+
+
+class Broker:
+    """In-process pub/sub: each subscriber gets a bounded queue of events for one channel."""
+
+    def __init__(self):
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel, limit=0):
+        """Returns a new Subscription, or None if `limit` subscribers are already open."""
+        subscription = Subscription(self, channel)
+        with self._lock:
+            if limit and sum(len(s) for s in self._channels.values()) >= limit:
+                return None
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[subscription.channel]
+
+    def publish(self, channel, event, data):
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait((event, data))
+            except queue.Full:
+                # A stalled client misses events rather than holding memory
+                subscription.dropped += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'channels': len(self._channels),
+                'subscribers': sum(len(s) for s in self._channels.values()),
+            }
+
+
+class Subscription:
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.dropped = 0
+
+    def get(self, timeout):
+        """Returns the next (event, data) pair, or None after `timeout` seconds."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+broker = Broker()
+
+
+def store_channel(store_phone):
+    return f'store:{store_phone}'
+
+
+def customer_channel(user_id):
+    return f'customer:{user_id}'
+
+
+def _store_order_payload(store_order):
+    return {
+        'order_id': str(store_order['order_id']),
+        'customer_name': store_order.get('customer_name'),
+        'placed_at': store_order['placed_at'].isoformat(),
+        'items': [{'name': line['name'], 'quantity': line['quantity']} for line in store_order.get('items', [])],
+        'status': store_order['status'],
+    }
+
+
+# ------------------ PUBLISHING --------------------
+# Called from the order pipeline. When change streams are running these are
+# no-ops: the watcher publishes the same events for every worker instead.
+
+def emit_store_order(store_order, event):
+    if _watcher_active('store_orders'):
+        return
+    broker.publish(store_channel(store_order['store_phone']), event, _store_order_payload(store_order))
+
+
+def emit_order_status(order_id, user_id, status):
+    if _watcher_active('orders'):
+        return
+    broker.publish(customer_channel(user_id), 'order_status', {'order_id': str(order_id), 'status': status})
+
+
+# ------------------ CHANGE STREAMS --------------------
+_watcher_pid = None
+# Collections whose change stream is open in this process; events about the
+# others are published in-process until their stream opens
+_watching = set()
+_watcher_lock = threading.Lock()
+
+
+def _watcher_active(collection):
+    return collection in _watching and _watcher_pid == os.getpid()
+
+
+def _watch_store_orders(db):
+    pipeline = [{'$match': {'operationType': {'$in': ['insert', 'update']}}}]
+    with db.store_orders.watch(pipeline, full_document='updateLookup') as stream:
+        _watching.add('store_orders')
+        for change in stream:
+            doc = change.get('fullDocument')
+            if not doc:
+                continue
+            event = 'new_order' if change['operationType'] == 'insert' else 'order_status'
+            broker.publish(store_channel(doc['store_phone']), event, _store_order_payload(doc))
+
+
+def _watch_order_status(db):
+    pipeline = [{'$match': {'operationType': 'update', 'updateDescription.updatedFields.status': {'$exists': True}}}]
+    with db.orders.watch(pipeline, full_document='updateLookup') as stream:
+        _watching.add('orders')
+        for change in stream:
+            doc = change.get('fullDocument')
+            if doc:
+                broker.publish(customer_channel(doc['user_id']), 'order_status',
+                               {'order_id': str(doc['_id']), 'status': doc['status']})
+
+
+def _run_watcher(target, collection):
+    while True:
+        try:
+            target(get_db())
+        except OperationFailure as exc:
+            # Standalone servers cannot open change streams; stay on in-process events
+            _watching.discard(collection)
+            log.warning("Change streams unavailable (%s); using in-process events", exc)
+            return
+        except PyMongoError:
+            # Publish in-process until the stream is reopened
+            _watching.discard(collection)
+            log.exception("Change stream interrupted; reopening")
+            time.sleep(1)
+
+
+def ensure_watcher():
+    """Starts the change stream watchers for this process (after any fork) when configured."""
+    global _watcher_pid
+    if EVENTS_BACKEND == 'local' or _watcher_pid == os.getpid():
+        return
+    with _watcher_lock:
+        if _watcher_pid == os.getpid():
+            return
+        # Streams opened before a fork belong to the parent
+        _watching.clear()
+        _watcher_pid = os.getpid()
+        for target, collection in ((_watch_store_orders, 'store_orders'), (_watch_order_status, 'orders')):
+            threading.Thread(target=_run_watcher, args=(target, collection), name=f'events-{target.__name__}',
+                             daemon=True).start()
@@ -0,0 +1,126 @@
+import csv
+import os
+
+from pymongo import ReplaceOne
+
+from models.cache import LRUCache
+from models.db import get_db
+
+# Local pincode -> coordinates table, one document per pincode:
+# {_id: '411001', location: {type: 'Point', coordinates: [lon, lat]}}
+PINCODE_COLLECTION = 'pincodes'
+NEARBY_STORES_LIMIT = int(os.environ.get('NEARBY_STORES_LIMIT', 20))
+DELIVERY_RADIUS_KM = float(os.environ.get('DELIVERY_RADIUS_KM', 10))
+IMPORT_BATCH_SIZE = 1000
+
+pincode_cache = LRUCache(maxsize=50000, ttl=24 * 3600)
+
+
+def point(lon, lat):
+    return {'type': 'Point', 'coordinates': [float(lon), float(lat)]}
+
+
+def geocode(address, db=None):
+    """Returns a GeoJSON point for an address's pincode, or None if it isn't in the table.
+
+    Unknown pincodes fall back to the centre of their sorting district (the
+    pincodes in the table sharing the first three digits).
+    """
+    pincode = str((address or {}).get('pincode', '')).strip()
+    if not pincode:
+        return None
+    db = db if db is not None else get_db()
+
+    def lookup():
+        doc = db[PINCODE_COLLECTION].find_one({'_id': pincode}, {'location': 1})
+        if doc:
+            return doc['location']
+        district = list(db[PINCODE_COLLECTION].aggregate([
+            {'$match': {'_id': {'$gte': pincode[:3], '$lt': pincode[:3] + '~'}}},
+            {'$group': {
+                '_id': None,
+                'lon': {'$avg': {'$arrayElemAt': ['$location.coordinates', 0]}},
+                'lat': {'$avg': {'$arrayElemAt': ['$location.coordinates', 1]}},
+            }},
+        ]))
+        if not district or district[0]['lon'] is None:
+            return None
+        return point(district[0]['lon'], district[0]['lat'])
+
+    return pincode_cache.get_or_load((pincode,), lookup)
+
+
+def nearby_stores(location, limit=NEARBY_STORES_LIMIT, radius_km=DELIVERY_RADIUS_KM, db=None):
+    """Returns up to `limit` stores within `radius_km` of a point, nearest first, with distance_km set.
+
+    Uses the stores' 2dsphere index, so the cost depends on how many stores
+    are nearby rather than on how many exist.
+    """
+    db = db if db is not None else get_db()
+    stores = db.stores.aggregate([
+        {'$geoNear': {
+            'near': location,
+            'key': 'location',
+            'distanceField': 'distance_m',
+            'maxDistance': radius_km * 1000,
+            'spherical': True,
+        }},
+        {'$limit': limit},
+        {'$project': {'password': 0}},
+    ])
+    result = []
+    for store in stores:
+        store['distance_km'] = round(store.pop('distance_m') / 1000, 1)
+        result.append(store)
+    return result
+
+
+def import_pincodes(path, db=None):
+    """Loads a CSV with pincode, latitude and longitude columns into the table. Returns the row count.
+
+    Header names are matched case-insensitively (pincode, lat/latitude, lon/lng/longitude).
+    """
+    db = db if db is not None else get_db()
+    imported = 0
+    ops = []
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        columns = {name.strip().lower(): name for name in reader.fieldnames or ()}
+
+        def column(*names):
+            for name in names:
+                if name in columns:
+                    return columns[name]
+            raise ValueError(f"{path}: expected one of the columns {', '.join(names)}")
+        pin_col, lat_col, lon_col = column('pincode'), column('lat', 'latitude'), column('lon', 'lng', 'longitude')
+
+        for row in reader:
+            try:
+                location = point(row[lon_col], row[lat_col])
+            except (TypeError, ValueError):
+                continue  # rows without coordinates (e.g. 'NA') can't be used
+            ops.append(ReplaceOne({'_id': row[pin_col].strip()}, {'location': location}, upsert=True))
+            if len(ops) == IMPORT_BATCH_SIZE:
+                db[PINCODE_COLLECTION].bulk_write(ops, ordered=False)
+                imported += len(ops)
+                ops = []
+    if ops:
+        db[PINCODE_COLLECTION].bulk_write(ops, ordered=False)
+        imported += len(ops)
+    pincode_cache.invalidate()
+    return imported
+
+
+def geocode_addresses(db=None):
+    """Sets `location` on stores and customers that lack one. Returns {collection: count}."""
+    db = db if db is not None else get_db()
+    updated = {}
+    for collection in ('stores', 'customers'):
+        count = 0
+        for doc in db[collection].find({'location': {'$exists': False}}, {'address': 1}):
+            location = geocode(doc.get('address'), db)
+            if location:
+                db[collection].update_one({'_id': doc['_id']}, {'$set': {'location': location}})
+                count += 1
+        updated[collection] = count
+    return updated
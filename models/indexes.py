@@ -0,0 +1,148 @@
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel
+from pymongo.errors import OperationFailure
+
+from models.db import get_db
+
+# Indexes backing the queries issued by routes/auth_routes.py, per collection
+INDEXES = {
+    'customers': [
+        IndexModel([('phone', ASCENDING), ('pin', ASCENDING)], name='phone_pin'),
+        IndexModel([('email', ASCENDING)], name='email'),
+    ],
+    'stores': [
+        IndexModel([('phone', ASCENDING)], name='phone'),
+        IndexModel([('email', ASCENDING)], name='email'),
+        # Nearby stores for the customer dashboard ($geoNear), with a city fallback
+        IndexModel([('location', GEOSPHERE)], name='location_2dsphere'),
+        IndexModel([('address.city', ASCENDING)], name='address_city'),
+    ],
+    'items': [
+        # A store's items by name: its menu pages, bulk import upserts and exports
+        IndexModel([('store_phone', ASCENDING), ('name', ASCENDING)], name='store_phone_name'),
+        # Keyset pagination of /api/category/<name> walks (category_lc, _id)
+        IndexModel([('category_lc', ASCENDING), ('_id', ASCENDING)], name='category_lc_id'),
+        # Workers' search indexes poll for items changed since their last sync
+        IndexModel([('updated_at', ASCENDING)], name='updated_at'),
+    ],
+    'item_tombstones': [
+        # Deletions only need to outlive the slowest search sync
+        IndexModel([('deleted_at', ASCENDING)], name='deleted_at_ttl', expireAfterSeconds=24 * 3600),
+    ],
+    'orders': [
+        # Keyset-paginated order history walks (user_id, placed_at, _id)
+        IndexModel([('user_id', ASCENDING), ('placed_at', DESCENDING), ('_id', DESCENDING)], name='user_placed_at_id'),
+        # The archive job picks the oldest finished orders
+        IndexModel([('placed_at', ASCENDING)], name='placed_at'),
+        # Order queue: workers claim the oldest pending entry
+        IndexModel([('queue.state', ASCENDING), ('queue.enqueued_at', ASCENDING)], name='queue_state_enqueued'),
+    ],
+    'store_orders': [
+        IndexModel([('order_id', ASCENDING), ('store_phone', ASCENDING)], name='order_store', unique=True),
+        IndexModel([('store_phone', ASCENDING), ('placed_at', DESCENDING)], name='store_placed_at'),
+    ],
+    'carts': [
+        # Abandoned server-side carts are removed once expires_at passes
+        IndexModel([('expires_at', ASCENDING)], name='expires_at_ttl', expireAfterSeconds=0),
+    ],
+    'orders_archive': [
+        IndexModel([('user_id', ASCENDING), ('newest', DESCENDING)], name='user_newest'),
+    ],
+    'sales_daily': [
+        IndexModel([('store_phone', ASCENDING), ('date', DESCENDING)], name='store_date', unique=True),
+    ],
+    'sales_recorded': [
+        # Ledger entries only guard retried dispatches, so they can age out
+        IndexModel([('recorded_at', ASCENDING)], name='recorded_at_ttl', expireAfterSeconds=7 * 24 * 3600),
+    ],
+    'stock_reservations': [
+        # Idle order workers look for reservations older than the checkout timeout
+        IndexModel([('created_at', ASCENDING)], name='created_at'),
+    ],
+}
+
+# Indexes replaced by the ones above; ensure_indexes() drops them
+OBSOLETE_INDEXES = {
+    'orders': ['user_placed_at'],
+    'items': ['store_phone'],
+}
+
+# Representative route queries: (route, collection, filter, sort)
+ROUTE_QUERIES = [
+    ('customer_login', 'customers', {'phone': '0', 'pin': '0'}, None),
+    ('customer_register', 'customers', {'email': 'x'}, None),
+    ('customer_register', 'customers', {'phone': '0'}, None),
+    ('store_login', 'stores', {'phone': '0', 'password': 'x'}, None),
+    ('store_register', 'stores', {'email': 'x'}, None),
+    ('customer_dashboard', 'stores', {'address.city': 'x'}, None),
+    ('view_store_products', 'items', {'store_phone': '0'}, None),
+    ('store_dashboard', 'items', {'store_phone': '0'}, None),
+    ('import_menu', 'items', {'store_phone': '0', 'name': 'x'}, None),
+    ('export_menu', 'items', {'store_phone': '0'}, [('name', ASCENDING)]),
+    ('api_category_products', 'items', {'category_lc': 'pizza'}, [('_id', ASCENDING)]),
+    ('api_category_products', 'items', {}, [('_id', ASCENDING)]),
+    ('api_search', 'items', {'updated_at': {'$gte': ''}}, None),
+    ('api_search', 'item_tombstones', {'deleted_at': {'$gte': ''}}, None),
+    ('my_orders', 'orders', {'user_id': None}, [('placed_at', DESCENDING), ('_id', DESCENDING)]),
+    ('my_orders', 'orders_archive', {'user_id': None}, [('newest', DESCENDING)]),
+    ('archive_orders', 'orders', {'placed_at': {'$lt': ''}}, [('placed_at', ASCENDING)]),
+    ('order_worker', 'orders', {'queue.state': 'pending'}, [('queue.enqueued_at', ASCENDING)]),
+    ('store_dashboard', 'store_orders', {'store_phone': '0', 'status': {'$ne': 'delivered'}}, [('placed_at', DESCENDING)]),
+    ('store_analytics', 'store_orders', {'store_phone': '0', 'placed_at': {'$gte': '', '$lt': ''}}, None),
+    ('store_dashboard', 'sales_daily', {'store_phone': '0', 'date': {'$gte': ''}}, [('date', DESCENDING)]),
+]
+
+
+def normalize_category(category):
+    """Returns the lowercase form stored in items.category_lc."""
+    return (category or '').strip().lower()
+
+
+def backfill_category_lc(db=None):
+    """Sets category_lc on items that predate it. Returns the number updated."""
+    db = db if db is not None else get_db()
+    result = db.items.update_many(
+        {'category_lc': {'$exists': False}},
+        [{'$set': {'category_lc': {'$toLower': {'$trim': {'input': {'$ifNull': ['$category', '']}}}}}}])
+    return result.modified_count
+
+
+def ensure_indexes(db=None):
+    """Creates every declared index (a no-op for ones that already exist) and drops obsolete ones.
+
+    Returns {collection: [index names]}.
+    """
+    db = db if db is not None else get_db()
+    for name, obsolete in OBSOLETE_INDEXES.items():
+        existing = set(db[name].index_information())
+        for index in obsolete:
+            if index in existing:
+                db[name].drop_index(index)
+    return {name: db[name].create_indexes(models) for name, models in INDEXES.items()}
+
+
+def _stages(plan):
+    yield plan.get('stage')
+    for key in ('inputStage', 'queryPlan'):
+        if key in plan:
+            yield from _stages(plan[key])
+    for child in plan.get('inputStages', []):
+        yield from _stages(child)
+
+
+def find_collscans(db=None):
+    """Explains each ROUTE_QUERIES entry and returns the ones whose winning plan is a COLLSCAN."""
+    db = db if db is not None else get_db()
+    collscans = []
+    for route, collection, query, sort in ROUTE_QUERIES:
+        command = {'find': collection, 'filter': query}
+        if sort:
+            command['sort'] = dict(sort)
+        try:
+            explained = db.command('explain', command, verbosity='queryPlanner')
+        except OperationFailure as exc:
+            collscans.append({'route': route, 'collection': collection, 'filter': query, 'error': str(exc)})
+            continue
+        winning = explained.get('queryPlanner', {}).get('winningPlan', {})
+        if 'COLLSCAN' in _stages(winning):
+            collscans.append({'route': route, 'collection': collection, 'filter': query})
+    return collscans
@@ -0,0 +1,161 @@
+import base64
+import hashlib
+import io
+import os
+
+import gridfs
+from pymongo.errors import DuplicateKeyError
+
+from models.db import get_db
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # uploads are stored as-is without Pillow: no validation or renditions
+    Image = None
+
+BUCKET_NAME = 'media'
+
+# Pre-generated renditions (longest edge in pixels) served alongside the original
+THUMBNAIL_SIZES = {
+    'thumb': 160,
+    'card': 480,
+}
+# Uploads are downscaled to this for the 'original' rendition
+IMAGE_MAX_EDGE = int(os.environ.get('IMAGE_MAX_EDGE', 2048))
+# Decoded size limit, so a small file can't expand into a huge bitmap
+IMAGE_MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS', 40_000_000))
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+WEBP = Image is not None and features.check('webp')
+
+if Image is not None:
+    Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+
+
+class InvalidImage(ValueError):
+    """The upload is not an image Pillow can decode, or it is too large."""
+
+
+def _bucket(db=None):
+    return gridfs.GridFSBucket(db if db is not None else get_db(), bucket_name=BUCKET_NAME)
+
+
+def _file_id(image_id, size, webp=False):
+    file_id = image_id if size == 'original' else f"{image_id}-{size}"
+    return f"{file_id}.webp" if webp else file_id
+
+
+def _exists(db, file_id):
+    return db[f"{BUCKET_NAME}.files"].find_one({'_id': file_id}, {'_id': 1}) is not None
+
+
+def image_exists(image_id, db=None):
+    db = db if db is not None else get_db()
+    return _exists(db, image_id)
+
+
+def _upload(bucket, file_id, data, metadata):
+    try:
+        bucket.upload_from_stream_with_id(file_id, file_id, io.BytesIO(data), metadata=metadata)
+    except (gridfs.errors.FileExists, DuplicateKeyError):
+        pass  # a concurrent upload of the same bytes got there first
+
+
+def _decode(data):
+    """Decodes an upload into an upright RGB image; raises InvalidImage."""
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            width, height = img.size
+            if width * height > IMAGE_MAX_PIXELS:
+                raise InvalidImage(f"Image is {width}×{height}; the limit is {IMAGE_MAX_PIXELS} pixels")
+            img = ImageOps.exif_transpose(img)
+            if img.mode in ('RGBA', 'LA', 'P'):
+                img = img.convert('RGBA')
+                background = Image.new('RGB', img.size, 'white')
+                background.paste(img, mask=img.getchannel('A'))
+                return background
+            return img.convert('RGB')
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        if isinstance(exc, InvalidImage):
+            raise
+        raise InvalidImage("Uploaded file is not a readable image") from exc
+
+
+def renditions(data):
+    """Yields (size, webp, bytes) for every stored rendition of an upload.
+
+    Each is downscaled to its longest edge and re-encoded without the
+    upload's EXIF/ICC metadata; WebP copies are made when Pillow supports it.
+    """
+    img = _decode(data)
+    for size, max_edge in dict(THUMBNAIL_SIZES, original=IMAGE_MAX_EDGE).items():
+        copy = img.copy()
+        copy.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        out = io.BytesIO()
+        copy.save(out, format='JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+        yield size, False, out.getvalue()
+        if WEBP:
+            out = io.BytesIO()
+            copy.save(out, format='WEBP', quality=WEBP_QUALITY, method=4)
+            yield size, True, out.getvalue()
+
+
+def save_image(data, content_type='image/jpeg', db=None, image_id=None):
+    """Stores an upload's renditions content-addressed by SHA-256 and returns the image id.
+
+    Identical uploads are stored once. Raises InvalidImage if the data can't
+    be decoded (without Pillow the bytes are stored unchecked).
+    """
+    db = db if db is not None else get_db()
+    bucket = _bucket(db)
+    image_id = image_id or hashlib.sha256(data).hexdigest()
+    if _exists(db, image_id):
+        return image_id
+
+    if Image is None:
+        _upload(bucket, image_id, data, {'content_type': content_type, 'size': 'original'})
+        return image_id
+    # The original is written last: its presence marks the image as complete
+    for size, webp, rendition in sorted(renditions(data), key=lambda r: r[0] == 'original' and not r[1]):
+        _upload(bucket, _file_id(image_id, size, webp), rendition,
+                {'content_type': 'image/webp' if webp else 'image/jpeg', 'size': size})
+    return image_id
+
+
+def open_image(image_id, size='original', webp=False, db=None):
+    """Opens a stored rendition for streaming, falling back to the original.
+
+    With webp=True a WebP copy is preferred where one exists. Returns a
+    seekable GridOut, or None if the image does not exist.
+    """
+    bucket = _bucket(db)
+    sizes = [size] if size == 'original' else [size, 'original']
+    candidates = [_file_id(image_id, s, w) for s in sizes for w in ((True, False) if webp else (False,))]
+    for file_id in candidates:
+        try:
+            return bucket.open_download_stream(file_id)
+        except gridfs.errors.NoFile:
+            continue
+    return None
+
+
+def migrate_inline_images(db=None):
+    """Moves base64 `image` fields on items into the media store. Returns the number migrated."""
+    db = db if db is not None else get_db()
+    migrated = 0
+    for item in db.items.find({'image': {'$type': 'string'}}, {'image': 1}):
+        try:
+            data = base64.b64decode(item['image'])
+        except ValueError:
+            continue
+        try:
+            image_id = save_image(data, db=db)
+        except InvalidImage:
+            continue
+        db.items.update_one(
+            {'_id': item['_id']},
+            {'$set': {'image_id': image_id}, '$unset': {'image': ''}})
+        migrated += 1
+    # Items whose image was cleared keep a null field from the old schema
+    db.items.update_many({'image': None}, {'$unset': {'image': ''}})
+    return migrated
@@ -0,0 +1,333 @@
+import csv
+import io
+import json
+import math
+import mimetypes
+import os
+import re
+import uuid
+import zipfile
+from datetime import datetime
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from models.catalogue import invalidate_store
+from models.db import get_db
+from models.indexes import normalize_category
+from models.media import InvalidImage, image_exists, save_image
+from models.pricing import price_cache
+from models.stores import store_ref
+from models.uploads import BUSY_MESSAGE, IMAGE_MAX_BYTES, Upload, UploadRejected, get_pipeline, queue_upload, spool_upload
+
+# Bulk menu files use the add-item form's fields, one item per CSV row or
+# NDJSON line. Rows are upserted on (store_phone, name), so re-importing a
+# menu updates prices and descriptions in place. `image` names a file in the
+# accompanying zip archive, or an existing image id (as exported). `stock` and
+# `available` are optional; left empty, a row keeps the item's current values.
+CATEGORIES = ('Pizza', 'Beverage', 'Breads')
+MENU_FIELDS = ('name', 'price', 'description', 'category', 'store_phone', 'image', 'stock', 'available')
+BOOLEANS = {'true': True, 'yes': True, '1': True, 'false': False, 'no': False, '0': False}
+FORMATS = ('csv', 'ndjson')
+IMPORT_BATCH_SIZE = int(os.environ.get('MENU_IMPORT_BATCH_SIZE', 500))
+# Only the first errors are reported in full; the rest are counted
+MAX_REPORTED_ERRORS = 1000
+MAX_NAME_LENGTH = 200
+IMAGE_ID = re.compile(r'[0-9a-f]{64}')
+
+
+class MenuFormatError(ValueError):
+    """The file as a whole can't be read (unknown format, bad archive, missing columns)."""
+
+
+def menu_format(filename, default='csv'):
+    """Infers csv/ndjson from a file name's extension."""
+    ext = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    if ext in ('ndjson', 'jsonl'):
+        return 'ndjson'
+    return 'csv' if ext == 'csv' else default
+
+
+# ------------------ PARSING --------------------
+def _read_rows(stream, fmt):
+    """Yields (row number, dict or error string) from a binary stream, one row at a time."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='' if fmt == 'csv' else None)
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        if not reader.fieldnames or not {'name', 'price'} <= set(reader.fieldnames):
+            raise MenuFormatError("CSV needs a header row with at least name and price columns")
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield number, "not valid JSON"
+            continue
+        yield number, row if isinstance(row, dict) else "not a JSON object"
+
+
+def _validate(row):
+    """Returns (item fields, []) for a valid row, or (None, [error, ...])."""
+    errors = []
+    name = str(row.get('name') or '').strip()
+    if not name:
+        errors.append("name is required")
+    elif len(name) > MAX_NAME_LENGTH:
+        errors.append(f"name is longer than {MAX_NAME_LENGTH} characters")
+
+    try:
+        price = round(float(row.get('price')), 2)
+        if not (math.isfinite(price) and price >= 0):
+            raise ValueError
+    except (TypeError, ValueError):
+        errors.append("price must be a non-negative number")
+        price = None
+
+    categories = {normalize_category(c): c for c in CATEGORIES}
+    category = categories.get(normalize_category(str(row.get('category') or '')))
+    if category is None:
+        errors.append(f"category must be one of {', '.join(CATEGORIES)}")
+
+    stock = row.get('stock')
+    if stock not in (None, ''):
+        try:
+            stock = int(stock)
+            if stock < 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            errors.append("stock must be a whole number of units, or empty to not count it")
+
+    available = row.get('available')
+    if available not in (None, ''):
+        available = BOOLEANS.get(str(available).strip().lower())
+        if available is None:
+            errors.append("available must be true or false")
+
+    if errors:
+        return None, errors
+    optional = {'stock': stock, 'available': available}
+    return {
+        **{field: value for field, value in optional.items() if value not in (None, '')},
+        'name': name,
+        'price': price,
+        'description': str(row.get('description') or '').strip(),
+        'category': category,
+        'category_lc': normalize_category(category),
+        'store_phone': str(row.get('store_phone') or '').strip(),
+        'image': str(row.get('image') or '').strip(),
+    }, []
+
+
+# ------------------ IMPORT --------------------
+class MenuImport:
+    """One bulk import: validates rows and upserts them in unordered batches.
+
+    `store` pins every row to that store (rows naming another store_phone are
+    rejected); without it each row's store_phone must name an existing store.
+    Images from `archive` are processed inline, or queued on the image
+    pipeline with `defer_images` (as the web endpoint does); rows whose image
+    arrives while the pipeline is full are rejected as busy.
+    """
+
+    def __init__(self, db, store=None, archive=None, defer_images=False, batch_size=IMPORT_BATCH_SIZE):
+        self.db = db
+        self.store = store
+        self.archive = archive
+        self.defer_images = defer_images
+        self.batch_size = batch_size
+        self._stores = {store['phone']: store} if store else {}
+        self._touched = {}  # store phone -> categories written
+        self._batch = []  # (row number, UpdateOne, Upload or None)
+        self._held = 0  # uploads in the batch, spooled but not yet queued
+        self.summary = {'rows': 0, 'inserted': 0, 'updated': 0, 'failed': 0, 'errors': []}
+
+    def _error(self, number, errors):
+        self.summary['failed'] += 1
+        if len(self.summary['errors']) < MAX_REPORTED_ERRORS:
+            self.summary['errors'].append({'row': number, 'errors': errors})
+
+    def _store_for(self, phone):
+        if self.store is not None:
+            return self.store if phone in ('', self.store['phone']) else None
+        if phone not in self._stores:
+            self._stores[phone] = self.db.stores.find_one(
+                {'phone': phone}, {'phone': 1, 'store_name': 1, 'owner_name': 1}) if phone else None
+        return self._stores[phone]
+
+    def _image(self, name):
+        """Resolves an image column to ({'image_id': ...} or an Upload, None) or (None, error)."""
+        member = None
+        if self.archive is not None:
+            try:
+                member = self.archive.getinfo(name)
+            except KeyError:
+                pass
+        if member is None:
+            if IMAGE_ID.fullmatch(name) and image_exists(name, self.db):
+                return {'image_id': name}, None
+            return None, f"image {name!r} is not in the archive"
+        if member.file_size > IMAGE_MAX_BYTES:
+            return None, f"image {name!r}: Image is larger than {IMAGE_MAX_BYTES // (1024 * 1024)} MB."
+        if self.defer_images and not get_pipeline().admit(self._held):
+            return None, f"image {name!r}: {BUSY_MESSAGE}"
+        try:
+            # Spooling caps the bytes read, whatever size the archive claims
+            with self.archive.open(member) as source:
+                path, image_id = spool_upload(source)
+            if not self.defer_images:
+                try:
+                    with open(path, 'rb') as f:
+                        return {'image_id': save_image(f.read(), db=self.db)}, None
+                finally:
+                    os.unlink(path)
+            self._held += 1
+        except (UploadRejected, InvalidImage) as exc:
+            return None, f"image {name!r}: {exc}"
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        return Upload(path, image_id, content_type, uuid.uuid4().hex), None
+
+    def add(self, number, row):
+        self.summary['rows'] += 1
+        if isinstance(row, str):
+            return self._error(number, [row])
+        item, errors = _validate(row)
+        if item is None:
+            return self._error(number, errors)
+        store = self._store_for(item.pop('store_phone'))
+        if store is None:
+            return self._error(number, ["store_phone does not name "
+                                        + ("your store" if self.store else "a registered store")])
+
+        image, upload = item.pop('image'), None
+        fields = dict(item, **store_ref(store), store_phone=store['phone'], updated_at=datetime.now())
+        update = {'$set': fields}
+        if image:
+            resolved, error = self._image(image)
+            if error:
+                return self._error(number, [error])
+            if isinstance(resolved, Upload):
+                upload = resolved
+                fields['image_pending'] = upload.token
+            else:
+                fields.update(resolved)
+        else:
+            update['$setOnInsert'] = {'image_id': None}
+        self._batch.append((number, UpdateOne({'store_phone': store['phone'], 'name': item['name']},
+                                              update, upsert=True), upload))
+        self._touched.setdefault(store['phone'], set()).add(item['category_lc'])
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Writes the pending batch with one unordered bulk_write and queues its images."""
+        if not self._batch:
+            return
+        batch, self._batch, self._held = self._batch, [], 0
+        failed = {}
+        try:
+            result = self.db.items.bulk_write([op for _, op, _ in batch], ordered=False)
+            details = result.bulk_api_result
+        except BulkWriteError as exc:
+            details = exc.details
+            for error in details.get('writeErrors', []):
+                failed[error['index']] = error.get('errmsg', 'write failed')
+
+        self.summary['inserted'] += details.get('nUpserted', 0)
+        self.summary['updated'] += details.get('nMatched', 0)
+        for index, message in failed.items():
+            self._error(batch[index][0], [message])
+
+        uploads = [(upload, index) for index, (_, _, upload) in enumerate(batch) if upload]
+        if uploads:
+            tokens = [upload.token for upload, _ in uploads]
+            pending = {item['image_pending']: item['_id']
+                       for item in self.db.items.find({'image_pending': {'$in': tokens}}, {'image_pending': 1})}
+            for upload, index in uploads:
+                if index in failed or upload.token not in pending:
+                    os.unlink(upload.path)
+                else:
+                    queue_upload(upload, pending[upload.token])
+
+    def finish(self):
+        """Flushes the last batch and invalidates the caches of every store written to."""
+        self.flush()
+        for phone, categories in self._touched.items():
+            invalidate_store(phone, self._stores[phone]['_id'], categories)
+        if self._touched:
+            price_cache.invalidate()
+        self.summary['errors_truncated'] = self.summary['failed'] > len(self.summary['errors'])
+        return self.summary
+
+
+def import_menu(stream, fmt='csv', store=None, images=None, defer_images=False, db=None):
+    """Bulk-upserts menu items from a CSV/NDJSON binary stream. Returns a summary.
+
+    `images` is an optional zip archive (path or seekable file) holding the
+    files named in the image column. Rows are read and written a batch at a
+    time, so memory use doesn't grow with the file. The summary counts rows
+    inserted, updated and failed, with per-row errors.
+    Raises MenuFormatError if the file or archive can't be read at all.
+    """
+    db = db if db is not None else get_db()
+    if fmt not in FORMATS:
+        raise MenuFormatError(f"Unknown format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    try:
+        archive = zipfile.ZipFile(images) if images is not None else None
+    except zipfile.BadZipFile as exc:
+        raise MenuFormatError("Image archive is not a zip file") from exc
+    job = MenuImport(db, store, archive, defer_images)
+    try:
+        for number, row in _read_rows(stream, fmt):
+            job.add(number, row)
+    except UnicodeDecodeError as exc:
+        job.finish()
+        raise MenuFormatError("Menu file is not UTF-8 text") from exc
+    finally:
+        if archive is not None:
+            archive.close()
+    return job.finish()
+
+
+# ------------------ EXPORT --------------------
+def _export_row(item):
+    return {
+        'name': item.get('name', ''),
+        'price': item.get('price', 0),
+        'description': item.get('description', ''),
+        'category': item.get('category', ''),
+        'store_phone': item.get('store_phone', ''),
+        'image': item.get('image_id') or '',
+        'stock': item.get('stock'),
+        'available': item.get('available', True),
+    }
+
+
+def export_menu(store_phone=None, fmt='csv', db=None):
+    """Yields a store's menu (every store's without store_phone) as CSV or NDJSON text chunks.
+
+    Items are read from a cursor in name order, so exports stream at
+    constant memory and can be fed straight back to import_menu.
+    """
+    db = db if db is not None else get_db()
+    query = {'store_phone': store_phone} if store_phone else {}
+    sort = [('name', ASCENDING)] if store_phone else [('store_phone', ASCENDING), ('name', ASCENDING)]
+    cursor = db.items.find(query, {field: 1 for field in MENU_FIELDS + ('image_id',)}).sort(sort).batch_size(IMPORT_BATCH_SIZE)
+    if fmt == 'ndjson':
+        for item in cursor:
+            yield json.dumps(_export_row(item)) + '\n'
+        return
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=MENU_FIELDS)
+    writer.writeheader()
+    for item in cursor:
+        writer.writerow(_export_row(item))
+        if buffer.tell() > 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
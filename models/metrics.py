@@ -0,0 +1,269 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+
+from pymongo.monitoring import CommandListener
+
+log = logging.getLogger(__name__)
+
+# Latency buckets (seconds) shared by the request and Mongo command histograms
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SLOW_QUERY_MS = float(os.environ.get('MONGO_SLOW_QUERY_MS', 100))
+# A filter shape repeated this often within one request is logged as a likely N+1
+REPEATED_QUERY_THRESHOLD = int(os.environ.get('MONGO_REPEATED_QUERY_THRESHOLD', 5))
+SLOW_QUERY_LOG_SIZE = 200
+
+# Commands that never touch a user collection and would only add noise
+IGNORED_COMMANDS = {'ping', 'hello', 'ismaster', 'isMaster', 'buildInfo', 'endSessions', 'killCursors', 'saslStart', 'saslContinue'}
+# Where each command keeps its query filter
+FILTER_FIELDS = {'find': 'filter', 'count': 'query', 'distinct': 'query', 'findAndModify': 'query', 'delete': 'deletes', 'update': 'updates'}
+
+
+class Histogram:
+    """Cumulative Prometheus-style histogram keyed by a tuple of label values."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            return {labels: list(series) for labels, series in self._series.items()}
+
+
+class CounterVec:
+    """Monotonic counters keyed by a tuple of label values."""
+
+    def __init__(self):
+        self._values = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] += amount
+
+    def samples(self):
+        with self._lock:
+            return dict(self._values)
+
+
+# ------------------ ROUTE TAGGING --------------------
+class _Request:
+    """The request being served: its endpoint, start time and the Mongo commands it issued."""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.shapes = Counter()
+        self.commands = 0
+
+
+# The request served by the current thread, greenlet or asyncio task (Quart),
+# so Mongo commands can be charged to the route that issued them.
+_current = contextvars.ContextVar('metrics_request', default=None)
+
+
+def start_request(endpoint):
+    _current.set(_Request(endpoint))
+
+
+def current_route():
+    current = _current.get()
+    return current.endpoint if current is not None else 'background'
+
+
+def finish_request(method, status):
+    """Records the finished request's latency and reports filter shapes it repeated."""
+    current = _current.get()
+    if current is None:
+        return
+    _current.set(None)
+    request_seconds.observe((current.endpoint, method), time.perf_counter() - current.started)
+    requests_total.inc((current.endpoint, method, str(status)))
+    request_commands.observe((current.endpoint,), current.commands)
+    for (collection, shape), count in current.shapes.items():
+        if count >= REPEATED_QUERY_THRESHOLD:
+            _log_query(current.endpoint, 'repeated', collection, shape, count=count)
+
+
+# ------------------ MONGO COMMANDS --------------------
+def filter_shape(value):
+    """Replaces the literal values in a query with '?' so queries group by shape."""
+    if isinstance(value, dict):
+        return {key: filter_shape(v) for key, v in value.items()}
+    if isinstance(value, list):
+        shapes = []
+        for v in value:
+            shape = filter_shape(v)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes if any(isinstance(s, (dict, list)) for s in shapes) else '?'
+    return '?'
+
+
+def _command_filter(command_name, command):
+    field = FILTER_FIELDS.get(command_name)
+    if field in ('deletes', 'updates'):
+        statements = command.get(field) or [{}]
+        return statements[0].get('q', {})
+    if field:
+        return command.get(field, {})
+    if command_name == 'aggregate':
+        pipeline = command.get('pipeline') or [{}]
+        return pipeline[0].get('$match', {})
+    return {}
+
+
+def _documents_returned(command_name, reply):
+    cursor = reply.get('cursor')
+    if cursor:
+        return len(cursor.get('firstBatch', cursor.get('nextBatch', ())))
+    if command_name == 'findAndModify':
+        return 1 if reply.get('value') else 0
+    if command_name == 'count':
+        return 1
+    return 0
+
+
+class CommandMetrics(CommandListener):
+    """Counts Mongo commands by name, collection and route, and logs slow queries."""
+
+    def __init__(self):
+        self._pending = {}  # (connection, request_id) -> (route, command, collection, shape)
+        self._lock = threading.Lock()
+        self.slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        command = event.command
+        if event.command_name == 'getMore':
+            collection = command.get('collection', '')
+        else:
+            collection = command.get(event.command_name)
+            collection = collection if isinstance(collection, str) else ''
+        shape = repr(filter_shape(_command_filter(event.command_name, command)))
+        current = _current.get()
+        route = current.endpoint if current is not None else 'background'
+        if current is not None:
+            current.commands += 1
+            current.shapes[(collection, f'{event.command_name} {shape}')] += 1
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (route, event.command_name, collection, shape)
+
+    def _finish(self, event, reply=None):
+        with self._lock:
+            pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        route, name, collection, shape = pending
+        seconds = event.duration_micros / 1e6
+        labels = (name, collection, route)
+        command_seconds.observe(labels, seconds)
+        if reply is None:
+            command_failures.inc(labels)
+        else:
+            documents_returned.inc(labels, _documents_returned(name, reply))
+        if seconds * 1000 >= SLOW_QUERY_MS:
+            self.slow_queries.append({
+                'at': time.time(), 'route': route, 'command': name, 'collection': collection,
+                'filter': shape, 'duration_ms': round(seconds * 1000, 2),
+            })
+            _log_query(route, 'slow', collection, f'{name} {shape}', duration_ms=round(seconds * 1000, 2))
+
+    def succeeded(self, event):
+        self._finish(event, event.reply)
+
+    def failed(self, event):
+        self._finish(event)
+
+
+def _log_query(route, kind, collection, shape, **details):
+    extra = ' '.join(f'{k}={v}' for k, v in details.items())
+    log.warning("%s query route=%s collection=%s %s %s", kind, route, collection, extra, shape)
+
+
+request_seconds = Histogram()
+requests_total = CounterVec()
+request_commands = Histogram(buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55))
+command_seconds = Histogram()
+command_failures = CounterVec()
+documents_returned = CounterVec()
+command_metrics = CommandMetrics()
+image_jobs = CounterVec()
+image_job_seconds = Histogram(buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+
+# name -> (help text, callable returning the current value), read at scrape time
+_gauges = {}
+
+
+def register_gauge(name, help_text, read):
+    _gauges[name] = (help_text, read)
+
+
+# ------------------ EXPOSITION --------------------
+def _labels(names, values, **extra):
+    pairs = list(zip(names, values)) + list(extra.items())
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _histogram_lines(name, help_text, histogram, label_names):
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for labels, series in sorted(histogram.samples().items()):
+        for bound, count in zip(histogram.buckets, series):
+            lines.append(f'{name}_bucket{_labels(label_names, labels, le=bound)} {count}')
+        lines.append(f'{name}_bucket{_labels(label_names, labels, le="+Inf")} {series[-2]}')
+        lines.append(f'{name}_count{_labels(label_names, labels)} {series[-2]}')
+        lines.append(f'{name}_sum{_labels(label_names, labels)} {series[-1]}')
+    return lines
+
+
+def _counter_lines(name, help_text, counter, label_names):
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+    for labels, value in sorted(counter.samples().items()):
+        lines.append(f'{name}{_labels(label_names, labels)} {value}')
+    return lines
+
+
+def _gauge_lines(name, help_text, read):
+    return [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {read()}']
+
+
+def render_prometheus():
+    """Returns this worker's metrics in the Prometheus text exposition format."""
+    lines = []
+    lines += _histogram_lines('pizza_http_request_duration_seconds', 'Request latency by endpoint.',
+                              request_seconds, ('endpoint', 'method'))
+    lines += _counter_lines('pizza_http_requests_total', 'Requests by endpoint and status.',
+                            requests_total, ('endpoint', 'method', 'status'))
+    lines += _histogram_lines('pizza_http_request_mongo_commands', 'Mongo commands issued per request.',
+                              request_commands, ('endpoint',))
+    lines += _histogram_lines('pizza_mongo_command_duration_seconds', 'Mongo command latency by route.',
+                              command_seconds, ('command', 'collection', 'route'))
+    lines += _counter_lines('pizza_mongo_documents_returned_total', 'Documents returned by Mongo commands.',
+                            documents_returned, ('command', 'collection', 'route'))
+    lines += _counter_lines('pizza_mongo_command_failures_total', 'Failed Mongo commands.',
+                            command_failures, ('command', 'collection', 'route'))
+    lines += _counter_lines('pizza_image_jobs_total', 'Image uploads by outcome.',
+                            image_jobs, ('outcome',))
+    lines += _histogram_lines('pizza_image_job_duration_seconds', 'Image upload time from queueing to stored.',
+                              image_job_seconds, ('outcome',))
+    for name, (help_text, read) in sorted(_gauges.items()):
+        lines += _gauge_lines(name, help_text, read)
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,312 @@
+import logging
+import os
+import socket
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import OperationFailure
+
+from models.db import get_db
+from models.events import emit_order_status, emit_store_order
+from models.indexes import INDEXES
+from models.sales import complete_order_lines, record_order
+from models.stock import release_stale_reservations
+
+log = logging.getLogger(__name__)
+
+# Order lifecycle; each store's share of an order moves through these in order
+ORDER_STATUSES = ('placed', 'accepted', 'baking', 'out_for_delivery', 'delivered')
+NEXT_STATUS = dict(zip(ORDER_STATUSES, ORDER_STATUSES[1:]))
+
+# The orders collection doubles as the durable queue: a new order is inserted
+# with queue.state 'pending' and dispatched to its stores by a worker.
+ORDER_WORKERS = int(os.environ.get('ORDER_WORKERS', 2))
+LEASE_SECONDS = int(os.environ.get('ORDER_LEASE_SECONDS', 60))
+MAX_ATTEMPTS = int(os.environ.get('ORDER_MAX_ATTEMPTS', 5))
+POLL_SECONDS = float(os.environ.get('ORDER_POLL_SECONDS', 1.0))
+# How often an idle worker returns stock held by abandoned checkouts
+STOCK_SWEEP_SECONDS = float(os.environ.get('STOCK_SWEEP_SECONDS', 60))
+# Unique indexes that keep concurrent dispatches from upserting duplicates;
+# workers create them before their first dispatch, not only in init-indexes
+DISPATCH_INDEXES = ('store_orders', 'sales_daily')
+
+_wakeup = threading.Event()
+
+
+def _queue_entry(order):
+    now = datetime.now()
+    order['status'] = 'placed'
+    order['status_history'] = [{'status': 'placed', 'at': now}]
+    order['queue'] = {'state': 'pending', 'enqueued_at': now, 'attempts': 0}
+    return order
+
+
+def enqueue_order(order, db=None):
+    """Inserts a new order as a pending queue entry (the only write on checkout) and returns its id."""
+    db = db if db is not None else get_db()
+    result = db.orders.insert_one(_queue_entry(order))
+    ensure_dispatcher()
+    _wakeup.set()
+    return result.inserted_id
+
+
+async def enqueue_order_async(order, db):
+    """enqueue_order for the async routes; `db` comes from models.async_db."""
+    result = await db.orders.insert_one(_queue_entry(order))
+    ensure_dispatcher()
+    _wakeup.set()
+    return result.inserted_id
+
+
+def claim_next(worker_id, db=None):
+    """Leases the oldest pending order (or one whose lease expired) to a worker."""
+    db = db if db is not None else get_db()
+    now = datetime.now()
+    return db.orders.find_one_and_update(
+        {'$or': [
+            {'queue.state': 'pending'},
+            {'queue.state': 'processing', 'queue.lease_until': {'$lt': now}},
+        ]},
+        {
+            '$set': {
+                'queue.state': 'processing',
+                'queue.worker': worker_id,
+                'queue.claimed_at': now,
+                'queue.lease_until': now + timedelta(seconds=LEASE_SECONDS),
+            },
+            '$inc': {'queue.attempts': 1},
+        },
+        sort=[('queue.enqueued_at', ASCENDING)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def dispatch_order(order, db=None):
+    """Fans an order out to its stores and folds it into the sales rollups.
+
+    Safe to retry: store orders are upserted by (order_id, store_phone), the
+    sales ledger skips stores already rolled up, and queue.rolled_up is only
+    set once the rollup has been applied.
+    """
+    db = db if db is not None else get_db()
+    _, lines = next(complete_order_lines(db, [order]))
+
+    per_store = {}
+    for line in lines:
+        if line['store_phone']:
+            per_store.setdefault(line['store_phone'], []).append(line)
+
+    store_orders = [
+        {
+            'order_id': order['_id'],
+            'store_phone': store_phone,
+            'user_id': order.get('user_id'),
+            'customer_name': order.get('name'),
+            'address': order.get('address'),
+            'phone': order.get('phone'),
+            'items': store_lines,
+            'placed_at': order['placed_at'],
+            'status': 'placed',
+            'status_history': [{'status': 'placed', 'at': order['placed_at']}],
+        }
+        for store_phone, store_lines in per_store.items()
+    ]
+    if store_orders:
+        ops = [
+            UpdateOne({'order_id': o['order_id'], 'store_phone': o['store_phone']}, {'$setOnInsert': o}, upsert=True)
+            for o in store_orders
+        ]
+        result = db.store_orders.bulk_write(ops, ordered=False)
+        for index in result.upserted_ids:
+            emit_store_order(store_orders[index], 'new_order')
+
+    if not order.get('queue', {}).get('rolled_up'):
+        record_order(dict(order, items=lines), db)
+    db.orders.update_one(
+        {'_id': order['_id']},
+        {'$set': {'items': lines, 'store_phones': list(per_store), 'queue.rolled_up': True}},
+    )
+
+
+def _ack(db, order, worker_id, error=None):
+    if error is None:
+        update = {'queue.state': 'done', 'queue.processed_at': datetime.now()}
+    else:
+        failed = order['queue']['attempts'] >= MAX_ATTEMPTS
+        update = {'queue.state': 'failed' if failed else 'pending', 'queue.last_error': error}
+    db.orders.update_one({'_id': order['_id'], 'queue.worker': worker_id}, {'$set': update})
+
+
+def advance_status(order_id, store_phone, to_status, db=None):
+    """Moves a store's share of an order to its next status.
+
+    The update only applies if the share is currently in the preceding status,
+    so concurrent or repeated clicks cannot skip or rewind states. Returns the
+    updated store order, or None if the transition is not allowed.
+    """
+    db = db if db is not None else get_db()
+    previous = {v: k for k, v in NEXT_STATUS.items()}.get(to_status)
+    if previous is None:
+        return None
+    now = datetime.now()
+    store_order = db.store_orders.find_one_and_update(
+        {'order_id': order_id, 'store_phone': store_phone, 'status': previous},
+        {'$set': {'status': to_status}, '$push': {'status_history': {'status': to_status, 'at': now}}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if store_order:
+        emit_store_order(store_order, 'order_status')
+        _sync_order_status(db, order_id, now)
+    return store_order
+
+
+def _sync_order_status(db, order_id, now):
+    """Sets the customer-facing order status to that of its least advanced store."""
+    parts = db.store_orders.find({'order_id': order_id}, {'status': 1})
+    status = min((p['status'] for p in parts), key=ORDER_STATUSES.index, default='placed')
+    order = db.orders.find_one_and_update(
+        {'_id': order_id, 'status': {'$ne': status}},
+        {'$set': {'status': status}, '$push': {'status_history': {'status': status, 'at': now}}},
+        projection={'user_id': 1},
+    )
+    if order:
+        emit_order_status(order_id, order['user_id'], status)
+
+
+class OrderDispatcher:
+    """Thread pool that drains the order queue and records throughput/lag metrics."""
+
+    def __init__(self, threads=ORDER_WORKERS):
+        self.threads = threads
+        self._stop = threading.Event()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=1000)  # completion timestamps, for throughput
+        self.processed = 0
+        self.failed = 0
+        self.last_lag_ms = None
+        self.max_lag_ms = 0.0
+        self._next_sweep = time.monotonic() + STOCK_SWEEP_SECONDS
+        self._indexed = False
+
+    def start(self):
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        for i in range(self.threads):
+            worker = threading.Thread(target=self._run, args=(f"{prefix}:{i}",), name=f"order-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        return self
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        _wakeup.set()
+        for worker in self._workers:
+            worker.join(timeout)
+
+    def _run(self, worker_id):
+        while not self._stop.is_set():
+            try:
+                db = get_db()
+                self._ensure_indexes(db)
+                order = claim_next(worker_id, db)
+            except Exception:
+                log.exception("Order queue unavailable")
+                self._stop.wait(POLL_SECONDS)
+                continue
+            if order is None:
+                self._sweep_stock(db)
+                _wakeup.wait(POLL_SECONDS)
+                _wakeup.clear()
+                continue
+            self._process(db, order, worker_id)
+
+    def _ensure_indexes(self, db):
+        if self._indexed:
+            return
+        with self._lock:
+            if not self._indexed:
+                for name in DISPATCH_INDEXES:
+                    try:
+                        db[name].create_indexes(INDEXES[name])
+                    except OperationFailure:
+                        # e.g. duplicates already present; init-indexes reports it
+                        log.exception("Creating the %s indexes failed", name)
+                self._indexed = True
+
+    def _sweep_stock(self, db):
+        with self._lock:
+            if time.monotonic() < self._next_sweep:
+                return
+            self._next_sweep = time.monotonic() + STOCK_SWEEP_SECONDS
+        try:
+            released = release_stale_reservations(db=db)
+        except Exception:
+            log.exception("Releasing stale stock reservations failed")
+            return
+        if released:
+            log.warning("Returned stock held by %d abandoned checkouts", released)
+
+    def _process(self, db, order, worker_id):
+        try:
+            dispatch_order(order, db)
+        except Exception as exc:
+            log.exception("Dispatching order %s failed", order['_id'])
+            _ack(db, order, worker_id, error=str(exc))
+            with self._lock:
+                self.failed += 1
+            return
+        _ack(db, order, worker_id)
+        lag_ms = (datetime.now() - order['queue']['enqueued_at']).total_seconds() * 1000
+        with self._lock:
+            self.processed += 1
+            self.last_lag_ms = round(lag_ms, 2)
+            self.max_lag_ms = max(self.max_lag_ms, self.last_lag_ms)
+            self._recent.append(time.monotonic())
+
+    def stats(self):
+        with self._lock:
+            cutoff = time.monotonic() - 60
+            return {
+                'threads': self.threads,
+                'processed': self.processed,
+                'failed': self.failed,
+                'throughput_per_min': sum(1 for t in self._recent if t >= cutoff),
+                'last_lag_ms': self.last_lag_ms,
+                'max_lag_ms': self.max_lag_ms,
+            }
+
+
+_dispatcher = None
+_dispatcher_pid = None
+_dispatcher_lock = threading.Lock()
+
+
+def ensure_dispatcher(threads=None):
+    """Starts this process's dispatcher on first use (after any fork). A no-op when ORDER_WORKERS=0."""
+    global _dispatcher, _dispatcher_pid
+    threads = ORDER_WORKERS if threads is None else threads
+    if threads <= 0 or _dispatcher_pid == os.getpid():
+        return _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher_pid != os.getpid():
+            _dispatcher = OrderDispatcher(threads).start()
+            _dispatcher_pid = os.getpid()
+    return _dispatcher
+
+
+def queue_stats(db=None):
+    """Reports queue depth and age of the oldest pending order, plus this process's worker counters."""
+    db = db if db is not None else get_db()
+    oldest = db.orders.find_one({'queue.state': 'pending'}, {'queue.enqueued_at': 1}, sort=[('queue.enqueued_at', ASCENDING)])
+    stats = {
+        'pending': db.orders.count_documents({'queue.state': 'pending'}),
+        'processing': db.orders.count_documents({'queue.state': 'processing'}),
+        'failed': db.orders.count_documents({'queue.state': 'failed'}),
+        'oldest_pending_age_s': round((datetime.now() - oldest['queue']['enqueued_at']).total_seconds(), 2) if oldest else 0,
+    }
+    if _dispatcher is not None and _dispatcher_pid == os.getpid():
+        stats['workers'] = _dispatcher.stats()
+    return stats
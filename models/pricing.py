@@ -0,0 +1,141 @@
+import os
+
+from bson.objectid import ObjectId
+
+from models.cache import LRUCache
+from models.db import get_db
+from models.stock import orderable
+
+# Checkout totals are always computed here from current item prices; the
+# prices a cart line was added with are only a display hint.
+DELIVERY_FEE = float(os.environ.get('DELIVERY_FEE', 40))
+TAX_RATE = float(os.environ.get('TAX_RATE', 0.05))
+
+# Coupon code -> how it discounts the order ('flat' off the item total,
+# 'percent' of the item total, or 'delivery' to waive the delivery fee)
+COUPONS = {
+    'SAVE20': {'type': 'flat', 'value': 20, 'description': '₹20 off your order'},
+    'PIZZA50': {'type': 'percent', 'value': 50, 'description': '50% off on all pizzas'},
+    'FREESHIP': {'type': 'delivery', 'value': 0, 'description': 'Free delivery on your order'},
+}
+
+# item id -> {'name', 'price', 'store_phone', 'stock'} (or None once the item is
+# gone, switched off or sold out).
+# Cart views read through it; checkout always reprices from the collection.
+price_cache = LRUCache(
+    maxsize=int(os.environ.get('PRICE_CACHE_SIZE', 20000)),
+    ttl=int(os.environ.get('PRICE_CACHE_TTL', 30)),
+)
+
+_PRICE_FIELDS = {'name': 1, 'price': 1, 'store_phone': 1, 'available': 1, 'stock': 1}
+_MISSING = object()
+
+
+def _price_query(item_ids):
+    return {'_id': {'$in': [ObjectId(i) for i in item_ids if ObjectId.is_valid(i)]}}
+
+
+def _cached_prices(item_ids):
+    """Splits item ids into ({id: cached entry}, [ids to fetch])."""
+    found, missing = {}, []
+    for item_id in item_ids:
+        entry = price_cache.get((item_id,), _MISSING)
+        if entry is _MISSING:
+            missing.append(item_id)
+        else:
+            found[item_id] = entry
+    return found, missing
+
+
+def _remember(prices, item_ids, docs):
+    for doc in docs:
+        if not orderable(doc):
+            continue
+        prices[str(doc['_id'])] = {'name': doc.get('name'), 'price': float(doc.get('price', 0)),
+                                   'store_phone': doc.get('store_phone'), 'stock': doc.get('stock')}
+    for item_id in item_ids:
+        prices.setdefault(item_id, None)
+        price_cache.set((item_id,), prices[item_id])
+    return prices
+
+
+def current_prices(item_ids, cached=True, db=None):
+    """Returns {item_id: {'name', 'price', 'store_phone', 'stock'} or None} with one $in query for any misses."""
+    prices, missing = _cached_prices(item_ids) if cached else ({}, list(item_ids))
+    if missing:
+        db = db if db is not None else get_db()
+        prices = _remember(prices, missing, db.items.find(_price_query(missing), _PRICE_FIELDS))
+    return prices
+
+
+async def current_prices_async(item_ids, db, cached=True):
+    """current_prices() for the async routes; `db` comes from models.async_db."""
+    prices, missing = _cached_prices(item_ids) if cached else ({}, list(item_ids))
+    if missing:
+        docs = await db.items.find(_price_query(missing), _PRICE_FIELDS).to_list()
+        prices = _remember(prices, missing, docs)
+    return prices
+
+
+def invalidate_prices(*item_ids):
+    """Drops cached prices after items are edited or deleted in this worker."""
+    for item_id in item_ids:
+        price_cache.invalidate(str(item_id))
+
+
+def totals(lines, prices, coupon=None):
+    """Prices cart lines ({item_id: line}) against `prices` (from current_prices).
+
+    Returns the repriced lines (with store_phone, for the order, and whether
+    stock is counted), the ids of items no longer sold, and subtotal, delivery_fee, tax, discount and total.
+    """
+    priced, unavailable = [], []
+    for item_id, line in lines.items():
+        current = prices.get(item_id)
+        if current is None:
+            unavailable.append(item_id)
+            continue
+        priced.append({
+            'id': item_id,
+            'name': current['name'] or line.get('name'),
+            'price': current['price'],
+            'quantity': line['quantity'],
+            'subtotal': round(current['price'] * line['quantity'], 2),
+            'store_phone': current['store_phone'],
+            'stock_tracked': current.get('stock') is not None,
+        })
+
+    subtotal = sum((line['price'] * line['quantity'] for line in priced), 0.0)
+    delivery_fee = DELIVERY_FEE if priced else 0.0
+    tax = subtotal * TAX_RATE
+    discount = 0.0
+    offer = COUPONS.get(coupon)
+    if offer and priced:
+        if offer['type'] == 'flat':
+            discount = min(offer['value'], subtotal)
+        elif offer['type'] == 'percent':
+            discount = subtotal * offer['value'] / 100
+        elif offer['type'] == 'delivery':
+            delivery_fee = 0.0
+    total = max(subtotal + delivery_fee + tax - discount, 0.0)
+
+    return {
+        'lines': priced,
+        'unavailable': unavailable,
+        'coupon': coupon if offer else None,
+        'subtotal': round(subtotal, 2),
+        'delivery_fee': round(delivery_fee, 2),
+        'tax': round(tax, 2),
+        'discount': round(discount, 2),
+        'total': round(total, 2),
+    }
+
+
+def price_cart(lines, coupon=None, cached=True, db=None):
+    """Reprices a whole cart with one items query (or none, from the price cache); see totals()."""
+    return totals(lines, current_prices(list(lines), cached, db), coupon)
+
+
+async def price_cart_async(lines, db, coupon=None, cached=True):
+    """price_cart() for the async routes."""
+    return totals(lines, await current_prices_async(list(lines), db, cached), coupon)
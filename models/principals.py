@@ -0,0 +1,52 @@
+import os
+
+from bson.objectid import ObjectId
+
+from models.cache import LRUCache
+from models.db import get_db
+
+# Logged-in customers and stores, keyed by (role, id). The short TTL bounds how
+# long another worker can serve a stale profile after an edit.
+principal_cache = LRUCache(
+    maxsize=int(os.environ.get('PRINCIPAL_CACHE_SIZE', 10000)),
+    ttl=int(os.environ.get('PRINCIPAL_CACHE_TTL', 30)),
+)
+
+_MISSING = object()
+
+# Session key -> collection holding that kind of principal
+COLLECTIONS = {
+    'customer': 'customers',
+    'store': 'stores',
+}
+
+
+def get_principal(role, principal_id):
+    """Returns the customer or store document for a session id, or None if it no longer exists."""
+    if not ObjectId.is_valid(principal_id):
+        return None
+    return principal_cache.get_or_load(
+        (role, principal_id),
+        lambda: get_db()[COLLECTIONS[role]].find_one({'_id': ObjectId(principal_id)}))
+
+
+async def get_principal_async(role, principal_id, db):
+    """get_principal() for the async routes, sharing the same cache."""
+    if not ObjectId.is_valid(principal_id):
+        return None
+    key = (role, principal_id)
+    principal = principal_cache.get(key, _MISSING)
+    if principal is _MISSING:
+        principal = await db[COLLECTIONS[role]].find_one({'_id': ObjectId(principal_id)})
+        principal_cache.set(key, principal)
+    return principal
+
+
+def invalidate_principal(role, principal_id):
+    """Drops a cached principal; call after editing a customer or store profile."""
+    principal_cache.invalidate(role, str(principal_id))
+
+
+def remember_principal(role, document):
+    """Primes the cache with a document just loaded at login."""
+    principal_cache.set((role, str(document['_id'])), document)
@@ -0,0 +1,141 @@
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Opt-in: nothing is sampled unless PROFILE_EVERY or PROFILE_ROUTES is set
+# (here or at runtime through /debug/profile).
+PROFILE_EVERY = int(os.environ.get('PROFILE_EVERY', 0))
+PROFILE_ROUTES = os.environ.get('PROFILE_ROUTES', '')
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '/tmp')
+MAX_STACK_DEPTH = 64
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(endpoint, frame):
+    """Renders a stack root-first as one line of Brendan Gregg's folded format."""
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(endpoint)
+    return ';'.join(reversed(labels))
+
+
+class StackSampler:
+    """Samples the Python stacks of threads serving selected requests.
+
+    A background thread wakes every `interval` seconds while at least one
+    profiled request is in flight and counts each of their stacks, so samples
+    accumulate across requests as flamegraph-ready folded stacks. Stacks are
+    read from OS threads, so use threaded workers (not gevent) to profile.
+    """
+
+    def __init__(self, every=PROFILE_EVERY, routes=PROFILE_ROUTES, interval_ms=PROFILE_INTERVAL_MS):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._active = {}  # thread ident -> endpoint
+        self._seen = itertools.count(1)
+        self._thread_pid = None
+        self.stacks = Counter()
+        self.samples = 0
+        self.profiled_requests = 0
+        self.configure(every, routes, interval_ms)
+
+    def configure(self, every=None, routes=None, interval_ms=None):
+        """Changes what is profiled; every=0 and no routes turns profiling off."""
+        if every is not None:
+            self.every = int(every)
+        if routes is not None:
+            self.routes = set(routes.split(',') if isinstance(routes, str) else routes) - {''}
+        if interval_ms is not None:
+            self.interval = float(interval_ms) / 1000
+        self.enabled = bool(self.every or self.routes)
+
+    def begin(self, endpoint):
+        """Starts sampling the current thread if this request is selected. Returns whether it was."""
+        if endpoint not in self.routes and not (self.every and next(self._seen) % self.every == 0):
+            return False
+        with self._lock:
+            self._active[threading.get_ident()] = endpoint
+            self.profiled_requests += 1
+        self._ensure_thread()
+        self._wake.set()
+        return True
+
+    def end(self):
+        with self._lock:
+            self._active.pop(threading.get_ident(), None)
+
+    def _ensure_thread(self):
+        if self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid != os.getpid():
+                self._thread_pid = os.getpid()
+                threading.Thread(target=self._run, name='stack-sampler', daemon=True).start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                targets = dict(self._active)
+            if not targets:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            frames = sys._current_frames()
+            stacks = [_collapse(endpoint, frames[ident]) for ident, endpoint in targets.items() if ident in frames]
+            with self._lock:
+                self.stacks.update(stacks)
+                self.samples += len(stacks)
+            time.sleep(self.interval)
+
+    def folded(self):
+        """Returns the collected samples as folded stacks (`frame;frame;... count` per line)."""
+        with self._lock:
+            return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+    def reset(self):
+        with self._lock:
+            self.stacks.clear()
+            self.samples = 0
+            self.profiled_requests = 0
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'every': self.every,
+            'routes': sorted(self.routes),
+            'interval_ms': self.interval * 1000,
+            'profiled_requests': self.profiled_requests,
+            'samples': self.samples,
+            'distinct_stacks': len(self.stacks),
+        }
+
+
+sampler = StackSampler()
+
+
+def dump_to_file(directory=PROFILE_DIR):
+    """Writes the folded stacks to <directory>/profile-<pid>-<timestamp>.folded and returns the path."""
+    path = os.path.join(directory, f'profile-{os.getpid()}-{int(time.time())}.folded')
+    with open(path, 'w') as f:
+        f.write(sampler.folded())
+    return path
+
+
+def install_signal_handler(signum=None):
+    """Dumps the profile to PROFILE_DIR when the worker receives SIGUSR2 (main thread only)."""
+    import signal
+    signum = signum or getattr(signal, 'SIGUSR2', None)
+    if signum is None or threading.current_thread() is not threading.main_thread():
+        return False
+    signal.signal(signum, lambda *_: dump_to_file())
+    return True
@@ -0,0 +1,166 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from models.archive import iter_archived_orders
+from models.db import get_db
+
+# One document per (store_phone, date): totals plus hourly and per-item breakdowns
+ROLLUP_COLLECTION = 'sales_daily'
+# One document per (order_id, store_phone) already added to the rollups, so a
+# retried dispatch skips it; _id is unique without any index being built
+LEDGER_COLLECTION = 'sales_recorded'
+BACKFILL_BATCH_SIZE = 500
+DUPLICATE_KEY = 11000
+
+
+def _rollup_ops(order, lines):
+    """Builds the $inc upserts that add one order to its stores' daily rollups.
+
+    `lines` are the order's items, each carrying product_id, name, quantity,
+    price and store_phone. Store sales are the item subtotal; delivery fee and
+    taxes belong to the order, not to any one store.
+    """
+    placed_at = order['placed_at']
+    date = placed_at.strftime('%Y-%m-%d')
+    hour = f"{placed_at.hour:02d}"
+
+    per_store = defaultdict(list)
+    for line in lines:
+        if line.get('store_phone'):
+            per_store[line['store_phone']].append(line)
+
+    ops = []
+    for store_phone, store_lines in per_store.items():
+        sales = sum(line['price'] * line['quantity'] for line in store_lines)
+        inc = {
+            'total_sales': sales,
+            'order_count': 1,
+            f'hours.{hour}.sales': sales,
+            f'hours.{hour}.orders': 1,
+        }
+        names = {}
+        for line in store_lines:
+            key = str(line['product_id'])
+            inc[f'items.{key}.quantity'] = inc.get(f'items.{key}.quantity', 0) + line['quantity']
+            inc[f'items.{key}.sales'] = inc.get(f'items.{key}.sales', 0) + line['price'] * line['quantity']
+            names[f'items.{key}.name'] = line['name']
+        ops.append(UpdateOne({'store_phone': store_phone, 'date': date}, {'$inc': inc, '$set': names}, upsert=True))
+    return ops
+
+
+def record_order(order, db=None):
+    """Adds a freshly placed order to the per-store daily rollups; a no-op for stores that already have it.
+
+    Each store's share is claimed in the ledger before its rollup is
+    incremented, and the claims are dropped again if the increment fails.
+    """
+    db = db if db is not None else get_db()
+    stores = {line['store_phone'] for line in order['items'] if line.get('store_phone')}
+    if not stores:
+        return
+    now = datetime.now()
+    claims = [{'_id': {'order_id': order['_id'], 'store_phone': phone}, 'recorded_at': now} for phone in stores]
+    try:
+        db[LEDGER_COLLECTION].insert_many(claims, ordered=False)
+    except BulkWriteError as exc:
+        errors = exc.details.get('writeErrors', [])
+        if any(error['code'] != DUPLICATE_KEY for error in errors):
+            raise
+        # Stores whose claim already existed were rolled up by an earlier attempt
+        claims = [claim for index, claim in enumerate(claims) if index not in {e['index'] for e in errors}]
+    if not claims:
+        return
+    # One op per claim, in the same order, so a failed op names its claim
+    ops = [op for claim in claims for op in _rollup_ops(
+        order, [line for line in order['items'] if line.get('store_phone') == claim['_id']['store_phone']])]
+    try:
+        db[ROLLUP_COLLECTION].bulk_write(ops, ordered=False)
+    except BulkWriteError as exc:
+        failed = {error['index'] for error in exc.details.get('writeErrors', [])}
+        db[LEDGER_COLLECTION].delete_many({'_id': {'$in': [claims[index]['_id'] for index in failed]}})
+        raise
+    except Exception:
+        db[LEDGER_COLLECTION].delete_many({'_id': {'$in': [claim['_id'] for claim in claims]}})
+        raise
+
+
+def daily_sales(store_phone, days=7, db=None):
+    """Returns [{date, total_sales, order_count}] for the last `days` days, newest first."""
+    db = db if db is not None else get_db()
+    since = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+    cursor = db[ROLLUP_COLLECTION].find(
+        {'store_phone': store_phone, 'date': {'$gte': since}},
+        {'_id': 0, 'date': 1, 'total_sales': 1, 'order_count': 1},
+    ).sort('date', -1)
+    return list(cursor)
+
+
+def complete_order_lines(db, orders):
+    """Yields (order, lines) with price/store_phone filled in from items where missing.
+
+    Checkout records only what the cart knows, and older orders stored just
+    product_id, name and quantity, so the item's current store and price are used.
+    """
+    missing = {
+        line['product_id'] for order in orders for line in order['items']
+        if 'price' not in line or 'store_phone' not in line
+    }
+    catalogue = {}
+    if missing:
+        cursor = db.items.find({'_id': {'$in': [ObjectId(i) for i in missing]}}, {'price': 1, 'store_phone': 1})
+        catalogue = {item['_id']: item for item in cursor}
+
+    for order in orders:
+        lines = []
+        for line in order['items']:
+            item = catalogue.get(ObjectId(line['product_id']), {})
+            lines.append({
+                'product_id': line['product_id'],
+                'name': line.get('name', ''),
+                'quantity': line.get('quantity', 0),
+                'price': float(line.get('price', item.get('price', 0))),
+                'store_phone': line.get('store_phone', item.get('store_phone')),
+            })
+        yield order, lines
+
+
+def rebuild_sales_rollups(db=None):
+    """Recomputes every rollup from the orders collection and its archive. Returns the number of orders replayed."""
+    db = db if db is not None else get_db()
+    db[ROLLUP_COLLECTION].delete_many({})
+
+    replayed = 0
+    batch = []
+    # Queued orders not yet dispatched are rolled up by the order worker instead
+    replayable = {
+        'placed_at': {'$exists': True},
+        '$or': [{'queue': {'$exists': False}}, {'queue.rolled_up': True}],
+    }
+    cursor = db.orders.find(replayable, {'items': 1, 'placed_at': 1}).batch_size(BACKFILL_BATCH_SIZE)
+    for order in cursor:
+        batch.append(order)
+        if len(batch) == BACKFILL_BATCH_SIZE:
+            replayed += _replay(db, batch)
+            batch = []
+    # Archived orders were all rolled up before they were archived
+    for order in iter_archived_orders(db):
+        batch.append(order)
+        if len(batch) == BACKFILL_BATCH_SIZE:
+            replayed += _replay(db, batch)
+            batch = []
+    if batch:
+        replayed += _replay(db, batch)
+    return replayed
+
+
+def _replay(db, orders):
+    ops = []
+    for order, lines in complete_order_lines(db, orders):
+        ops.extend(_rollup_ops(order, lines))
+    if ops:
+        db[ROLLUP_COLLECTION].bulk_write(ops, ordered=False)
+    return len(orders)
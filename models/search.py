@@ -0,0 +1,354 @@
+import bisect
+import heapq
+import operator
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from functools import reduce
+
+from models.db import get_db
+
+# Each worker keeps an in-memory inverted index over the catalogue. Writes in
+# this worker update it immediately; other workers pick changes up from
+# items.updated_at and item_tombstones at most SEARCH_SYNC_SECONDS later.
+SEARCH_SYNC_SECONDS = float(os.environ.get('SEARCH_SYNC_SECONDS', 10))
+TOMBSTONE_COLLECTION = 'item_tombstones'
+
+# Relative weight of a term by the field it came from
+FIELD_WEIGHTS = {'name': 3.0, 'category': 2.0, 'store_name': 1.5, 'description': 1.0}
+# Score multipliers for how a query token matched a term
+EXACT, PREFIX, FUZZY = 1.0, 0.7, 0.5
+MAX_PREFIX_TERMS = 50
+MAX_QUERY_TOKENS = 6
+MIN_FUZZY_LENGTH = 4
+# Postings switch from a set to a bitmap past this many docs (and 1/256 of all doc numbers)
+DENSE_POSTING_MIN = 64
+COMPACT_MIN_DOCS = 1000
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    return _TOKEN.findall((text or '').lower())
+
+
+def _bitmap(docs, size):
+    """Packs a collection of doc numbers below `size` into an int with those bits set."""
+    buf = bytearray((size >> 3) + 1)
+    for doc in docs:
+        buf[doc >> 3] |= 1 << (doc & 7)
+    return int.from_bytes(buf, 'little')
+
+
+def _deletes(term):
+    """Variants of term with one character removed (the symmetric-delete trick for edit distance 1)."""
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+class SearchIndex:
+    """Inverted index with prefix completion and one-typo fuzzy matching.
+
+    Documents are catalogue items, keyed by their string id. Each term's postings are kept per field
+    weight, as a set of doc numbers while the term is rare and as an int
+    bitmap once it is common, so AND/OR over popular terms stay in C. Not
+    thread-safe on its own: use it through CatalogueSearch, which runs
+    queries and updates under one lock.
+    """
+
+    def __init__(self):
+        self._ids = {}          # item id -> internal doc number
+        self._docs = []         # doc number -> display fields (None once removed)
+        self._doc_terms = []    # doc number -> {term: weight}
+        self._postings = {}     # term -> {weight: set of doc numbers, or bitmap int}
+        self._term_docs = {}    # term -> number of live docs containing it
+        self._terms = []        # sorted vocabulary, for prefix lookups
+        self._delete_map = defaultdict(set)  # one-char-deleted variant -> terms
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _add_term(self, term):
+        self._postings[term] = {}
+        self._term_docs[term] = 0
+        bisect.insort(self._terms, term)
+        for variant in _deletes(term):
+            self._delete_map[variant].add(term)
+
+    def _drop_term(self, term):
+        del self._postings[term]
+        del self._term_docs[term]
+        del self._terms[bisect.bisect_left(self._terms, term)]
+        for variant in _deletes(term):
+            self._delete_map[variant].discard(term)
+            if not self._delete_map[variant]:
+                del self._delete_map[variant]
+
+    def _post(self, term, weight, doc):
+        postings = self._postings[term]
+        posting = postings.get(weight)
+        if isinstance(posting, int):
+            postings[weight] = posting | (1 << doc)
+            return
+        if posting is None:
+            posting = postings[weight] = set()
+        posting.add(doc)
+        # A set costs tens of bytes per doc, a bitmap one bit per doc number
+        if len(posting) > DENSE_POSTING_MIN and len(posting) * 256 > len(self._docs):
+            postings[weight] = _bitmap(posting, len(self._docs))
+
+    def _unpost(self, term, weight, doc):
+        postings = self._postings[term]
+        posting = postings[weight]
+        if isinstance(posting, int):
+            posting &= ~(1 << doc)
+            if posting:
+                postings[weight] = posting
+            else:
+                del postings[weight]
+        else:
+            posting.discard(doc)
+            if not posting:
+                del postings[weight]
+
+    def upsert(self, item):
+        """Indexes (or re-indexes) an item dict with _id, name, description, category and store_name."""
+        item_id = str(item['_id'])
+        self.remove(item_id)
+        weights = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(item.get(field)):
+                weights[term] = max(weights.get(term, 0), weight)
+
+        doc = len(self._docs)
+        self._ids[item_id] = doc
+        self._docs.append({
+            '_id': item_id,
+            'name': item.get('name'),
+            'price': item.get('price'),
+            'category': item.get('category'),
+            'store_owner': item.get('store_name'),
+            'image_id': item.get('image_id'),
+        })
+        self._doc_terms.append(weights)
+        for term, weight in weights.items():
+            if term not in self._postings:
+                self._add_term(term)
+            self._post(term, weight, doc)
+            self._term_docs[term] += 1
+
+        # Edits retire doc numbers; renumber once most bitmap bits are dead
+        if len(self._docs) > COMPACT_MIN_DOCS and len(self._docs) > 2 * len(self._ids):
+            self._compact()
+
+    def remove(self, item_id):
+        doc = self._ids.pop(str(item_id), None)
+        if doc is None:
+            return
+        for term, weight in self._doc_terms[doc].items():
+            self._unpost(term, weight, doc)
+            self._term_docs[term] -= 1
+            if not self._term_docs[term]:
+                self._drop_term(term)
+        self._docs[doc] = None
+        self._doc_terms[doc] = {}
+
+    def _compact(self):
+        live = [(self._docs[doc], self._doc_terms[doc]) for doc in sorted(self._ids.values())]
+        self.__init__()
+        for display, weights in live:
+            doc = len(self._docs)
+            self._ids[display['_id']] = doc
+            self._docs.append(display)
+            self._doc_terms.append(weights)
+            for term, weight in weights.items():
+                if term not in self._postings:
+                    self._add_term(term)
+                self._post(term, weight, doc)
+                self._term_docs[term] += 1
+
+    def _prefix_terms(self, prefix):
+        start = bisect.bisect_left(self._terms, prefix)
+        terms = []
+        for term in self._terms[start:start + MAX_PREFIX_TERMS]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def _fuzzy_terms(self, token):
+        """Terms within one insertion, deletion, substitution or transposition of token."""
+        variants = _deletes(token)
+        terms = set(self._delete_map.get(token, ()))
+        for variant in variants:
+            if variant in self._postings:
+                terms.add(variant)
+            terms.update(self._delete_map.get(variant, ()))
+        terms.discard(token)
+        return terms
+
+    def _token_levels(self, token, prefix):
+        """Returns ([(score, bitmap), ...] best first with disjoint bitmaps, bitmap of every match)."""
+        matches = {}
+        if token in self._postings:
+            matches[token] = EXACT
+        if prefix:
+            for term in self._prefix_terms(token):
+                matches.setdefault(term, PREFIX)
+        if len(token) >= MIN_FUZZY_LENGTH:
+            for term in self._fuzzy_terms(token):
+                matches.setdefault(term, FUZZY)
+
+        by_score = defaultdict(list)
+        for term, multiplier in matches.items():
+            for weight, posting in self._postings[term].items():
+                by_score[weight * multiplier].append(posting)
+
+        levels, seen = [], 0
+        for score in sorted(by_score, reverse=True):
+            bitmaps = [p for p in by_score[score] if isinstance(p, int)]
+            sparse = [p for p in by_score[score] if not isinstance(p, int)]
+            if sparse:
+                bitmaps.append(_bitmap(set().union(*sparse), len(self._docs)))
+            bitmap = reduce(operator.or_, bitmaps) & ~seen
+            if bitmap:
+                levels.append((score, bitmap))
+                seen |= bitmap
+        return levels, seen
+
+    def search(self, query, limit=20, prefix=True):
+        """Returns up to `limit` items matching every query token, best first, each with a score.
+
+        The last token also matches as a prefix (for search-as-you-type) and
+        tokens of MIN_FUZZY_LENGTH or more tolerate one typo.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TOKENS]
+        if not tokens:
+            return []
+        per_token, candidates = [], -1
+        for i, token in enumerate(tokens):
+            levels, matched = self._token_levels(token, prefix and i == len(tokens) - 1)
+            candidates &= matched
+            if not candidates:
+                return []
+            per_token.append(levels)
+        per_token = [[(score, bitmap & candidates) for score, bitmap in levels if bitmap & candidates]
+                     for levels in per_token]
+
+        # Walk combinations of per-token score levels from the highest total down
+        hits = []
+        start = (0,) * len(per_token)
+        heap = [(-sum(levels[0][0] for levels in per_token), start)]
+        queued = {start}
+        while heap and len(hits) < limit:
+            total, combo = heapq.heappop(heap)
+            bitmap = candidates
+            for levels, level in zip(per_token, combo):
+                bitmap &= levels[level][1]
+            while bitmap and len(hits) < limit:
+                low = bitmap & -bitmap
+                hits.append((low.bit_length() - 1, -total))
+                bitmap ^= low
+            for i, levels in enumerate(per_token):
+                if combo[i] + 1 < len(levels):
+                    successor = combo[:i] + (combo[i] + 1,) + combo[i + 1:]
+                    if successor not in queued:
+                        queued.add(successor)
+                        score = sum(per_token[j][level][0] for j, level in enumerate(successor))
+                        heapq.heappush(heap, (-score, successor))
+        return [dict(self._docs[doc], score=round(score, 3)) for doc, score in hits]
+
+    def suggest(self, query, limit=8):
+        """Returns distinct item names for an autocomplete dropdown."""
+        names = []
+        for hit in self.search(query, limit=limit * 3):
+            if hit['name'] not in names:
+                names.append(hit['name'])
+            if len(names) == limit:
+                break
+        return names
+
+
+class CatalogueSearch:
+    """The worker's SearchIndex over db.items, loaded on first use and kept in sync.
+
+    Updates mutate the index in place (and compaction rebuilds it), so every
+    query also holds the lock; a query takes well under a millisecond and
+    holds the GIL throughout anyway, so this costs no parallelism.
+    """
+
+    def __init__(self, sync_seconds=SEARCH_SYNC_SECONDS):
+        self.sync_seconds = sync_seconds
+        self._lock = threading.Lock()
+        self._index = None
+        self._pid = None
+        self._synced_at = None   # server-side timestamp of the last sync
+        self._checked = 0.0      # monotonic time of the last sync attempt
+
+    def _load(self, db):
+        index = SearchIndex()
+        started = datetime.now()
+        for item in db.items.find({}, {'name': 1, 'description': 1, 'category': 1, 'price': 1,
+                                       'store_name': 1, 'image_id': 1}):
+            index.upsert(item)
+        self._index, self._pid, self._synced_at = index, os.getpid(), started
+
+    def _sync(self, db):
+        """Applies items changed or deleted (by any worker) since the last sync."""
+        started = datetime.now()
+        since = {'$gte': self._synced_at}
+        for item in db.items.find({'updated_at': since}):
+            self._index.upsert(item)
+        for tombstone in db[TOMBSTONE_COLLECTION].find({'deleted_at': since}, {'_id': 1}):
+            self._index.remove(tombstone['_id'])
+        self._synced_at = started
+
+    def index(self, db=None):
+        """Returns this process's index, building it on first use and syncing it when due.
+
+        Read it only while holding the lock (as search() and suggest() do).
+        """
+        now = time.monotonic()
+        if self._index is not None and self._pid == os.getpid() and now - self._checked < self.sync_seconds:
+            return self._index
+        db = db if db is not None else get_db()
+        with self._lock:
+            if self._index is None or self._pid != os.getpid():
+                self._load(db)
+            elif now - self._checked >= self.sync_seconds:
+                self._sync(db)
+            self._checked = now
+        return self._index
+
+    def search(self, query, limit=20, db=None):
+        index = self.index(db)
+        with self._lock:
+            return index.search(query, limit)
+
+    def suggest(self, query, limit=8, db=None):
+        index = self.index(db)
+        with self._lock:
+            return index.suggest(query, limit)
+
+    def item_saved(self, item_id, db=None):
+        """Re-indexes an item just inserted or edited in this worker."""
+        db = db if db is not None else get_db()
+        item = db.items.find_one({'_id': item_id})
+        if item is None or self._index is None or self._pid != os.getpid():
+            return
+        with self._lock:
+            self._index.upsert(item)
+
+    def item_deleted(self, item_id, db=None):
+        """Records a deletion for other workers and drops the item from this worker's index."""
+        db = db if db is not None else get_db()
+        db[TOMBSTONE_COLLECTION].update_one(
+            {'_id': str(item_id)}, {'$set': {'deleted_at': datetime.now()}}, upsert=True)
+        if self._index is not None and self._pid == os.getpid():
+            with self._lock:
+                self._index.remove(item_id)
+
+
+catalogue_search = CatalogueSearch()
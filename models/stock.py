@@ -0,0 +1,183 @@
+import os
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+
+from models.db import get_db
+
+# Items may carry `stock` (units left; absent or None means not tracked) and
+# `available` (False stops orders, e.g. when a store runs out of dough).
+# Checkout takes stock with one conditional $inc per tracked line, which only
+# matches while enough is left, so concurrent checkouts of the same item
+# never oversell and never wait on a lock.
+#
+# Each checkout's decrements are logged in stock_reservations under the
+# order id until the order is written; entries older than
+# RESERVATION_TIMEOUT_SECONDS whose order never appeared (the web worker
+# died mid-checkout) are returned to stock by release_stale_reservations().
+RESERVATION_COLLECTION = 'stock_reservations'
+RESERVATION_TIMEOUT_SECONDS = int(os.environ.get('STOCK_RESERVATION_TIMEOUT', 300))
+
+
+class OutOfStock(Exception):
+    """Some cart lines couldn't be reserved; `item_ids` lists them."""
+
+    def __init__(self, item_ids):
+        super().__init__(f"Not enough stock for {', '.join(item_ids)}")
+        self.item_ids = item_ids
+
+
+def orderable(item):
+    """False for items switched off or sold out."""
+    stock = item.get('stock')
+    return item.get('available') is not False and (stock is None or stock > 0)
+
+
+def _take(item_id, quantity):
+    return (
+        {'_id': ObjectId(item_id), 'available': {'$ne': False}, 'stock': {'$gte': quantity}},
+        {'$inc': {'stock': -quantity}},
+    )
+
+
+def _tracked(pricing):
+    """(item id, quantity) for the priced cart lines whose stock is counted."""
+    return [(line['id'], line['quantity']) for line in pricing['lines'] if line.get('stock_tracked')]
+
+
+def _restock_ops(taken):
+    return [UpdateOne({'_id': ObjectId(item_id)}, {'$inc': {'stock': quantity}}) for item_id, quantity in taken]
+
+
+def reserve_stock(order_id, pricing, db=None):
+    """Takes stock for every tracked line of a priced cart (from price_cart(cached=False)).
+
+    All or nothing: if any line is short, the lines already taken are put
+    back and OutOfStock is raised. Call commit_reservation() once the order
+    is written, or release_reservation() if it can't be.
+    """
+    db = db if db is not None else get_db()
+    tracked = _tracked(pricing)
+    if not tracked:
+        return
+    ledger = db[RESERVATION_COLLECTION]
+    ledger.insert_one({'_id': order_id, 'taken': [], 'created_at': datetime.now()})
+    taken = []
+    try:
+        for item_id, quantity in tracked:
+            if db.items.update_one(*_take(item_id, quantity)).modified_count:
+                taken.append((item_id, quantity))
+                ledger.update_one({'_id': order_id}, {'$push': {'taken': [item_id, quantity]}})
+            else:
+                raise OutOfStock([item_id])
+    except BaseException:
+        _release(db, order_id, taken)
+        raise
+
+
+async def reserve_stock_async(order_id, pricing, db):
+    """reserve_stock() for the async routes; `db` comes from models.async_db."""
+    tracked = _tracked(pricing)
+    if not tracked:
+        return
+    ledger = db[RESERVATION_COLLECTION]
+    await ledger.insert_one({'_id': order_id, 'taken': [], 'created_at': datetime.now()})
+    taken = []
+    try:
+        for item_id, quantity in tracked:
+            if (await db.items.update_one(*_take(item_id, quantity))).modified_count:
+                taken.append((item_id, quantity))
+                await ledger.update_one({'_id': order_id}, {'$push': {'taken': [item_id, quantity]}})
+            else:
+                raise OutOfStock([item_id])
+    except BaseException:
+        await _release_async(db, order_id, taken)
+        raise
+
+
+def _release(db, order_id, taken):
+    if taken:
+        db.items.bulk_write(_restock_ops(taken), ordered=False)
+    db[RESERVATION_COLLECTION].delete_one({'_id': order_id})
+
+
+async def _release_async(db, order_id, taken):
+    if taken:
+        await db.items.bulk_write(_restock_ops(taken), ordered=False)
+    await db[RESERVATION_COLLECTION].delete_one({'_id': order_id})
+
+
+def release_reservation(order_id, db=None):
+    """Returns a reservation's stock (the order was not placed after all)."""
+    db = db if db is not None else get_db()
+    entry = db[RESERVATION_COLLECTION].find_one({'_id': order_id})
+    if entry is not None:
+        _release(db, order_id, entry['taken'])
+
+
+async def release_reservation_async(order_id, db):
+    entry = await db[RESERVATION_COLLECTION].find_one({'_id': order_id})
+    if entry is not None:
+        await _release_async(db, order_id, entry['taken'])
+
+
+def commit_reservation(order_id, db=None):
+    """Drops the ledger entry of a reservation whose order has been written."""
+    db = db if db is not None else get_db()
+    db[RESERVATION_COLLECTION].delete_one({'_id': order_id})
+
+
+async def commit_reservation_async(order_id, db):
+    await db[RESERVATION_COLLECTION].delete_one({'_id': order_id})
+
+
+def release_stale_reservations(timeout_seconds=RESERVATION_TIMEOUT_SECONDS, db=None):
+    """Returns the stock of abandoned reservations (no order after the timeout). Returns how many."""
+    db = db if db is not None else get_db()
+    cutoff = datetime.now() - timedelta(seconds=timeout_seconds)
+    released = 0
+    for entry in db[RESERVATION_COLLECTION].find({'created_at': {'$lt': cutoff}}):
+        if db.orders.find_one({'_id': entry['_id']}, {'_id': 1}) is not None:
+            commit_reservation(entry['_id'], db)
+            continue
+        # Claim the entry before restocking so two sweepers can't both return it
+        if db[RESERVATION_COLLECTION].find_one_and_delete({'_id': entry['_id']}) is not None:
+            if entry['taken']:
+                db.items.bulk_write(_restock_ops(entry['taken']), ordered=False)
+            released += 1
+    return released
+
+
+def set_stock(item_id, store_phone, available=None, stock=None, add=None, untrack=False, db=None):
+    """Updates an item's availability and stock; returns the item (None if not the store's).
+
+    `add` restocks (or, negative, writes off) with $inc, so it is safe while
+    checkouts are decrementing; `stock` overwrites the count; `untrack`
+    stops counting it. Raises ValueError for a write-off larger than the
+    stock left; `available` is still applied in that case.
+    """
+    db = db if db is not None else get_db()
+    query = {'_id': ObjectId(item_id), 'store_phone': store_phone}
+    update = {'$set': {'updated_at': datetime.now()}}
+    if available is not None:
+        update['$set']['available'] = bool(available)
+    if untrack:
+        update['$unset'] = {'stock': ''}
+    elif stock is not None:
+        update['$set']['stock'] = max(int(stock), 0)
+    elif add:
+        add = int(add)
+        update['$inc'] = {'stock': add}
+        if add < 0:
+            query['stock'] = {'$gte': -add}
+    item = db.items.find_one_and_update(
+        query, update,
+        projection={'available': 1, 'stock': 1, 'category_lc': 1, 'store_id': 1}, return_document=True)
+    if item is None and 'stock' in query:
+        # The write-off didn't fit; save the rest of the change without it
+        del query['stock'], update['$inc']
+        current = db.items.find_one_and_update(query, update, projection={'stock': 1})
+        if current is not None:
+            raise ValueError(f"Can't write off {-add} units; only {current.get('stock') or 0} left")
+    return item
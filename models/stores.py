@@ -0,0 +1,69 @@
+from datetime import datetime
+
+from pymongo import UpdateMany
+
+from models.catalogue import invalidate_store
+from models.db import get_db
+from models.principals import invalidate_principal
+
+# Store fields copied onto each of its items, so catalogue reads need no join
+# on stores. propagate_store_refs() rewrites them when a store changes.
+DEFAULT_STORE_NAME = 'Unknown Store'
+PROFILE_FIELDS = ('store_name', 'owner_name')
+
+
+def store_ref(store):
+    """Returns the store fields denormalized onto an item."""
+    return {
+        'store_id': store['_id'],
+        'store_name': store.get('store_name', DEFAULT_STORE_NAME),
+        'store_owner': store.get('owner_name'),
+    }
+
+
+def _refresh_items(store):
+    """A bulk op rewriting the store's reference fields on those of its items where they differ."""
+    ref = store_ref(store)
+    stale = {'store_phone': store['phone'], '$or': [{field: {'$ne': value}} for field, value in ref.items()]}
+    return UpdateMany(stale, {'$set': dict(ref, updated_at=datetime.now())})
+
+
+def propagate_store_refs(store, db=None):
+    """Fans a store's current reference fields out to its items. Returns the number of items changed.
+
+    Only items whose copy is out of date are written, so this is cheap to
+    re-run; their updated_at is bumped so workers' search indexes pick up the
+    new store name.
+    """
+    db = db if db is not None else get_db()
+    return db.items.bulk_write([_refresh_items(store)]).modified_count
+
+
+def update_store_profile(store, changes, db=None):
+    """Saves edited profile fields for a store and fans them out to its items.
+
+    Returns the updated store document.
+    """
+    db = db if db is not None else get_db()
+    changes = {field: changes[field] for field in PROFILE_FIELDS if changes.get(field)}
+    if changes:
+        db.stores.update_one({'_id': store['_id']}, {'$set': changes})
+        store = dict(store, **changes)
+        propagate_store_refs(store, db)
+        invalidate_principal('store', store['_id'])
+        categories = db.items.distinct('category_lc', {'store_phone': store['phone']})
+        invalidate_store(store['phone'], store['_id'], categories)
+    return store
+
+
+def backfill_store_refs(db=None):
+    """One-shot migration: sets store_id and the store name on items that predate them.
+
+    Also repairs items whose copy drifted (e.g. written by a worker holding a
+    stale store profile). Returns the number of items changed.
+    """
+    db = db if db is not None else get_db()
+    ops = [_refresh_items(store) for store in db.stores.find({}, {'phone': 1, 'store_name': 1, 'owner_name': 1})]
+    if not ops:
+        return 0
+    return db.items.bulk_write(ops, ordered=False).modified_count
@@ -0,0 +1,239 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from models import metrics
+from models.catalogue import invalidate_store
+from models.db import get_db
+from models.media import InvalidImage, save_image
+from models.pricing import invalidate_prices
+from models.search import catalogue_search
+
+log = logging.getLogger(__name__)
+
+# Store uploads are streamed to a spool file inside the request and processed
+# (validated, downscaled, re-encoded, stored) by a per-process thread pool;
+# the item gets its image_id when that finishes.
+IMAGE_MAX_BYTES = int(os.environ.get('IMAGE_MAX_BYTES', 10 * 1024 * 1024))
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
+# Uploads waiting or in progress per process before new ones are turned away
+IMAGE_QUEUE_LIMIT = int(os.environ.get('IMAGE_QUEUE_LIMIT', 32))
+SPOOL_DIR = os.environ.get('UPLOAD_SPOOL_DIR') or os.path.join(tempfile.gettempdir(), 'pizza-uploads')
+# Spool files older than this belong to a worker that died mid-job
+SPOOL_MAX_AGE_SECONDS = 3600
+CHUNK_SIZE = 64 * 1024
+BUSY_MESSAGE = "Image processing is busy right now; please try the upload again shortly."
+
+
+class UploadRejected(ValueError):
+    """The upload can't be accepted; the message is shown to the store."""
+
+
+# A spooled upload waiting to be queued; `token` becomes the item's image_pending
+Upload = namedtuple('Upload', 'path image_id content_type token')
+
+
+# ------------------ SPOOLING --------------------
+def spool_upload(stream, max_bytes=IMAGE_MAX_BYTES):
+    """Copies an upload stream to a spool file in chunks. Returns (path, sha256 hex).
+
+    Raises UploadRejected if the upload is empty or larger than max_bytes;
+    nothing is left on disk in that case.
+    """
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=SPOOL_DIR, suffix='.upload')
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while chunk := stream.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadRejected(f"Image is larger than {max_bytes // (1024 * 1024)} MB.")
+                digest.update(chunk)
+                out.write(chunk)
+        if not size:
+            raise UploadRejected("Uploaded image is empty.")
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path, digest.hexdigest()
+
+
+def _sweep_spool(max_age=SPOOL_MAX_AGE_SECONDS):
+    """Removes spool files left behind by workers that exited mid-job."""
+    cutoff = time.time() - max_age
+    try:
+        entries = list(os.scandir(SPOOL_DIR))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        try:
+            if entry.name.endswith('.upload') and entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+        except OSError:
+            pass
+
+
+# ------------------ PIPELINE --------------------
+def _attach(db, item_id, token, image_id):
+    """Points the item at its processed image, unless a newer upload or edit has replaced it."""
+    update = {'$unset': {'image_pending': ''}}
+    if image_id is not None:
+        update['$set'] = {'image_id': image_id, 'updated_at': datetime.now()}
+    item = db.items.find_one_and_update({'_id': item_id, 'image_pending': token}, update,
+                                        projection={'store_phone': 1, 'store_id': 1, 'category_lc': 1})
+    if item is not None and image_id is not None:
+        invalidate_store(item['store_phone'], item.get('store_id'), [item.get('category_lc')])
+        invalidate_prices(item_id)
+        catalogue_search.item_saved(item_id, db)
+    return item is not None
+
+
+class ImagePipeline:
+    """Thread pool that turns spooled uploads into stored renditions and records queue metrics."""
+
+    def __init__(self, workers=IMAGE_WORKERS, queue_limit=IMAGE_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-worker')
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=1000)  # completion timestamps, for throughput
+        self.queued = 0
+        self.processing = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.turned_away = 0
+        self.last_ms = None
+
+    def admit(self, held=0):
+        """Whether another upload may be spooled; counts it as turned away if not.
+
+        `held` is how many uploads the caller has spooled but not yet submitted.
+        """
+        with self._lock:
+            if self.queued + self.processing + held < self.queue_limit:
+                return True
+            self.turned_away += 1
+        metrics.image_jobs.inc(('busy',))
+        return False
+
+    def submit(self, upload, item_id):
+        """Queues a spooled upload for item_id.
+
+        Admission is checked with admit() before spooling, so a job is never
+        refused here: its item is already marked pending.
+        """
+        with self._lock:
+            self.queued += 1
+        self._executor.submit(self._process, *upload, item_id, time.perf_counter())
+
+    def _process(self, path, image_id, content_type, token, item_id, enqueued):
+        with self._lock:
+            self.queued -= 1
+            self.processing += 1
+        outcome = 'processed'
+        try:
+            db = get_db()
+            try:
+                with open(path, 'rb') as f:
+                    stored = save_image(f.read(), content_type, db=db, image_id=image_id)
+            except InvalidImage as exc:
+                log.warning("Upload for item %s rejected: %s", item_id, exc)
+                outcome, stored = 'rejected', None
+            _attach(db, item_id, token, stored)
+        except Exception:
+            log.exception("Processing the image for item %s failed", item_id)
+            outcome = 'failed'
+        finally:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            elapsed = time.perf_counter() - enqueued
+            metrics.image_jobs.inc((outcome,))
+            metrics.image_job_seconds.observe((outcome,), elapsed)
+            with self._lock:
+                self.processing -= 1
+                setattr(self, outcome, getattr(self, outcome) + 1)
+                self.last_ms = round(elapsed * 1000, 2)
+                self._recent.append(time.monotonic())
+
+    def stats(self):
+        with self._lock:
+            cutoff = time.monotonic() - 60
+            return {
+                'workers': self.workers,
+                'queue_limit': self.queue_limit,
+                'queued': self.queued,
+                'processing': self.processing,
+                'processed': self.processed,
+                'rejected': self.rejected,
+                'turned_away': self.turned_away,
+                'failed': self.failed,
+                'throughput_per_min': sum(1 for t in self._recent if t >= cutoff),
+                'last_ms': self.last_ms,
+            }
+
+
+_pipeline = None
+_pipeline_pid = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline():
+    """Returns this process's image pipeline, starting it on first use (after any fork)."""
+    global _pipeline, _pipeline_pid
+    if _pipeline_pid == os.getpid():
+        return _pipeline
+    with _pipeline_lock:
+        if _pipeline_pid != os.getpid():
+            _sweep_spool()
+            _pipeline = ImagePipeline()
+            _pipeline_pid = os.getpid()
+    return _pipeline
+
+
+def accept_upload(file_storage):
+    """Spools a store's image upload for processing. Returns an Upload.
+
+    Store `upload.token` as the item's image_pending, then pass the upload to
+    queue_upload(); the image is only attached while the token still matches,
+    so a later upload or a cleared image wins. Raises UploadRejected for
+    non-images, oversized files, or when this process's pipeline is full.
+    """
+    if not (file_storage.content_type or '').startswith('image/'):
+        raise UploadRejected("Uploaded file is not an image.")
+    pipeline = get_pipeline()
+    if not pipeline.admit():
+        raise UploadRejected(BUSY_MESSAGE)
+    path, image_id = spool_upload(file_storage.stream)
+    return Upload(path, image_id, file_storage.content_type, uuid.uuid4().hex)
+
+
+def queue_upload(upload, item_id):
+    """Hands a spooled upload to the pipeline once its item carries the pending token."""
+    get_pipeline().submit(upload, item_id)
+
+
+def upload_stats():
+    """This process's pipeline counters ({} before its first upload)."""
+    if _pipeline is not None and _pipeline_pid == os.getpid():
+        return _pipeline.stats()
+    return {}
+
+
+def _depth(field):
+    return lambda: upload_stats().get(field, 0)
+
+
+metrics.register_gauge('pizza_image_jobs_queued', 'Image uploads waiting for a worker.', _depth('queued'))
+metrics.register_gauge('pizza_image_jobs_processing', 'Image uploads being processed.', _depth('processing'))
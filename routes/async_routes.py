@@ -0,0 +1,201 @@
+"""Async versions of the busiest JSON endpoints, served on Quart by asgi.py.
+
+Each view keeps the URL, endpoint name and response of its namesake in
+routes/auth_routes.py but awaits Mongo through models.async_db, so one worker
+keeps serving other requests while a query is in flight. Sessions are shared
+with the Flask app (same cookie format and secret key).
+"""
+import asyncio
+import uuid
+from datetime import datetime
+from functools import wraps
+
+from bson.objectid import ObjectId
+from quart import Blueprint, Response, g, jsonify, request, session, url_for
+
+from models.async_db import get_async_db
+from models.cart import get_async_cart_store
+from models.catalogue import get_category_page_async
+from models.orders import enqueue_order_async
+from models.pricing import invalidate_prices, price_cart_async
+from models.principals import get_principal_async
+from models.stock import (OutOfStock, commit_reservation_async, orderable, release_reservation_async,
+                          reserve_stock_async)
+from routes.auth_routes import (_cart_line, _catalogue_page_request, _order_items, _order_totals, _serialize_page,
+                                 _stream_page)
+
+# Named 'auth' so url_for('auth.<endpoint>') resolves the same on both apps
+async_auth_bp = Blueprint('auth', __name__)
+
+
+def login_required_async(role, api_error):
+    """JSON-only counterpart of routes.decorators.login_required."""
+    def decorator(view):
+        @wraps(view)
+        async def wrapped(*args, **kwargs):
+            principal = await get_principal_async(role, session[role], get_async_db()) if role in session else None
+            if principal is None:
+                session.pop(role, None)
+                return jsonify(api_error), 401
+            setattr(g, role, principal)
+            return await view(*args, **kwargs)
+        return wrapped
+    return decorator
+
+
+def _cart_id():
+    if 'cart_id' not in session:
+        session['cart_id'] = uuid.uuid4().hex
+    return session['cart_id']
+
+
+async def _cart_lines():
+    if 'cart_id' not in session:
+        return {}
+    return await get_async_cart_store().get(session['cart_id'])
+
+
+# ------------------ CATALOGUE --------------------
+@async_auth_bp.route('/api/category/<category_name>')
+async def api_category_products(category_name):
+    page, error = _catalogue_page_request(category_name, request.args)
+    if error:
+        return jsonify({'error': error}), 400
+
+    async def load_page():
+        db = get_async_db()
+        items = await db.items.find(page['query'], page['projection']).sort('_id', 1).limit(page['limit'] + 1).to_list()
+        return _serialize_page(items, page, url_for)
+
+    docs, next_cursor = await get_category_page_async(page['category'], page['key'], load_page)
+
+    ndjson = request.args.get('format') == 'ndjson'
+    response = Response(
+        ''.join(_stream_page(docs, next_cursor, ndjson)),
+        mimetype='application/x-ndjson' if ndjson else 'application/json'
+    )
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+
+# ------------------ CART --------------------
+@async_auth_bp.route('/api/cart/add', methods=['POST'])
+@login_required_async('customer', {'success': False, 'message': 'Please login first'})
+async def api_add_to_cart():
+    data = await request.get_json()
+    item_id = data.get('item_id')
+    if not item_id:
+        return jsonify({'success': False, 'message': 'No item_id provided'}), 400
+    if not ObjectId.is_valid(item_id):
+        return jsonify({'success': False, 'message': 'Invalid item_id'}), 400
+
+    product = await get_async_db().items.find_one({"_id": ObjectId(item_id)})
+    if not product:
+        return jsonify({'success': False, 'message': 'Product not found!'}), 404
+    if not orderable(product):
+        return jsonify({'success': False, 'message': f'"{product["name"]}" is sold out.'}), 409
+
+    lines = await get_async_cart_store().add(_cart_id(), _cart_line(product))
+    return jsonify({'success': True, 'product_name': product['name'], 'cart_count': len(lines)})
+
+
+@async_auth_bp.route('/api/update-cart-quantity', methods=['POST'])
+async def api_update_cart_quantity():
+    if 'cart_id' not in session:
+        return jsonify({'success': False, 'message': 'Cart is empty.'}), 400
+
+    data = await request.get_json()
+    item_id = data.get('item_id')
+    quantity = data.get('quantity')
+    if not ObjectId.is_valid(item_id) or not isinstance(quantity, int) or quantity < 1:
+        return jsonify({'success': False, 'message': 'Invalid data.'}), 400
+
+    lines = await get_async_cart_store().set_quantities(session['cart_id'], {item_id: quantity})
+    if item_id not in lines:
+        return jsonify({'success': False, 'message': 'Item not found in cart.'}), 404
+
+    pricing = await price_cart_async(lines, get_async_db(), session.get('coupon'))
+    line = next((line for line in pricing['lines'] if line['id'] == item_id), None)
+    return jsonify({'success': True, 'subtotal': line['subtotal'] if line else 0,
+                    'total': pricing['subtotal'], 'cart': pricing})
+
+
+@async_auth_bp.route('/api/remove_from_cart', methods=['POST'])
+async def api_remove_from_cart():
+    data = await request.get_json()
+    item_id = data.get('item_id')
+    if not item_id:
+        return jsonify({'success': False, 'message': 'No item_id provided'}), 400
+    if not ObjectId.is_valid(item_id):
+        return jsonify({'success': False, 'message': 'Invalid item_id'}), 400
+    if 'cart_id' not in session:
+        return jsonify({'success': False, 'message': 'Cart is empty or invalid'}), 400
+
+    lines = await get_async_cart_store().remove(session['cart_id'], item_id)
+    pricing = await price_cart_async(lines, get_async_db(), session.get('coupon'))
+    return jsonify({'success': True, 'total': pricing['subtotal'], 'cart_length': len(lines), 'cart': pricing})
+
+
+# ------------------ CHECKOUT --------------------
+@async_auth_bp.route('/place-order', methods=['POST'])
+async def place_order():
+    db = get_async_db()
+    if 'customer' not in session:
+        return jsonify({'success': False, 'message': 'Login required'}), 401
+
+    # The customer and the cart are independent reads; issue them together
+    customer, lines = await asyncio.gather(get_principal_async('customer', session['customer'], db), _cart_lines())
+    if customer is None:
+        session.pop('customer', None)
+        return jsonify({'success': False, 'message': 'Login required'}), 401
+
+    if not lines:
+        return jsonify({'success': False, 'message': 'Your cart is empty'}), 400
+
+    pricing = await price_cart_async(lines, db, session.get('coupon'), cached=False)
+    if pricing['unavailable']:
+        return jsonify({'success': False, 'message': 'Some items in your cart are no longer available.',
+                        'unavailable': pricing['unavailable']}), 409
+
+    order_id = ObjectId()
+    try:
+        await reserve_stock_async(order_id, pricing, db)
+    except OutOfStock as exc:
+        invalidate_prices(*exc.item_ids)
+        return jsonify({'success': False, 'message': 'Some items in your cart just sold out.',
+                        'sold_out': exc.item_ids}), 409
+
+    order_items = _order_items(pricing)
+    form = await request.form
+    order = {
+        '_id': order_id,
+        'user_id': customer['_id'],
+        'name': customer['name'],
+        'address': customer['address'],
+        'phone': customer['phone'],
+        'items': order_items,
+        **_order_totals(pricing),
+        'payment_method': form.get('method'),
+        'placed_at': datetime.now()
+    }
+    try:
+        await enqueue_order_async(order, db)
+    except Exception:
+        await release_reservation_async(order_id, db)
+        raise
+    await commit_reservation_async(order_id, db)
+
+    session.pop('coupon', None)
+    cart_id = session.pop('cart_id', None)
+    if cart_id:
+        await get_async_cart_store().clear(cart_id)
+
+    address = customer['address']
+    return jsonify({
+        'success': True,
+        'order_id': str(order_id),
+        'name': customer['name'],
+        'address': f"{address['flat_no']}, {address['street']}, {address['landmark']}, {address['city']} - {address['pincode']}",
+        'items': ", ".join(f"{i['name']} × {i['quantity']}" for i in order_items)
+    })
@@ -1,12 +1,34 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Blueprint, Response, g, render_template, request, redirect, url_for, session, flash, jsonify, json, stream_with_context
 from models.db import get_db
-from datetime import datetime, timedelta
-from bson.son import SON
-import base64
+from datetime import datetime
+import uuid
 from bson.objectid import ObjectId
+from models.analytics import export_sales_lines, parse_range, sales_analytics
+from models.archive import order_history
+from models.cart import get_cart_store
+from models.catalogue import (catalogue_cache, get_category_page, get_city_stores, get_nearby_stores,
+                              get_store, get_store_items, invalidate_store)
+from models.geo import geocode
+from models.indexes import normalize_category
+from models.menus import CATEGORIES, FORMATS, MenuFormatError, export_menu, import_menu, menu_format
+from models.pricing import COUPONS, invalidate_prices, price_cart
+from models.principals import invalidate_principal, remember_principal
+from models.search import catalogue_search
+from models.stores import DEFAULT_STORE_NAME, store_ref, update_store_profile
+from models.uploads import UploadRejected, accept_upload, queue_upload
+from models.orders import NEXT_STATUS, advance_status, enqueue_order
+from models.sales import daily_sales
+from models.stock import OutOfStock, commit_reservation, orderable, release_reservation, reserve_stock, set_stock
+from routes.decorators import login_required
 
 auth_bp = Blueprint('auth', __name__)
 
+# Fields /api/category can return, and the stored field each one is built from
+CATALOGUE_FIELDS = ('name', 'price', 'description', 'category', 'photo', 'store_owner')
+CATALOGUE_SOURCE_FIELDS = {'photo': 'image_id', 'store_owner': 'store_name'}
+CATALOGUE_PAGE_SIZE = 24
+CATALOGUE_MAX_PAGE_SIZE = 100
+
 # ------------------ HOME --------------------
 @auth_bp.route('/')
 def home():
@@ -41,6 +63,9 @@ def customer_register():
                 "pincode": request.form['pincode']
             }
         }
+        location = geocode(data['address'], db)
+        if location:
+            data['location'] = location
         db.customers.insert_one(data)
         flash('Registration successful! Please log in.', 'success')
         return redirect(url_for('auth.customer_login'))
@@ -56,6 +81,7 @@ def customer_login():
         user = db.customers.find_one({'phone': phone, 'pin': pin})
         if user:
             session['customer'] = str(user['_id']) # Store ObjectId as string in session
+            remember_principal('customer', user)
             flash('Logged in successfully!', 'success')
             return redirect(url_for('auth.customer_dashboard'))
         else:
@@ -63,66 +89,73 @@ def customer_login():
     return render_template('auth/customer_login.html')
 
 @auth_bp.route('/customer/dashboard')
+@login_required('customer')
 def customer_dashboard():
     """Displays the customer dashboard with nearby stores."""
-    if 'customer' not in session:
-        flash('Please log in to access this page.', 'warning')
-        return redirect(url_for('auth.customer_login'))
+    customer = g.customer
+
+    # Stores within delivery range of the customer's address, nearest first
+    # (cached per location; refreshed when a store registers)
+    if customer.get('location'):
+        stores = get_nearby_stores(customer['location'])
+    else:
+        stores = get_city_stores(customer.get('address', {}).get('city'))
 
-    db = get_db()
-    customer = db.customers.find_one({'_id': ObjectId(session['customer'])})
-    if not customer:
-        session.pop('customer', None)
-        flash('Your session is invalid. Please log in again.', 'danger')
-        return redirect(url_for('auth.customer_login'))
-    
-    # Fetch all stores from the database
-    stores = list(db.stores.find())
-    
     return render_template('customer_dashboard.html', user=customer, stores=stores)
 
 @auth_bp.route('/customer/profile')
+@login_required('customer', 'Please log in to access your profile.')
 def customer_profile():
     """Displays the customer's profile."""
-    if 'customer' not in session:
-        flash('Please log in to access your profile.', 'warning')
-        return redirect(url_for('auth.customer_login'))
-
-    db = get_db()
-    customer = db.customers.find_one({'_id': ObjectId(session['customer'])})
-    if not customer:
-        session.pop('customer', None)
-        flash('User profile not found. Please log in again.', 'danger')
-        return redirect(url_for('auth.customer_login'))
-    return render_template('customer_profile.html', user=customer)
+    return render_template('customer_profile.html', user=g.customer)
 
 @auth_bp.route('/customer/profile-data')
+@login_required('customer', api_error={'error': 'Unauthorized'})
 def api_customer_profile():
     """API endpoint to get customer profile data (JSON)."""
-    if 'customer' not in session:
-        return jsonify({'error': 'Unauthorized'}), 401
-
-    db = get_db()
-    user = db.customers.find_one({'_id': ObjectId(session['customer'])}, {'_id': 0})
-    if user:
-        return jsonify(user)
-    else:
-        return jsonify({'error': 'User not found'}), 404
+    user = {k: v for k, v in g.customer.items() if k != '_id'}
+    return jsonify(user)
 
 # ------------------ MY ORDERS(In profile section) --------------------
 @auth_bp.route('/customer/my-orders')
+@login_required('customer', 'Please log in to view your orders.')
 def my_orders():
-    if 'customer' not in session:
-        flash('Please log in to view your orders.', 'warning')
-        return redirect(url_for('auth.customer_login'))
-
-    db = get_db()
-    customer_id = session['customer']
-
-    # Fetch orders for this user
-    orders = list(db.orders.find({'user_id': ObjectId(customer_id)}).sort("placed_at", -1))
-
-    return render_template('auth/my_orders.html', orders=orders)
+    """Shows one page of the customer's orders, newest first; `before` pages back through older ones."""
+    try:
+        orders, next_cursor = order_history(g.customer['_id'], request.args.get('before'))
+    except ValueError:
+        return redirect(url_for('auth.my_orders'))
+
+    return render_template('auth/my_orders.html', orders=orders, next_cursor=next_cursor,
+                           paged=bool(request.args.get('before')))
+
+# ------------------ CART STORE --------------------
+# The session cookie only carries an opaque cart id; lines live in the cart store.
+def _cart_id():
+    """Returns this session's cart id, issuing one on first use."""
+    if 'cart_id' not in session:
+        session['cart_id'] = uuid.uuid4().hex
+    return session['cart_id']
+
+def _cart_lines():
+    """Returns {item_id: line} for this session's cart."""
+    if 'cart_id' not in session:
+        return {}
+    return get_cart_store().get(session['cart_id'])
+
+def _cart_line(product):
+    return {'id': str(product['_id']), 'name': product['name'], 'price': float(product['price'])}
+
+def _clear_cart():
+    session.pop('coupon', None)
+    cart_id = session.pop('cart_id', None)
+    if cart_id:
+        get_cart_store().clear(cart_id)
+
+@auth_bp.app_context_processor
+def inject_cart_count():
+    # Lazy so pages that don't show the cart badge don't query the cart store
+    return {'cart_count': lambda: len(_cart_lines())}
 
 # ------------------ ADD TO CART --------------------
 @auth_bp.route('/add-to-cart/<product_id>', methods=['POST'])
@@ -136,39 +169,25 @@ def add_to_cart(product_id):
         flash('Product not found!', 'danger')
         return redirect(url_for('auth.customer_dashboard'))
 
-    if 'cart' not in session:
-        session['cart'] = []
-
-    found_in_cart = False
-    for item in session['cart']:
-        if item['id'] == str(product['_id']):
-            item['quantity'] += 1
-            found_in_cart = True
-            break
-    
-    if not found_in_cart:
-        session['cart'].append({
-            'id': str(product['_id']),
-            'name': product['name'],
-            'price': float(product['price']),
-            'quantity': 1
-        })
+    if not orderable(product):
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return jsonify({'success': False, 'message': f'"{product["name"]}" is sold out.'}), 409
+        flash(f'"{product["name"]}" is sold out.', 'warning')
+        return redirect(request.referrer or url_for('auth.customer_dashboard'))
 
-    session.modified = True
+    lines = get_cart_store().add(_cart_id(), _cart_line(product))
 
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return jsonify({
             'success': True,
             'product_name': product['name'],
-            'cart_count': len(session['cart'])
+            'cart_count': len(lines)
         })
 
     flash(f'"{product["name"]}" added to cart!', 'success')
 
-    store_phone = product.get('store_phone')
-    store = db.stores.find_one({'phone': store_phone})
-    if store:
-        return redirect(url_for('auth.view_store_products', store_id=str(store['_id'])))
+    if product.get('store_id'):
+        return redirect(url_for('auth.view_store_products', store_id=str(product['store_id'])))
     else:
         return redirect(url_for('auth.customer_dashboard'))
 
@@ -176,136 +195,195 @@ def add_to_cart(product_id):
 # ------------------ CATEGORY PRODUCTS --------------------
 @auth_bp.route('/category/<category_name>')
 def category_products(category_name):
-    db = get_db()
-    items = list(db.items.find({'category': category_name}))
-    return render_template('auth/category_products.html', category=category_name, items=items)
+    # Items are fetched page by page from api_category_products as the user scrolls
+    return render_template('auth/category_products.html', category=category_name)
 
 
 # ------------------ CART --------------------
 @auth_bp.route('/cart')
+@login_required('customer', 'Please log in to view your cart.')
 def view_cart():
-    if 'customer' not in session:
-        flash('Please log in to view your cart.', 'warning')
-        return redirect(url_for('auth.customer_login'))
-    
-    db = get_db()
-    customer = db.customers.find_one({'_id': ObjectId(session['customer'])})
-    if not customer:
-        session.pop('customer', None)
-        flash('Session expired. Please log in again.', 'danger')
-        return redirect(url_for('auth.customer_login'))
+    customer = g.customer
 
-    cart = session.get('cart', [])
-    total = sum(item['price'] * item['quantity'] for item in cart)
-    
-    # Calculate and store initial grand total in session
-    if total > 0:
-        delivery_fee = 40
-        taxes = total * 0.05
-        grand_total = total + delivery_fee + taxes
-        session['grand_total'] = grand_total
-    
-    return render_template('auth/cart.html', cart=cart, total=total, customer=customer)
+    # Reprice every line at today's prices; items no longer sold drop out
+    pricing = price_cart(_cart_lines(), session.get('coupon'))
+    for item_id in pricing['unavailable']:
+        get_cart_store().remove(session['cart_id'], item_id)
+
+    return render_template('auth/cart.html', cart=pricing['lines'], pricing=pricing, coupons=COUPONS,
+                           customer=customer)
 
 @auth_bp.route('/api/category/<category_name>')
 def api_category_products(category_name):
-    db = get_db()
-
-    # Normalize category name (lowercase)
-    category_name = category_name.lower()
-
-    # Use case-insensitive match
-    query = {} if category_name == "all" else {
-        'category': {'$regex': f"^{category_name}$", '$options': 'i'}
-    }
-
-    items = list(db.items.find(query))
+    """Streams one keyset-paginated page of catalogue items.
 
-    # Get store phone numbers from items
-    store_phones = list(set(item.get('store_phone') for item in items if 'store_phone' in item))
+    Query params: `after` (the `next_cursor` of the previous page), `limit`,
+    `fields` (comma-separated subset of CATALOGUE_FIELDS) and `format=ndjson`.
+    """
+    db = get_db()
+    page, error = _catalogue_page_request(category_name, request.args)
+    if error:
+        return jsonify({'error': error}), 400
+
+    def load_page():
+        # Fetch one extra document to learn whether another page exists
+        items = list(db.items.find(page['query'], page['projection']).sort('_id', 1).limit(page['limit'] + 1))
+        return _serialize_page(items, page, url_for)
+
+    # Pages are served from the catalogue cache until a store edits its menu
+    docs, next_cursor = get_category_page(page['category'], page['key'], load_page)
+
+    ndjson = request.args.get('format') == 'ndjson'
+    response = Response(
+        stream_with_context(_stream_page(docs, next_cursor, ndjson)),
+        mimetype='application/x-ndjson' if ndjson else 'application/json'
+    )
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
 
-    # Map phone → store name
-    stores = db.stores.find({'phone': {'$in': store_phones}})
-    phone_to_name = {store['phone']: store.get('store_name', 'Unknown Store') for store in stores}
 
-    # Prepare response
-    for item in items:
-        item['_id'] = str(item['_id'])
+def _catalogue_page_request(category_name, args):
+    """Parses /api/category arguments into (page, None), or (None, error message).
 
-        # Normalize photo field
-        if 'photo' not in item:
-            item['photo'] = item.get('image', '')  # fallback if only 'image' is present
+    `page` holds the normalized category, Mongo query and projection, limit,
+    requested fields and the cache key for the page.
+    """
+    # Match on the stored lowercase copy so the (category_lc, _id) index is used
+    category_name = normalize_category(category_name)
+    query = {} if category_name == "all" else {'category_lc': category_name}
+
+    after = args.get('after')
+    if after:
+        if not ObjectId.is_valid(after):
+            return None, 'Invalid cursor'
+        query['_id'] = {'$gt': ObjectId(after)}
+
+    limit = args.get('limit', CATALOGUE_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, CATALOGUE_MAX_PAGE_SIZE))
+
+    fields = args.get('fields')
+    fields = [f for f in fields.split(',') if f] if fields else list(CATALOGUE_FIELDS)
+    unknown = set(fields) - set(CATALOGUE_FIELDS)
+    if unknown:
+        return None, f"Unknown fields: {', '.join(sorted(unknown))}"
+
+    return {
+        'category': category_name,
+        'query': query,
+        # Project only what was asked for; derived fields need their source field
+        'projection': {CATALOGUE_SOURCE_FIELDS.get(f, f): 1 for f in fields},
+        'limit': limit,
+        'fields': fields,
+        'key': (after, limit, tuple(fields)),
+    }, None
+
+
+def _serialize_page(items, page, url_for):
+    """Turns up to limit + 1 fetched items into (docs, next_cursor) for the requested fields."""
+    limit, fields = page['limit'], page['fields']
+    next_cursor = str(items[limit - 1]['_id']) if len(items) > limit else None
+
+    def serialize(item):
+        doc = {'_id': str(item['_id'])}
+        for field in fields:
+            if field == 'photo':
+                # Images are served from the media endpoint; ship only the URL
+                image_id = item.get('image_id')
+                doc['photo'] = url_for('media.image', image_id=image_id, size='card') if image_id else ''
+            elif field == 'store_owner':
+                # Items carry a copy of their store's name (see models.stores)
+                doc['store_owner'] = item.get('store_name', DEFAULT_STORE_NAME)
+            else:
+                doc[field] = item.get(field)
+        return doc
+
+    return [serialize(item) for item in items[:limit]], next_cursor
+
+
+def _stream_page(docs, next_cursor, ndjson=False):
+    """Yields a page of documents as NDJSON lines or as {"items": [...], "next_cursor": ...}."""
+    if ndjson:
+        for doc in docs:
+            yield json.dumps(doc) + '\n'
+        return
+
+    yield '{"items": ['
+    for i, doc in enumerate(docs):
+        yield (',' if i else '') + json.dumps(doc)
+    yield '], "next_cursor": ' + json.dumps(next_cursor) + '}'
+
+
+@auth_bp.route('/api/search')
+def api_search():
+    """Searches item names, descriptions, categories and store names.
+
+    Query params: `q`, `limit` and `autocomplete=1`, which returns only
+    matching item names for a search-as-you-type dropdown.
+    """
+    query = request.args.get('q', '').strip()
+    limit = max(1, min(request.args.get('limit', CATALOGUE_PAGE_SIZE, type=int), CATALOGUE_MAX_PAGE_SIZE))
+    if not query:
+        return jsonify({'query': query, 'items': []})
 
-        # Add store_owner field
-        store_phone = item.get('store_phone')
-        item['store_owner'] = phone_to_name.get(store_phone, 'Unknown Store')
+    if request.args.get('autocomplete') in ('1', 'true'):
+        return jsonify({'query': query, 'suggestions': catalogue_search.suggest(query, min(limit, 10))})
 
-    return jsonify(items)
+    items = []
+    for hit in catalogue_search.search(query, limit):
+        image_id = hit.pop('image_id', None)
+        hit['photo'] = url_for('media.image', image_id=image_id, size='card') if image_id else ''
+        hit['store_owner'] = hit['store_owner'] or DEFAULT_STORE_NAME
+        items.append(hit)
+    return jsonify({'query': query, 'items': items})
 
 
 
 @auth_bp.route('/api/update-cart-quantity', methods=['POST'])
 def api_update_cart_quantity():
-    if 'cart' not in session:
+    if 'cart_id' not in session:
         return jsonify({'success': False, 'message': 'Cart is empty.'}), 400
 
     data = request.get_json()
     item_id = data.get('item_id')
     quantity = data.get('quantity')
 
-    if not item_id or not isinstance(quantity, int) or quantity < 1:
+    if not ObjectId.is_valid(item_id) or not isinstance(quantity, int) or quantity < 1:
         return jsonify({'success': False, 'message': 'Invalid data.'}), 400
 
-    for item in session['cart']:
-        if item['id'] == item_id:
-            item['quantity'] = quantity
-            session.modified = True
-            subtotal = item['price'] * quantity
-            total = sum(i['price'] * i['quantity'] for i in session['cart'])
-            return jsonify({'success': True, 'subtotal': subtotal, 'total': total})
+    lines = get_cart_store().set_quantities(session['cart_id'], {item_id: quantity})
+    if item_id not in lines:
+        return jsonify({'success': False, 'message': 'Item not found in cart.'}), 404
 
-    return jsonify({'success': False, 'message': 'Item not found in cart.'}), 404
+    pricing = price_cart(lines, session.get('coupon'))
+    line = next((line for line in pricing['lines'] if line['id'] == item_id), None)
+    return jsonify({'success': True, 'subtotal': line['subtotal'] if line else 0,
+                    'total': pricing['subtotal'], 'cart': pricing})
 
 @auth_bp.route('/api/cart/add', methods=['POST'])
+@login_required('customer', api_error={'success': False, 'message': 'Please login first'})
 def api_add_to_cart():
-    if 'customer' not in session:
-        return jsonify({'success': False, 'message': 'Please login first'}), 401
-
     data = request.get_json()
     item_id = data.get('item_id')
     if not item_id:
         return jsonify({'success': False, 'message': 'No item_id provided'}), 400
+    if not ObjectId.is_valid(item_id):
+        return jsonify({'success': False, 'message': 'Invalid item_id'}), 400
 
     db = get_db()
     product = db.items.find_one({"_id": ObjectId(item_id)})
 
     if not product:
         return jsonify({'success': False, 'message': 'Product not found!'}), 404
+    if not orderable(product):
+        return jsonify({'success': False, 'message': f'"{product["name"]}" is sold out.'}), 409
 
-    if 'cart' not in session:
-        session['cart'] = []
-
-    found_in_cart = False
-    for item in session['cart']:
-        if item['id'] == item_id:
-            item['quantity'] += 1
-            found_in_cart = True
-            break
-
-    if not found_in_cart:
-        session['cart'].append({
-            'id': item_id,
-            'name': product['name'],
-            'price': float(product['price']),
-            'quantity': 1
-        })
-
-    session.modified = True
+    lines = get_cart_store().add(_cart_id(), _cart_line(product))
 
     return jsonify({
         'success': True,
         'product_name': product['name'],
-        'cart_count': len(session['cart'])
+        'cart_count': len(lines)
     })
 
 
@@ -319,19 +397,11 @@ def add_addon_to_cart(addon_id):
     if not addon:
         flash('Addon not found.', 'danger')
         return redirect(url_for('auth.view_cart'))
+    if not orderable(addon):
+        flash(f'"{addon["name"]}" is sold out.', 'warning')
+        return redirect(url_for('auth.view_cart'))
     
-    if 'cart' not in session:
-        session['cart'] = []
-    
-    session['cart'].append({
-        'id': str(addon['_id']),
-        'name': addon['name'],
-        'price': float(addon['price']),
-        'quantity': 1,
-        'image': addon.get('image'),
-        'description': addon.get('description', '')
-    })
-    session.modified = True
+    get_cart_store().add(_cart_id(), _cart_line(addon))
     
     flash(f'{addon["name"]} added to cart!', 'success')
     return redirect(url_for('auth.view_cart'))
@@ -343,41 +413,54 @@ def api_remove_from_cart():
 
     if not item_id:
         return jsonify({'success': False, 'message': 'No item_id provided'}), 400
+    if not ObjectId.is_valid(item_id):
+        return jsonify({'success': False, 'message': 'Invalid item_id'}), 400
     
-    if 'cart' not in session or not isinstance(session['cart'], list):
+    if 'cart_id' not in session:
         return jsonify({'success': False, 'message': 'Cart is empty or invalid'}), 400
 
-    new_cart = [item for item in session['cart'] if item['id'] != item_id]
-    session['cart'] = new_cart
-    session.modified = True
+    lines = get_cart_store().remove(session['cart_id'], item_id)
+    pricing = price_cart(lines, session.get('coupon'))
+
+    return jsonify({'success': True, 'total': pricing['subtotal'], 'cart_length': len(lines), 'cart': pricing})
+
+
+@auth_bp.route('/api/cart/totals')
+def api_cart_totals():
+    """Returns the cart repriced server-side: lines, subtotal, delivery fee, tax, discount and total."""
+    return jsonify(price_cart(_cart_lines(), session.get('coupon')))
 
-    total = sum(item['price'] * item['quantity'] for item in new_cart)
-    cart_length = len(new_cart)
 
-    return jsonify({'success': True, 'total': total, 'cart_length': cart_length})
+@auth_bp.route('/api/cart/coupon', methods=['POST'])
+def api_apply_coupon():
+    """Applies a coupon code to the session's cart (an empty code removes it) and returns the new totals."""
+    code = ((request.get_json(silent=True) or {}).get('code') or '').strip().upper()
+    if code and code not in COUPONS:
+        return jsonify({'success': False, 'message': 'Invalid coupon'}), 400
+    if code:
+        session['coupon'] = code
+    else:
+        session.pop('coupon', None)
+    return jsonify({'success': True, 'cart': price_cart(_cart_lines(), code or None)})
 
 
 @auth_bp.route('/clear-cart')
 def clear_cart():
     """Clears the entire cart."""
-    session.pop('cart', None)
+    _clear_cart()
     flash('Cart cleared successfully.', 'success')
     return redirect(url_for('auth.view_cart'))
 
 @auth_bp.route('/store/<store_id>')
+@login_required('customer')
 def view_store_products(store_id):
     """Shows products for a specific store."""
-    if 'customer' not in session:
-        flash('Please log in to access this page.', 'warning')
-        return redirect(url_for('auth.customer_login'))
-    
-    db = get_db()
-    store = db.stores.find_one({'_id': ObjectId(store_id)})
+    store = get_store(store_id)
     if not store:
         flash('Store not found.', 'danger')
         return redirect(url_for('auth.customer_dashboard'))
     
-    items = list(db.items.find({'store_phone': store['phone']}))
+    items = get_store_items(store['phone'])
     
     return render_template('store_products.html', store=store, items=items)
 
@@ -387,14 +470,16 @@ def update_cart():
     Update the entire cart quantities at once, based on form inputs like:
     quantities[item_id] = new_quantity
     """
-    if 'cart' not in session:
+    if 'cart_id' not in session:
         flash('Your cart is empty.', 'danger')
         return redirect(url_for('auth.view_cart'))
     
     quantities_dict = {}
     for key, value in request.form.items():
         if key.startswith('quantities[') and key.endswith(']'):
-            item_id = key[10:-1]
+            item_id = key[len('quantities['):-1]
+            if not ObjectId.is_valid(item_id):
+                continue
             try:
                 qty = int(value)
                 if qty < 1:
@@ -403,85 +488,103 @@ def update_cart():
                 qty = 1
             quantities_dict[item_id] = qty
 
-    cart = session['cart']
-    for item in cart:
-        item_id = item['id']
-        if item_id in quantities_dict:
-            item['quantity'] = quantities_dict[item_id]
-
-    session['cart'] = cart
-    session.modified = True
+    get_cart_store().set_quantities(session['cart_id'], quantities_dict)
     flash('Cart updated successfully!', 'success')
     return redirect(url_for('auth.view_cart'))
 
-# ------------------ GRAND TOTAL --------------------
-@auth_bp.route('/api/set_grand_total', methods=['POST'])
-def api_set_grand_total():
-    data = request.get_json()
-    session['grand_total'] = data.get('grand_total', 0)
-    return jsonify(success=True)
-
 # ------------------ PAYMENT GATEWAY --------------------
 @auth_bp.route('/payment')
 def payment_gateway():
-    grand_total = session.get('grand_total', 0)
-    return render_template('auth/payment.html', total_amount=grand_total)
+    pricing = price_cart(_cart_lines(), session.get('coupon'))
+    return render_template('auth/payment.html', total_amount=pricing['total'])
 
 @auth_bp.route('/place-order', methods=['POST'])
+@login_required('customer', api_error={'success': False, 'message': 'Login required'})
 def place_order():
-    if 'customer' not in session:
-        return jsonify({'success': False, 'message': 'Login required'}), 401
-
     db = get_db()
-    customer = db.customers.find_one({'_id': ObjectId(session['customer'])})
-    if not customer:
-        return jsonify({'success': False, 'message': 'Customer not found'}), 404
+    customer = g.customer
 
-    cart = session.get('cart', [])
-    grand_total = session.get('grand_total', 0)
-
-    if not cart:
+    lines = _cart_lines()
+    if not lines:
         return jsonify({'success': False, 'message': 'Your cart is empty'}), 400
 
-    order_items = []
-    for item in cart:
-        order_items.append({
-            'product_id': ObjectId(item['id']),
-            'name': item['name'],
-            'quantity': item['quantity']
-        })
-
+    # Charge what the items cost now, read straight from the catalogue
+    pricing = price_cart(lines, session.get('coupon'), cached=False, db=db)
+    if pricing['unavailable']:
+        return jsonify({'success': False, 'message': 'Some items in your cart are no longer available.',
+                        'unavailable': pricing['unavailable']}), 409
+
+    # Take stock for every counted line up front; all or nothing, no lock
+    order_id = ObjectId()
+    try:
+        reserve_stock(order_id, pricing, db)
+    except OutOfStock as exc:
+        invalidate_prices(*exc.item_ids)
+        return jsonify({'success': False, 'message': 'Some items in your cart just sold out.',
+                        'sold_out': exc.item_ids}), 409
+
+    order_items = _order_items(pricing)
     order = {
+        '_id': order_id,
         'user_id': customer['_id'],
         'name': customer['name'],
         'address': customer['address'],
         'phone': customer['phone'],
         'items': order_items,
-        'total_amount': grand_total,
+        **_order_totals(pricing),
         'payment_method': request.form.get('method'),
         'placed_at': datetime.now()
     }
 
-    result = db.orders.insert_one(order)
+    # One insert; the order worker routes it to its stores and updates sales
+    try:
+        enqueue_order(order, db)
+    except Exception:
+        release_reservation(order_id, db)
+        raise
+    commit_reservation(order_id, db)
 
 #-------------- Clear cart after order-------------------------
-    session.pop('cart', None)
+    _clear_cart()
 
     item_summary = ", ".join([f"{i['name']} × {i['quantity']}" for i in order_items])
     return jsonify({
         'success': True,
-        'order_id': str(result.inserted_id),
+        'order_id': str(order_id),
         'name': customer['name'],
         'address': f"{customer['address']['flat_no']}, {customer['address']['street']}, {customer['address']['landmark']}, {customer['address']['city']} - {customer['address']['pincode']}",
         'items': item_summary
     })
 
 
+def _order_items(pricing):
+    """Order lines from a priced cart, carrying price and store so dispatch needs no item lookup."""
+    return [
+        {'product_id': ObjectId(line['id']), 'name': line['name'], 'quantity': line['quantity'],
+         'price': line['price'], 'store_phone': line['store_phone']}
+        for line in pricing['lines']
+    ]
+
+
+def _order_totals(pricing):
+    """The charged amount and its breakdown, as stored on the order."""
+    return {
+        'total_amount': pricing['total'],
+        'subtotal': pricing['subtotal'],
+        'delivery_fee': pricing['delivery_fee'],
+        'tax': pricing['tax'],
+        'discount': pricing['discount'],
+        'coupon': pricing['coupon'],
+    }
+
+
 @auth_bp.route('/customer/logout')
 def customer_logout():
     """Logs out the customer and clears their session."""
-    session.pop('customer', None)
-    session.pop('cart', None)
+    customer_id = session.pop('customer', None)
+    if customer_id:
+        invalidate_principal('customer', customer_id)
+    _clear_cart()
     flash('Logged out successfully.', 'info')
     return redirect(url_for('auth.customer_login'))
 
@@ -516,7 +619,11 @@ def store_register():
                 "pincode": request.form['pincode']
             }
         }
+        location = geocode(data['address'], db)
+        if location:
+            data['location'] = location
         db.stores.insert_one(data)
+        catalogue_cache.invalidate('stores')
         flash('Store registration successful! Please log in.', 'success')
         return redirect(url_for('auth.store_login'))
     return render_template('auth/store_register.html')
@@ -533,6 +640,7 @@ def store_login():
         store = db.stores.find_one({'phone': phone, 'password': password})
         if store:
             session['store'] = str(store['_id'])
+            remember_principal('store', store)
             flash('Logged in successfully!', 'success')
             return redirect(url_for('auth.store_dashboard'))
         else:
@@ -540,132 +648,203 @@ def store_login():
     return render_template('auth/store_login.html')
 
 @auth_bp.route('/store/dashboard')
+@login_required('store')
 def store_dashboard():
     """Displays the store dashboard with their items and sales report."""
-    if 'store' not in session:
-        flash('Please log in to access this page.', 'warning')
-        return redirect(url_for('auth.store_login'))
-
     db = get_db()
-    store = db.stores.find_one({'_id': ObjectId(session['store'])})
-    if not store:
-        session.pop('store', None)
-        flash('Your session is invalid. Please log in again.', 'danger')
-        return redirect(url_for('auth.store_login'))
+    store = g.store
 
-    items = list(db.items.find({'store_phone': store['phone']}))
-
-    seven_days_ago = datetime.now() - timedelta(days=7)
-    pipeline = [
-        {"$match": {
-            "store_phone": store['phone'],
-            "order_date": {"$gte": seven_days_ago}
-        }},
-        {"$group": {
-            "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$order_date"}},
-            "total_sales": {"$sum": "$total_amount"}
-        }},
-        {"$sort": SON([("_id", -1)])}
-    ]
-    sales_data = list(db.orders.aggregate(pipeline))
-    sales_report = [{"date": s["_id"], "total_sales": s["total_sales"]} for s in sales_data]
+    items = get_store_items(store['phone'])
 
-    return render_template('store_dashboard.html', store=store, items=items, sales_report=sales_report)
+    # Orders routed to this store that are still in progress
+    incoming_orders = list(db.store_orders.find(
+        {'store_phone': store['phone'], 'status': {'$ne': 'delivered'}}
+    ).sort('placed_at', -1).limit(20))
 
-@auth_bp.route('/store/profile')
-def store_profile():
-    """Displays the store's profile."""
-    if 'store' not in session:
-        flash('Please log in to access your profile.', 'warning')
-        return redirect(url_for('auth.store_login'))
+    # Last 7 days of pre-aggregated sales (one rollup document per day)
+    sales_report = [{"date": s["date"], "total_sales": s["total_sales"]} for s in daily_sales(store['phone'], days=7, db=db)]
 
-    db = get_db()
-    store = db.stores.find_one({"_id": ObjectId(session['store'])})
+    return render_template('store_dashboard.html', store=store, items=items, sales_report=sales_report,
+                           incoming_orders=incoming_orders, next_status=NEXT_STATUS)
 
-    if store:
-        return render_template("store_profile.html", store=store)
+@auth_bp.route('/store/analytics')
+@login_required('store', api_error={'error': 'Unauthorized'})
+def store_analytics():
+    """Sales, average order value, repeat-customer rate, a time series and top items for a date range.
+
+    Query arguments: start, end (YYYY-MM-DD or ISO date-times), granularity
+    (hour, day or week) and top (number of items).
+    """
+    try:
+        start, end, granularity = parse_range(request.args.get('start'), request.args.get('end'),
+                                              request.args.get('granularity', 'day'))
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+    top = max(1, min(request.args.get('top', 10, type=int), 100))
+    return jsonify(sales_analytics(g.store['phone'], start, end, granularity, top))
+
+
+@auth_bp.route('/store/analytics/export')
+@login_required('store', 'Please log in to export sales.')
+def export_store_sales():
+    """Streams every item line sold in the range as CSV, oldest first."""
+    try:
+        start, end, _ = parse_range(request.args.get('start'), request.args.get('end'))
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+    response = Response(stream_with_context(export_sales_lines(g.store['phone'], start, end)), mimetype='text/csv')
+    response.headers['Content-Disposition'] = (
+        f'attachment; filename="sales-{start:%Y%m%d}-{end:%Y%m%d}.csv"')
+    return response
+
+
+@auth_bp.route('/store/orders/<order_id>/status', methods=['POST'])
+@login_required('store', 'Please log in to manage orders.')
+def update_order_status(order_id):
+    """Advances the store's share of an order to the next status."""
+    status = request.form.get('status') or (request.get_json(silent=True) or {}).get('status')
+    updated = None
+    if ObjectId.is_valid(order_id):
+        updated = advance_status(ObjectId(order_id), g.store['phone'], status)
+
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        if not updated:
+            return jsonify({'success': False, 'message': 'Order not found or status change not allowed.'}), 409
+        return jsonify({'success': True, 'status': updated['status']})
+
+    if updated:
+        flash(f"Order marked as {updated['status'].replace('_', ' ')}.", 'success')
     else:
-        session.pop('store', None)
-        flash("Store not found or session invalid. Please log in again.", "danger")
-        return redirect(url_for('auth.store_login'))
+        flash('Order not found or status change not allowed.', 'danger')
+    return redirect(url_for('auth.store_dashboard'))
+
+@auth_bp.route('/store/profile', methods=['GET', 'POST'])
+@login_required('store', 'Please log in to access your profile.')
+def store_profile():
+    """Displays the store's profile and saves edits to its store and owner names."""
+    if request.method == 'POST':
+        # Renames are copied onto every item the store lists
+        update_store_profile(g.store, {field: request.form.get(field, '').strip()
+                                       for field in ('store_name', 'owner_name')})
+        flash('Profile updated successfully!', 'success')
+        return redirect(url_for('auth.store_profile'))
+    return render_template("store_profile.html", store=g.store)
 
 @auth_bp.route('/store/add-item', methods=['POST'])
+@login_required('store', 'Please log in to add items.')
 def add_item():
     """Handles adding a new item by a store."""
-    if 'store' not in session:
-        flash('Please log in to add items.', 'warning')
-        return redirect(url_for('auth.store_login'))
-
     db = get_db()
-    store = db.stores.find_one({'_id': ObjectId(session['store'])})
-    if not store:
-        session.pop('store', None)
-        flash('Invalid session. Please log in again.', 'danger')
-        return redirect(url_for('auth.store_login'))
-
-    image_file = request.files.get('image')
-    image_data = None
-    if image_file and image_file.filename != '':
-        if not image_file.content_type.startswith('image/'):
-            flash('Uploaded file is not an image.', 'danger')
-            return redirect(url_for('auth.store_dashboard'))
-        image_data = base64.b64encode(image_file.read()).decode('utf-8')
+    store = g.store
 
     # Get the selected category from the form
     category = request.form.get('category')
-    if category not in ['Pizza', 'Beverage','Breads']:
+    if category not in CATEGORIES:
         flash('Please select a valid category.', 'danger')
         return redirect(url_for('auth.store_dashboard'))
 
+    stock = request.form.get('stock', '').strip()
+    if stock and not stock.isdigit():
+        flash('Stock must be a whole number.', 'danger')
+        return redirect(url_for('auth.store_dashboard'))
+
+    # The image is spooled here and attached by the image pipeline once processed
+    image_file = request.files.get('image')
+    upload = None
+    if image_file and image_file.filename != '':
+        try:
+            upload = accept_upload(image_file)
+        except UploadRejected as exc:
+            flash(str(exc), 'danger')
+            return redirect(url_for('auth.store_dashboard'))
+
     item = {
-        "store_owner": store['owner_name'],
+        "_id": ObjectId(),
+        **store_ref(store),
         "name": request.form['name'],
         "price": float(request.form['price']),
         "description": request.form['description'],
         "category": category,  # <-- Add category here
+        "category_lc": normalize_category(category),
         "store_phone": store['phone'],
-        "image": image_data
+        "image_id": None,
+        "updated_at": datetime.now()
     }
+    if upload:
+        item['image_pending'] = upload.token
+    if stock:
+        item['stock'] = int(stock)
 
     db.items.insert_one(item)
-    flash('Product added successfully!', 'success')
+    if upload:
+        queue_upload(upload, item['_id'])
+    invalidate_store(store['phone'], store['_id'], [item['category_lc']])
+    catalogue_search.item_saved(item['_id'], db)
+    flash('Product added successfully! Its image will appear once processed.' if upload
+          else 'Product added successfully!', 'success')
     return redirect(url_for('auth.store_dashboard'))
 
 
+@auth_bp.route('/store/menu/import', methods=['POST'])
+@login_required('store', api_error={'error': 'Unauthorized'})
+def import_store_menu():
+    """Bulk-upserts the store's items from a CSV/NDJSON `menu` file and an optional `images` zip.
+
+    Returns counts of rows inserted, updated and failed, with each failed
+    row's errors. Images are attached as the image pipeline processes them.
+    """
+    menu = request.files.get('menu')
+    if not menu or menu.filename == '':
+        return jsonify({'error': 'Upload the menu as a CSV or NDJSON file named "menu"'}), 400
+    images = request.files.get('images')
+    fmt = request.form.get('format') or menu_format(menu.filename)
+    try:
+        summary = import_menu(menu.stream, fmt, store=g.store, defer_images=True,
+                              images=images.stream if images and images.filename else None)
+    except MenuFormatError as exc:
+        return jsonify({'error': str(exc)}), 400
+    return jsonify(summary)
+
+
+@auth_bp.route('/store/menu/export')
+@login_required('store', 'Please log in to export your menu.')
+def export_store_menu():
+    """Streams the store's items as CSV (default) or NDJSON, in the format the import accepts."""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(FORMATS)}"}), 400
+    response = Response(
+        stream_with_context(export_menu(g.store['phone'], fmt)),
+        mimetype='text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename="menu.{fmt}"'
+    return response
+
+
 @auth_bp.route('/store/delete-item/<item_id>')
+@login_required('store', 'Please log in to delete items.')
 def delete_item(item_id):
     """Deletes an item belonging to the logged-in store."""
-    if 'store' not in session:
-        flash('Please log in to delete items.', 'warning')
-        return redirect(url_for('auth.store_login'))
-
     db = get_db()
-    store = db.stores.find_one({'_id': ObjectId(session['store'])})
-    if not store:
-        session.pop('store', None)
-        flash('Invalid session. Please log in again.', 'danger')
-        return redirect(url_for('auth.store_login'))
-
-    result = db.items.delete_one({'_id': ObjectId(item_id), 'store_phone': store['phone']})
-    if result.deleted_count == 1:
+    store = g.store
+
+    deleted = db.items.find_one_and_delete(
+        {'_id': ObjectId(item_id), 'store_phone': store['phone']}, projection={'category_lc': 1})
+    if deleted:
+        invalidate_store(store['phone'], store['_id'], [deleted.get('category_lc')])
+        invalidate_prices(deleted['_id'])
+        catalogue_search.item_deleted(deleted['_id'], db)
         flash('Item deleted successfully!', 'success')
     else:
         flash('Item not found or you are not authorized to delete it.', 'danger')
     return redirect(url_for('auth.store_dashboard'))
 
 @auth_bp.route('/store/edit-item/<item_id>', methods=['GET'])
+@login_required('store', 'Please log in to edit items.')
 def edit_item_form(item_id):
     """Displays the form to edit an item."""
-    if 'store' not in session:
-        flash('Please log in to edit items.', 'warning')
-        return redirect(url_for('auth.store_login'))
-
     db = get_db()
-    store = db.stores.find_one({'_id': ObjectId(session['store'])})
-    if not store:
-        session.pop('store', None)
-        flash('Invalid session. Please log in again.', 'danger')
-        return redirect(url_for('auth.store_login'))
+    store = g.store
 
     item = db.items.find_one({'_id': ObjectId(item_id), 'store_phone': store['phone']})
     if not item:
@@ -675,18 +854,11 @@ def edit_item_form(item_id):
     return render_template('edit_item.html', item=item)
 
 @auth_bp.route('/store/edit-item/<item_id>', methods=['POST'])
+@login_required('store', 'Please log in to edit items.')
 def edit_item_submit(item_id):
     """Handles the submission of the item edit form."""
-    if 'store' not in session:
-        flash('Please log in to edit items.', 'warning')
-        return redirect(url_for('auth.store_login'))
-
     db = get_db()
-    store = db.stores.find_one({'_id': ObjectId(session['store'])})
-    if not store:
-        session.pop('store', None)
-        flash('Invalid session. Please log in again.', 'danger')
-        return redirect(url_for('auth.store_login'))
+    store = g.store
 
     item = db.items.find_one({'_id': ObjectId(item_id), 'store_phone': store['phone']})
     if not item:
@@ -696,30 +868,105 @@ def edit_item_submit(item_id):
     update_data = {
         'name': request.form['name'],
         'price': float(request.form['price']),
-        'description': request.form['description']
+        'description': request.form['description'],
+        'updated_at': datetime.now()
     }
 
+    # Stock: a restock is added atomically; the count is only overwritten if
+    # the store changed it, so checkouts since the form loaded aren't lost
+    try:
+        restock = int(request.form.get('restock') or 0)
+        stock = request.form.get('stock', '').strip()
+        stock = int(stock) if stock else None
+    except ValueError:
+        flash('Stock must be a whole number.', 'danger')
+        return redirect(url_for('auth.edit_item_form', item_id=item_id))
+    stock_changed = request.form.get('stock', '').strip() != request.form.get('stock_was', '').strip()
+    stock_fields = {'available': request.form.get('available') == 'on'}
+    if restock:
+        stock_fields['add'] = restock
+    elif stock_changed:
+        stock_fields.update(stock=stock, untrack=stock is None)
+
+    # A new upload or a cleared image supersedes any upload still processing
     image_file = request.files.get('image')
+    upload = None
+    update = {'$set': update_data}
     if image_file and image_file.filename != '':
-        if not image_file.content_type.startswith('image/'):
-            flash('Uploaded file is not an image.', 'danger')
+        try:
+            upload = accept_upload(image_file)
+        except UploadRejected as exc:
+            flash(str(exc), 'danger')
             return redirect(url_for('auth.store_dashboard'))
-        image_data = base64.b64encode(image_file.read()).decode('utf-8')
-        update_data['image'] = image_data
+        update_data['image_pending'] = upload.token
     elif request.form.get('clear_image') == 'on':
-        update_data['image'] = None
+        update_data['image_id'] = None
+        update['$unset'] = {'image_pending': ''}
 
     db.items.update_one(
         {'_id': ObjectId(item_id), 'store_phone': store['phone']},
-        {'$set': update_data}
+        update
     )
-    flash('Item updated successfully!', 'success')
+    try:
+        set_stock(item_id, store['phone'], db=db, **stock_fields)
+    except ValueError as exc:
+        flash(f'Item updated, but its stock was not: {exc}.', 'warning')
+    else:
+        flash('Item updated successfully!', 'success')
+    if upload:
+        queue_upload(upload, item['_id'])
+    invalidate_store(store['phone'], store['_id'], [item.get('category_lc')])
+    invalidate_prices(item['_id'])
+    catalogue_search.item_saved(item['_id'], db)
     return redirect(url_for('auth.store_dashboard'))
 
 
+@auth_bp.route('/store/item/<item_id>/stock', methods=['POST'])
+@login_required('store', api_error={'error': 'Unauthorized'})
+def update_item_stock(item_id):
+    """Switches an item on/off and sets its stock from a JSON body.
+
+    `available` (bool), and one of `stock` (units left, or null to stop
+    counting) and `add` (units to restock, applied atomically).
+    """
+    data = request.get_json(silent=True) or {}
+    fields = {}
+    if 'available' in data:
+        fields['available'] = bool(data['available'])
+    try:
+        if 'add' in data:
+            fields['add'] = int(data['add'])
+        elif 'stock' in data:
+            fields['stock'] = None if data['stock'] is None else int(data['stock'])
+            fields['untrack'] = data['stock'] is None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'stock and add must be whole numbers'}), 400
+    if (fields.get('stock') or 0) < 0:
+        return jsonify({'error': 'stock must not be negative'}), 400
+    if not ObjectId.is_valid(item_id):
+        return jsonify({'error': 'Item not found'}), 404
+
+    try:
+        item = set_stock(item_id, g.store['phone'], **fields)
+    except ValueError as exc:
+        if 'available' in fields:
+            # The switch was saved even though the write-off wasn't
+            item = get_db().items.find_one({'_id': ObjectId(item_id)}, {'category_lc': 1})
+            invalidate_store(g.store['phone'], g.store['_id'], [item.get('category_lc')])
+            invalidate_prices(item['_id'])
+        return jsonify({'error': str(exc)}), 400
+    if item is None:
+        return jsonify({'error': 'Item not found'}), 404
+    invalidate_store(g.store['phone'], g.store['_id'], [item.get('category_lc')])
+    invalidate_prices(item['_id'])
+    return jsonify({'success': True, 'available': item.get('available', True), 'stock': item.get('stock')})
+
+
 @auth_bp.route('/store/logout')
 def store_logout():
     """Logs out the store and clears their session."""
-    session.pop('store', None)
+    store_id = session.pop('store', None)
+    if store_id:
+        invalidate_principal('store', store_id)
     flash('Logged out successfully.', 'info')
     return redirect(url_for('auth.store_login'))
\ No newline at end of file
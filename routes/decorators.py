@@ -0,0 +1,33 @@
+from functools import wraps
+
+from flask import flash, g, jsonify, redirect, session, url_for
+
+from models.principals import get_principal
+
+
+def login_required(role, message='Please log in to access this page.', api_error=None):
+    """Requires a logged-in customer or store and exposes its document as g.<role>.
+
+    The document is loaded once per request through the principal cache. JSON
+    endpoints pass `api_error`, the body returned with a 401 instead of a
+    flash message and redirect to the login page.
+    """
+    login_endpoint = f'auth.{role}_login'
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            principal = get_principal(role, session[role]) if role in session else None
+            if principal is None:
+                had_session = session.pop(role, None) is not None
+                if api_error is not None:
+                    return jsonify(api_error), 401
+                if had_session:
+                    flash('Your session is invalid. Please log in again.', 'danger')
+                else:
+                    flash(message, 'warning')
+                return redirect(url_for(login_endpoint))
+            setattr(g, role, principal)
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
@@ -0,0 +1,51 @@
+from flask import Blueprint, Response, jsonify, json, session
+from models.events import EVENTS_MAX_STREAMS, broker, customer_channel, ensure_watcher, store_channel
+from models.principals import get_principal
+
+events_bp = Blueprint('events', __name__)
+
+# Seconds between keep-alive comments, so proxies don't reap idle streams
+HEARTBEAT_SECONDS = 15
+
+# ------------------ LIVE ORDER EVENTS --------------------
+@events_bp.route('/events/stream')
+def order_events():
+    """Server-Sent Events stream of order updates for the logged-in store or customer.
+
+    Stores receive `new_order` and `order_status` for their share of orders;
+    customers receive `order_status` for their own orders. Each open stream is
+    one idle subscription, so serve this route from gevent workers to hold
+    many of them. Past EVENTS_MAX_STREAMS open streams it answers 204, which
+    tells the browser not to reconnect; the page then works without live
+    updates instead of tying up the worker's last threads.
+    """
+    store = get_principal('store', session['store']) if 'store' in session else None
+    customer = get_principal('customer', session['customer']) if 'customer' in session else None
+    if store:
+        channel = store_channel(store['phone'])
+    elif customer:
+        channel = customer_channel(customer['_id'])
+    else:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    ensure_watcher()
+    subscription = broker.subscribe(channel, EVENTS_MAX_STREAMS)
+    if subscription is None:
+        return Response(status=204)
+
+    def stream():
+        yield 'retry: 5000\n\n'
+        while True:
+            message = subscription.get(timeout=HEARTBEAT_SECONDS)
+            if message is None:
+                yield ': keep-alive\n\n'
+                continue
+            event, data = message
+            yield f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+    response = Response(stream(), mimetype='text/event-stream')
+    # Runs when the server closes the response, even if it never started streaming
+    response.call_on_close(subscription.close)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # disable proxy buffering (nginx)
+    return response
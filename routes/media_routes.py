@@ -0,0 +1,71 @@
+from flask import Blueprint, Response, abort, current_app, request, url_for
+from werkzeug.wsgi import wrap_file
+from models.assets import assets
+from models.media import THUMBNAIL_SIZES, open_image
+
+media_bp = Blueprint('media', __name__)
+
+# Image ids and asset names are content hashes, so a URL never changes meaning
+CACHE_MAX_AGE = 365 * 24 * 3600
+
+# ------------------ MEDIA --------------------
+@media_bp.route('/media/<image_id>')
+def image(image_id):
+    """Streams a stored product image with ETag, Cache-Control and Range support."""
+    size = request.args.get('size', 'original')
+    if size != 'original' and size not in THUMBNAIL_SIZES:
+        abort(404)
+
+    # Browsers that accept WebP get the (smaller) WebP rendition where one exists
+    grid_out = open_image(image_id, size, webp=request.accept_mimetypes['image/webp'] > 0)
+    if grid_out is None:
+        abort(404)
+
+    metadata = grid_out.metadata or {}
+    response = Response(
+        wrap_file(request.environ, grid_out),
+        mimetype=metadata.get('content_type', 'application/octet-stream'),
+        direct_passthrough=True,
+    )
+    response.content_length = grid_out.length
+    response.last_modified = grid_out.upload_date
+    response.set_etag(grid_out._id)
+    response.vary.add('Accept')
+    response.cache_control.public = True
+    response.cache_control.max_age = CACHE_MAX_AGE
+    response.cache_control.immutable = True
+    return response.make_conditional(request, accept_ranges=True, complete_length=grid_out.length)
+
+# ------------------ ASSETS --------------------
+@media_bp.app_template_global()
+def asset_url(name):
+    """URL for a page bundle under static/: fingerprinted under /assets unless FINGERPRINT_ASSETS is off."""
+    hashed_name = assets.hashed_name(name) if current_app.config.get('FINGERPRINT_ASSETS') else None
+    if hashed_name is None:
+        return url_for('static', filename=name)
+    return url_for('media.asset', hashed_name=hashed_name)
+
+
+@media_bp.route('/assets/<path:hashed_name>')
+def asset(hashed_name):
+    """Serves a fingerprinted bundle, precompressed with brotli or gzip when the client accepts it."""
+    found = assets.get(hashed_name)
+    if found is None:
+        abort(404)
+
+    body, encoding = found.body, None
+    for candidate in ('br', 'gzip'):
+        if candidate in found.encodings and request.accept_encodings[candidate]:
+            body, encoding = found.encodings[candidate], candidate
+            break
+
+    response = Response(body, mimetype=found.mimetype)
+    if encoding:
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    # Each encoding is a different representation, so it gets its own strong ETag
+    response.set_etag(f"{found.etag}-{encoding}" if encoding else found.etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = CACHE_MAX_AGE
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
@@ -0,0 +1,107 @@
+import hmac
+import os
+
+from flask import Blueprint, Response, abort, g, jsonify, request
+from models import metrics
+from models.catalogue import catalogue_cache
+from models.db import health
+from models.events import broker
+from models.orders import queue_stats
+from models.principals import principal_cache
+from models.profiler import sampler
+from models.uploads import upload_stats
+
+ops_bp = Blueprint('ops', __name__)
+
+# ------------------ HEALTH --------------------
+@ops_bp.route('/health')
+def health_check():
+    """Reports Mongo reachability and connection pool usage for this worker."""
+    status = health()
+    return jsonify(status), (200 if status['ok'] else 503)
+
+# ------------------ CACHE --------------------
+@ops_bp.route('/cache/stats')
+def cache_stats():
+    """Reports hit/miss/eviction counters for this worker's in-process caches."""
+    return jsonify({'catalogue': catalogue_cache.stats(), 'principals': principal_cache.stats()})
+
+# ------------------ ORDER QUEUE --------------------
+@ops_bp.route('/orders/queue-stats')
+def order_queue_stats():
+    """Reports order queue depth and lag, plus this worker's dispatch throughput and live streams."""
+    stats = queue_stats()
+    stats['event_streams'] = broker.stats()
+    return jsonify(stats)
+
+# ------------------ IMAGE PIPELINE --------------------
+@ops_bp.route('/media/queue-stats')
+def image_queue_stats():
+    """Reports this worker's image upload queue depth, outcomes and latency."""
+    return jsonify(upload_stats())
+
+# ------------------ METRICS --------------------
+@ops_bp.before_app_request
+def _start_request_metrics():
+    metrics.start_request(request.endpoint or 'unmatched')
+
+@ops_bp.after_app_request
+def _finish_request_metrics(response):
+    metrics.finish_request(request.method, response.status_code)
+    return response
+
+@ops_bp.teardown_app_request
+def _finish_failed_request_metrics(exc):
+    # after_request is skipped when a view raises; record those as 500s
+    metrics.finish_request(request.method, 500)
+
+@ops_bp.route('/metrics')
+def prometheus_metrics():
+    """Exposes this worker's per-route latency and Mongo command metrics for Prometheus."""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@ops_bp.route('/metrics/slow-queries')
+def slow_queries():
+    """Lists this worker's most recent slow Mongo commands with their route and filter shape."""
+    return jsonify(list(metrics.command_metrics.slow_queries))
+
+# ------------------ PROFILING --------------------
+# The profiler endpoints only exist when PROFILE_TOKEN is set, and every call
+# must send it in the X-Admin-Token header.
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')
+
+@ops_bp.before_app_request
+def _start_profiling():
+    if sampler.enabled:
+        g.profiled = sampler.begin(request.endpoint or 'unmatched')
+
+@ops_bp.teardown_app_request
+def _stop_profiling(exc):
+    if g.get('profiled'):
+        sampler.end()
+
+def _require_admin():
+    supplied = request.headers.get('X-Admin-Token', '')
+    if not PROFILE_TOKEN or not hmac.compare_digest(supplied, PROFILE_TOKEN):
+        abort(404)
+
+@ops_bp.route('/debug/profile', methods=['GET'])
+def profile_dump():
+    """Returns this worker's sampled stacks in folded format (pipe into flamegraph.pl or speedscope)."""
+    _require_admin()
+    if request.args.get('format') == 'json':
+        return jsonify(sampler.stats())
+    return Response(sampler.folded(), mimetype='text/plain')
+
+@ops_bp.route('/debug/profile', methods=['POST'])
+def profile_configure():
+    """Turns sampling on or off at runtime: {"every": N, "routes": [...], "interval_ms": ms, "reset": bool}."""
+    _require_admin()
+    data = request.get_json(silent=True) or {}
+    try:
+        sampler.configure(data.get('every'), data.get('routes'), data.get('interval_ms'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'every and interval_ms must be numbers'}), 400
+    if data.get('reset'):
+        sampler.reset()
+    return jsonify(sampler.stats())
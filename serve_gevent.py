@@ -0,0 +1,20 @@
+"""Serves the app on gevent so one process can hold thousands of idle SSE streams.
+
+    python serve_gevent.py            # or: gunicorn -k gevent -w 4 app:app
+
+Patching must happen before anything imports socket/threading.
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import os  # noqa: E402
+
+from gevent.pywsgi import WSGIServer  # noqa: E402
+from app import app  # noqa: E402
+
+if __name__ == '__main__':
+    host = os.environ.get('HOST', '0.0.0.0')
+    port = int(os.environ.get('PORT', 5000))
+    print(f"Serving on http://{host}:{port} (gevent)")
+    WSGIServer((host, port), app).serve_forever()
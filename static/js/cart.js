@@ -0,0 +1,144 @@
+// Coupons are defined and applied on the server; totals always come back from it
+const icons = { flat: "💰", percent: "🍕", delivery: "🚚" };
+// Page data and API URLs come from the inline CART_PAGE config in cart.html
+const coupons = CART_PAGE.coupons;
+let appliedCoupon = CART_PAGE.appliedCoupon;
+
+function renderCoupons() {
+  const list = document.getElementById("coupon-list");
+  if (!list) return;
+  list.innerHTML = "";
+  for (const code in coupons) {
+    const c = coupons[code];
+    const card = document.createElement("div");
+    card.className = "coupon-card";
+    card.innerHTML = `
+      <div class="coupon-info">
+        <div class="coupon-icon">${icons[c.type] || "🎁"}</div>
+        <div class="coupon-details">
+          <div class="coupon-code">${code}</div>
+          <div class="coupon-desc">${c.description}</div>
+        </div>
+      </div>
+      <button class="apply-btn${code === appliedCoupon ? " active" : ""}" data-code="${code}">APPLY</button>
+    `;
+    list.appendChild(card);
+  }
+  document.querySelectorAll(".apply-btn").forEach(btn => {
+    btn.addEventListener("click", function() {
+      applyCoupon(this.dataset.code);
+    });
+  });
+}
+
+// Shows the totals returned by the cart APIs
+function renderTotals(cart) {
+  document.getElementById('bill-subtotal').textContent = cart.subtotal.toFixed(2);
+  document.getElementById('taxes').textContent = cart.tax.toFixed(2);
+  document.getElementById('delivery-fee').textContent = cart.delivery_fee.toFixed(2);
+  document.getElementById('discount').textContent = cart.discount.toFixed(2);
+  document.getElementById('grand-total').textContent = cart.total.toFixed(2);
+  document.getElementById('total-amount').textContent = cart.subtotal.toFixed(2);
+  cart.lines.forEach(line => {
+    const row = document.querySelector(`tr[data-item-id="${line.id}"]`);
+    if (row) row.querySelector('.subtotal').textContent = line.subtotal.toFixed(2);
+  });
+}
+
+async function postJSON(url, body) {
+  const response = await fetch(url, {
+    method: 'POST',
+    headers: {'Content-Type': 'application/json'},
+    body: JSON.stringify(body)
+  });
+  return response.json();
+}
+
+async function applyCoupon(code) {
+  try {
+    const data = await postJSON(CART_PAGE.urls.applyCoupon, { code: code });
+    if (!data.success) {
+      alert(data.message || "Invalid coupon");
+      return;
+    }
+    appliedCoupon = data.cart.coupon;
+    renderCoupons();
+    renderTotals(data.cart);
+    alert(`Coupon Applied: ${coupons[appliedCoupon].description}`);
+  } catch (err) {
+    console.error('Error applying coupon:', err);
+  }
+}
+
+function selectAddress(element) {
+  document.querySelectorAll('.address-card').forEach(card => card.classList.remove('selected'));
+  element.classList.add('selected');
+  element.querySelector('input[type="radio"]').checked = true;
+}
+
+function setupQuantityControls() {
+  document.querySelectorAll('.btn-increase').forEach(btn => {
+    btn.addEventListener('click', () => {
+      const input = btn.parentElement.querySelector('.qty-input');
+      input.value = parseInt(input.value) + 1;
+      updateQuantity(btn.closest('tr'));
+    });
+  });
+  document.querySelectorAll('.btn-decrease').forEach(btn => {
+    btn.addEventListener('click', () => {
+      const input = btn.parentElement.querySelector('.qty-input');
+      if (parseInt(input.value) > 1) {
+        input.value = parseInt(input.value) - 1;
+        updateQuantity(btn.closest('tr'));
+      }
+    });
+  });
+  document.querySelectorAll('.qty-input').forEach(input => {
+    input.addEventListener('change', () => {
+      if (!(parseInt(input.value) >= 1)) input.value = 1;
+      updateQuantity(input.closest('tr'));
+    });
+  });
+}
+
+async function updateQuantity(row) {
+  const quantity = parseInt(row.querySelector('.qty-input').value);
+  try {
+    const data = await postJSON(CART_PAGE.urls.updateQuantity,
+                                { item_id: row.dataset.itemId, quantity: quantity });
+    if (data.success) renderTotals(data.cart);
+  } catch (err) {
+    console.error('Error updating quantity:', err);
+  }
+}
+
+function setupRemoveButtons() {
+  document.querySelectorAll('.btn-remove').forEach(btn => {
+    btn.addEventListener('click', async () => {
+      const row = btn.closest('tr');
+      try {
+        const data = await postJSON(CART_PAGE.urls.removeItem, { item_id: row.dataset.itemId });
+        if (!data.success) return;
+        if (data.cart_length === 0) {
+          window.location.reload();
+          return;
+        }
+        row.remove();
+        renderTotals(data.cart);
+      } catch (err) {
+        console.error('Error removing item:', err);
+      }
+    });
+  });
+}
+
+document.getElementById('apply-coupon')?.addEventListener('click', function() {
+  const code = document.getElementById('coupon-input').value.trim().toUpperCase();
+  applyCoupon(code);
+});
+
+document.addEventListener('DOMContentLoaded', function() {
+  renderCoupons();
+  setupQuantityControls();
+  setupRemoveButtons();
+});
@@ -0,0 +1,239 @@
+// Helper function to create product card
+function createProductCard(item) {
+  const card = document.createElement('div');
+  card.className = 'product-card';
+  card.innerHTML = `
+    ${item.photo ? 
+      `<div class="product-image">
+        <img src="${item.photo}" loading="lazy" alt="${item.name}" class="w-full h-56 object-cover">
+      </div>` 
+      : 
+      `<div class="bg-gradient-to-br from-gray-100 to-gray-200 border-2 border-dashed border-gray-300 w-full h-56 flex items-center justify-center">
+        <i class="fas fa-pizza-slice text-5xl text-gray-400 floating-icon"></i>
+      </div>`
+    }
+    <div class="p-6">
+      <div class="flex justify-between items-start mb-3">
+        <h3 class="product-title flex-1 mr-4">${item.name.charAt(0).toUpperCase() + item.name.slice(1)}</h3>
+        <div class="price-tag">₹${item.price}</div>
+      </div>
+      <p class="text-sm text-gray-500 mb-2">From Store: <span class="font-medium text-gray-700">${item.store_owner || "N/A"}</span></p>
+      <p class="description-text">${item.description}</p>
+      <button 
+        onclick="addToCart('${item._id}', this)" 
+        class="add-to-cart-btn text-white py-3 px-6 rounded-full w-full font-semibold text-lg relative overflow-hidden"
+      >
+        <i class="fas fa-cart-plus mr-2"></i> Add to Cart
+      </button>
+    </div>`;
+  return card;
+}
+
+// Function to append products grouped by category (sections are created on first use)
+function renderGroupedProducts(data) {
+  const grid = document.getElementById('product-grid');
+
+  // Define the order of categories
+  const categoryOrder = ['Pizza', 'Breads', 'Beverage'];
+
+  data.forEach(item => {
+    if (!categoryOrder.includes(item.category)) return;
+    getCategoryContainer(grid, item.category, categoryOrder).appendChild(createProductCard(item));
+  });
+}
+
+// Returns the products container for a category, creating its section in display order
+function getCategoryContainer(grid, category, categoryOrder) {
+  let section = grid.querySelector(`.category-section[data-category="${category}"]`);
+  if (!section) {
+    // Create category section
+    section = document.createElement('div');
+    section.className = 'category-section';
+    section.dataset.category = category;
+
+    // Create category header
+    const header = document.createElement('div');
+    header.className = 'category-header';
+
+    // Set appropriate title for category
+    let title = category;
+    if (category === 'Pizza') title = 'Pizzas';
+    if (category === 'Beverage') title = 'Beverages';
+
+    header.innerHTML = `
+      <span class="category-icon">
+        ${category === 'Pizza' ? '🍕' : category === 'Breads' ? '🥖' : '🥤'}
+      </span>
+      <h2 class="category-title">${title}</h2>
+    `;
+
+    section.appendChild(header);
+
+    // Create products container
+    const productsContainer = document.createElement('div');
+    productsContainer.className = 'products-container grid grid-cols-1 md:grid-cols-2 xl:grid-cols-3 gap-8';
+    section.appendChild(productsContainer);
+
+    // Insert before the first existing section that sorts after this one
+    const rank = categoryOrder.indexOf(category);
+    const next = Array.from(grid.querySelectorAll('.category-section'))
+      .find(el => categoryOrder.indexOf(el.dataset.category) > rank);
+    grid.insertBefore(section, next || null);
+  }
+  return section.querySelector('.products-container');
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+  const cartCountElement = document.getElementById('cart-count');
+  let cartCount = parseInt(cartCountElement.getAttribute("data-cart")) || 0;
+
+  // Map URL parameters to database category values
+  const categoryMappings = {
+    'all': 'all',
+    'pizzas': 'Pizza',
+    'breads': 'Breads',
+    'beverages': 'Beverage'
+  };
+
+  // Get category from URL
+  const categoryParam = new URLSearchParams(window.location.search).get("category") || "all";
+
+  // Get the correct backend category value
+  const backendCategory = categoryMappings[categoryParam] || categoryParam;
+
+  // Update the page title based on the category
+  const titleText = categoryParam === 'all'
+    ? 'All Products'
+    : `${categoryParam.charAt(0).toUpperCase() + categoryParam.slice(1)}`;
+  document.getElementById("category-title").textContent = titleText;
+
+  // Highlight the active category link in the navigation
+  const navLinks = document.querySelectorAll('.category-link');
+  navLinks.forEach(link => {
+    if (link.getAttribute('data-category') === backendCategory) {
+      link.classList.add('bg-red-600', 'text-white', 'shadow-md');
+      link.classList.remove('bg-gray-200', 'text-gray-700', 'hover:bg-gray-300');
+    } else {
+      link.classList.add('bg-gray-200', 'text-gray-700', 'hover:bg-gray-300');
+      link.classList.remove('bg-red-600', 'text-white', 'shadow-md');
+    }
+  });
+
+  const loadingText = document.getElementById('loading');
+  const grid = document.getElementById('product-grid');
+  const emptyText = document.getElementById('no-products');
+
+  // Fetch products page by page; the next page loads as the user nears the bottom
+  const sentinel = document.getElementById('load-more');
+  let nextCursor = null;
+  let loading = false;
+  let done = false;
+  let rendered = 0;
+
+  if (backendCategory !== 'all') {
+    grid.className = 'grid grid-cols-1 md:grid-cols-2 xl:grid-cols-3 gap-8';
+  }
+
+  async function loadNextPage() {
+    if (loading || done) return;
+    loading = true;
+    const params = new URLSearchParams();
+    if (nextCursor) params.set('after', nextCursor);
+
+    try {
+      const res = await fetch(`/api/category/${backendCategory}?${params}`);
+      if (!res.ok) throw new Error('Network response was not ok');
+      const data = await res.json();
+      loadingText.classList.add('hidden');
+
+      // For "All" category, render grouped by category
+      if (backendCategory === 'all') {
+        renderGroupedProducts(data.items);
+      } 
+      // For specific categories, render normally
+      else {
+        data.items.forEach(item => grid.appendChild(createProductCard(item)));
+      }
+      rendered += data.items.length;
+
+      nextCursor = data.next_cursor;
+      done = !nextCursor;
+      if (done) {
+        observer.disconnect();
+        if (rendered === 0) emptyText.classList.remove('hidden');
+      }
+    } catch (err) {
+      done = true;
+      observer.disconnect();
+      loadingText.classList.add('hidden');
+      if (rendered === 0) emptyText.classList.remove('hidden');
+      console.error("Error fetching products:", err);
+    } finally {
+      loading = false;
+    }
+
+    // Keep filling the viewport until the sentinel scrolls out of view
+    if (!done && sentinel.getBoundingClientRect().top < window.innerHeight) {
+      loadNextPage();
+    }
+  }
+
+  const observer = new IntersectionObserver(entries => {
+    if (entries.some(entry => entry.isIntersecting)) loadNextPage();
+  }, { rootMargin: '400px' });
+  observer.observe(sentinel);
+});
+
+async function addToCart(productId, btn) {
+  btn.disabled = true;
+  const originalHtml = btn.innerHTML;
+  const cartCountElement = document.getElementById('cart-count');
+  btn.innerHTML = '<i class="fas fa-spinner fa-spin mr-2"></i> Adding...';
+
+  try {
+    const response = await fetch("/api/cart/add", {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+        "X-Requested-With": "XMLHttpRequest"
+      },
+      body: JSON.stringify({ item_id: productId })
+    });
+
+    if (response.status === 409) {
+      btn.innerHTML = '<i class="fas fa-ban mr-2"></i> Sold out';
+      return;
+    }
+    if (!response.ok) throw new Error('Network response was not ok');
+
+    const data = await response.json();
+
+    let cartCount = data.cart_count || (parseInt(cartCountElement.textContent) + 1);
+    cartCountElement.textContent = cartCount;
+
+    // Animate cart button
+    cartCountElement.parentElement.style.transform = 'scale(1.2)';
+    setTimeout(() => {
+      cartCountElement.parentElement.style.transform = 'scale(1)';
+    }, 200);
+
+    // Update button state to success
+    btn.innerHTML = '<i class="fas fa-check mr-2"></i> Added!';
+    btn.style.background = 'linear-gradient(135deg, #10b981, #059669)';
+
+    // Revert button after a delay
+    setTimeout(() => {
+      btn.innerHTML = originalHtml;
+      btn.style.background = '';
+      btn.disabled = false;
+    }, 1500);
+
+  } catch (error) {
+    console.error("Add to cart error:", error);
+    btn.innerHTML = '<i class="fas fa-exclamation-triangle mr-2"></i> Try Again';
+    setTimeout(() => {
+      btn.innerHTML = originalHtml;
+      btn.disabled = false;
+    }, 2000);
+  }
+}
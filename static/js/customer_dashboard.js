@@ -0,0 +1,44 @@
+// Scroll functions for horizontal carousels
+function scrollPrev(containerId) {
+  const container = document.getElementById(containerId);
+  container.scrollBy({ left: -300, behavior: 'smooth' });
+}
+
+function scrollNext(containerId) {
+  const container = document.getElementById(containerId);
+  container.scrollBy({ left: 300, behavior: 'smooth' });
+}
+
+// Add to cart animation (frontend visual feedback) - kept for existing functionality if needed elsewhere
+document.querySelectorAll('.add-to-cart-btn').forEach(button => {
+  button.addEventListener('click', function(event) {
+    event.preventDefault(); 
+
+    const cart = document.querySelector('.floating-cart');
+
+    this.innerHTML = 'Adding...'; 
+    this.classList.add('opacity-75'); 
+    this.disabled = true; 
+
+    setTimeout(() => {
+      this.closest('form').submit(); 
+    }, 300); 
+
+    cart.classList.add('animate-bounce');
+    setTimeout(() => {
+      cart.classList.remove('animate-bounce');
+    }, 1000);
+  });
+});
+
+// Display flash messages
+document.addEventListener('DOMContentLoaded', (event) => {
+  const alerts = document.querySelectorAll('.alert');
+  alerts.forEach(alert => {
+    setTimeout(() => {
+      alert.style.transition = 'opacity 0.5s ease-out';
+      alert.style.opacity = '0';
+      setTimeout(() => alert.remove(), 500); 
+    }, 3000); 
+  });
+});
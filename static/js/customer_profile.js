@@ -0,0 +1,26 @@
+document.addEventListener("DOMContentLoaded", function () {
+  fetch("/customer/profile-data")
+    .then((res) => {
+      if (!res.ok) throw new Error("Network response was not ok");
+      return res.json();
+    })
+    .then((data) => {
+      document.getElementById("firstName").innerText = data.name || "N/A";
+      document.getElementById("phoneNumber").innerText = data.phone || "N/A";
+      document.getElementById("emailAddress").innerText = data.email || "N/A";
+
+      if (data.address) {
+        const addr = data.address;
+        const formattedAddress = 
+          `${addr.flat_no || ''} ${addr.street || ''}, ${addr.landmark || ''}, ` +
+          `${addr.city || ''}, ${addr.state || ''} - ${addr.pincode || ''}`;
+        document.getElementById("addresses").innerText = formattedAddress;
+      } else {
+        document.getElementById("addresses").innerText = "N/A";
+      }
+    })
+    .catch((error) => {
+      alert("Failed to load profile");
+      console.error(error);
+    });
+});
@@ -0,0 +1,96 @@
+// Add smooth animations on load
+document.addEventListener('DOMContentLoaded', function() {
+  const cards = document.querySelectorAll('.animate-fadeInUp');
+  cards.forEach((card, index) => {
+    setTimeout(() => {
+      card.style.opacity = '1';
+      card.style.transform = 'translateY(0)';
+    }, index * 150);
+  });
+
+  // Add hover effect to stat cards
+  const statCards = document.querySelectorAll('.stat-card');
+  statCards.forEach(card => {
+    card.addEventListener('mouseenter', () => {
+      card.style.transform = 'translateY(-3px)';
+    });
+    card.addEventListener('mouseleave', () => {
+      card.style.transform = 'translateY(0)';
+    });
+  });
+});
+
+// Live order updates pushed by the server (new orders and status changes)
+const statusLabel = status => status.replace(/_/g, ' ').replace(/^./, c => c.toUpperCase());
+const nextStatus = STORE_PAGE.nextStatus;
+const orderStatusUrl = STORE_PAGE.urls.orderStatus;
+
+function renderIncomingOrder(order) {
+  const row = document.createElement('div');
+  row.className = 'sales-item';
+  row.dataset.orderId = order.order_id;
+  const placed = new Date(order.placed_at).toLocaleString([], { day: '2-digit', month: 'short', hour: '2-digit', minute: '2-digit' });
+  const items = order.items.map(line => `${line.name} × ${line.quantity}`).join(', ');
+  const next = nextStatus[order.status];
+  row.innerHTML = `
+    <div>
+      <div class="sales-date"></div>
+      <small class="text-muted"></small>
+      <div><span class="badge bg-secondary order-status">${statusLabel(order.status)}</span></div>
+    </div>
+    ${next ? `<form method="POST" action="${orderStatusUrl.replace('__id__', order.order_id)}">
+      <input type="hidden" name="status" value="${next}" />
+      <button type="submit" class="btn btn-primary btn-sm">${statusLabel(next)}</button>
+    </form>` : ''}`;
+  row.querySelector('.sales-date').textContent = `${order.customer_name} · ${placed}`;
+  row.querySelector('small').textContent = items;
+  return row;
+}
+
+if (window.EventSource) {
+  const events = new EventSource(STORE_PAGE.urls.orderEvents);
+  const list = document.getElementById('incoming-orders');
+
+  events.addEventListener('new_order', e => {
+    const order = JSON.parse(e.data);
+    const empty = document.getElementById('no-open-orders');
+    if (empty) empty.remove();
+    list.prepend(renderIncomingOrder(order));
+  });
+
+  events.addEventListener('order_status', e => {
+    const order = JSON.parse(e.data);
+    const row = list.querySelector(`[data-order-id="${order.order_id}"]`);
+    if (!row) return;
+    if (order.status === 'delivered') {
+      row.remove();
+    } else {
+      row.replaceWith(renderIncomingOrder(order));
+    }
+  });
+}
+
+// Availability switches in the product table
+document.querySelectorAll('.availability-toggle').forEach(toggle => {
+  toggle.addEventListener('change', () => {
+    toggle.disabled = true;
+    fetch(STORE_PAGE.urls.itemStock.replace('__id__', toggle.dataset.itemId), {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ available: toggle.checked }),
+    })
+      .then(response => response.ok ? response.json() : Promise.reject(response))
+      .then(data => { toggle.checked = data.available; })
+      .catch(() => { toggle.checked = !toggle.checked; })
+      .finally(() => { toggle.disabled = false; });
+  });
+});
+
+// Auto-dismiss alerts after 5 seconds
+setTimeout(function() {
+  const alerts = document.querySelectorAll('.alert');
+  alerts.forEach(alert => {
+    const bsAlert = new bootstrap.Alert(alert);
+    bsAlert.close();
+  });
+}, 5000);
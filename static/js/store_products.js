@@ -0,0 +1,49 @@
+async function addToCart(productId, btn) {
+  btn.disabled = true;
+  btn.innerHTML = '<i class="fas fa-spinner fa-spin mr-2"></i> Adding...';
+
+  try {
+    const response = await fetch(`/add-to-cart/${productId}`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'X-Requested-With': 'XMLHttpRequest'
+      },
+      body: JSON.stringify({})
+    });
+
+    if (!response.ok) throw new Error('Network response was not ok');
+
+    const data = await response.json();
+
+    // Update cart count badge
+    const cartCount = document.querySelector('.cart-count');
+    if (cartCount && data.cart_count !== undefined) {
+      cartCount.textContent = data.cart_count;
+      // Add a small animation to the cart button
+      cartCount.parentElement.style.transform = 'scale(1.2)';
+      setTimeout(() => {
+        cartCount.parentElement.style.transform = 'scale(1)';
+      }, 200);
+    }
+
+    // Success feedback
+    btn.innerHTML = '<i class="fas fa-check mr-2"></i> Added!';
+    btn.style.background = 'linear-gradient(135deg, #10b981, #059669)';
+
+    setTimeout(() => {
+      btn.innerHTML = '<i class="fas fa-cart-plus mr-2"></i> Add to Cart';
+      btn.style.background = '';
+    }, 1500);
+
+  } catch (error) {
+    alert('Failed to add to cart. Please try again.');
+    console.error(error);
+    btn.innerHTML = '<i class="fas fa-exclamation-triangle mr-2"></i> Try Again';
+    setTimeout(() => {
+      btn.innerHTML = '<i class="fas fa-cart-plus mr-2"></i> Add to Cart';
+    }, 2000);
+  } finally {
+    btn.disabled = false;
+  }
+}